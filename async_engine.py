@@ -0,0 +1,312 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+from outbound import OutboundLimits, SlowConsumerError
+from protocol import FrameDecoder, ProtocolError
+from structured_log import DEBUG
+
+
+def current_rss_bytes():
+    """
+    Returns the resident set size of this process in bytes, or None if it
+    cannot be determined on this platform.
+    """
+    try:
+        # Linux: second field of /proc/self/statm is resident pages
+        with open('/proc/self/statm', 'r') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except (ImportError, OSError):
+        return None
+
+
+def raise_fd_limit():
+    """
+    Raises the open file limit to the hard limit so many sockets can be open at once.
+    Returns the new limit, or None where this is not supported (e.g. Windows).
+    """
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        return hard
+    except (ImportError, ValueError, OSError):
+        return None
+
+
+class AsyncClientConnection:
+    """
+    Socket-like handle for one client of the asyncio engine.
+
+    The game logic in QuizServer only ever calls sendall() and close() on a
+    client socket and uses it as a dictionary key, so handing it this object
+    instead of a real socket keeps the game logic unchanged.
+    Both methods are safe to call from any thread.
+
+    The transport's write buffer is the client's outbound queue; it is bounded
+    by the engine's OutboundLimits and slow clients are disconnected.
+    """
+    __slots__ = ('loop', 'writer', 'address', 'limits', 'congested_since', 'evicted_reason',
+                 'compression', 'clock', 'last_received', '_closing', '_pending_bytes', '_lock')
+
+    def __init__(self, loop, writer, address, limits):
+        self.loop = loop
+        self.writer = writer
+        self.address = address
+        self.limits = limits
+        self.congested_since = None
+        self.evicted_reason = None
+        self.compression = None  # Negotiated in the handshake (see protocol.negotiate_compression)
+        self.clock = None  # clock_sync.ClockEstimator when the client negotiated clock sync
+        self.last_received = time.perf_counter()  # Updated by the reader coroutine (see liveness.py)
+        self._closing = False  # close() was called; the loop may not have closed the writer yet
+        self._pending_bytes = 0  # Handed to the loop but not yet written to the transport
+        self._lock = threading.Lock()
+
+    @property
+    def queued_bytes(self):
+        """Bytes waiting to be sent to this client."""
+        return self.writer.transport.get_write_buffer_size() + self._pending_bytes
+
+    @property
+    def closed(self):
+        """True once the connection is closing, closed or evicted: sends would fail."""
+        return self._closing or self.evicted_reason is not None or self.writer.is_closing()
+
+    @property
+    def sock(self):
+        """The underlying socket, for socket options (like QueuedSocketConnection.sock)."""
+        return self.writer.get_extra_info('socket')
+
+    def _on_loop_thread(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def sendall(self, data):
+        if self.evicted_reason:
+            raise OSError(self.evicted_reason)
+        if self.writer.is_closing():
+            raise OSError("Connection is closed")
+        with self._lock:
+            self._pending_bytes += len(data)
+            reason = self.limits.check(self, self.queued_bytes)
+        if reason:
+            self.evict(reason)
+            raise SlowConsumerError(f"Slow client {self.address} disconnected: {reason}")
+        if self._on_loop_thread():
+            self._write(data)
+        else:
+            self.loop.call_soon_threadsafe(self._write, data)
+
+    def _write(self, data):
+        with self._lock:
+            self._pending_bytes -= len(data)
+        if not self.writer.is_closing():
+            self.writer.write(data)
+
+    def evict(self, reason):
+        """Drops whatever is still queued and closes the connection immediately."""
+        self.evicted_reason = reason
+        self._call_on_loop(self.writer.transport.abort)
+
+    def close(self):
+        self._closing = True
+        self._call_on_loop(self.writer.close)
+
+    def detach(self):
+        """
+        Hands the connection over to another process: returns a duplicate of the
+        socket's file descriptor and drops the transport without shutting the TCP
+        connection down. Called on the loop thread, before anything was sent.
+        """
+        fd = os.dup(self.writer.get_extra_info('socket').fileno())
+        self.writer.transport.abort()
+        return fd
+
+    def _call_on_loop(self, callback):
+        if self._on_loop_thread():
+            callback()
+        else:
+            try:
+                self.loop.call_soon_threadsafe(callback)
+            except RuntimeError:
+                # Loop already closed - transport is gone with it
+                pass
+
+
+class AsyncQuizEngine:
+    """
+    Network engine for the Quiz Server built on asyncio streams.
+
+    Architecture:
+    - One event loop runs accept, read and write for every client.
+      A connection costs a coroutine and a transport instead of a thread stack.
+    - Incoming events are put into the server's queue exactly like the
+      threaded handle_client does, so the game logic (_handle_connect_event,
+      handle_client_message, process_question_answers) is reused as-is.
+    - In the GUI the loop runs in a background thread so Tkinter keeps the main thread.
+    """
+    def __init__(self, server, host='', port=12345, backlog=1024, limits=None, reuse_port=False):
+        self.server = server
+        self.limits = limits or OutboundLimits()
+        self.host = host
+        self.port = port
+        self.backlog = backlog
+        self.reuse_port = reuse_port  # Share the port with other worker processes (SO_REUSEPORT)
+        self.loop = None
+        self.connections = set()  # Live AsyncClientConnection objects
+        self.baseline_rss = None
+        self._server = None
+        self._thread = None
+        self._start_error = None
+
+    def start(self):
+        """
+        Starts the event loop in a background thread and waits until the
+        listening socket is bound. Raises OSError if binding fails.
+        """
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(ready,), daemon=True)
+        self._thread.start()
+        ready.wait()
+        if self._start_error:
+            raise self._start_error
+
+    def _run(self, ready):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self._server = self.loop.run_until_complete(asyncio.start_server(
+                self._handle_client, self.host or None, self.port, backlog=self.backlog,
+                reuse_port=self.reuse_port or None))
+        except OSError as e:
+            self._start_error = e
+            self.loop.close()
+            ready.set()
+            return
+
+        # Record the bound port (useful when started with port 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.baseline_rss = current_rss_bytes()
+        ready.set()
+
+        try:
+            self.loop.run_forever()
+        finally:
+            self._server.close()
+            for task in asyncio.all_tasks(self.loop):
+                task.cancel()
+            self.loop.run_until_complete(asyncio.sleep(0))
+            self.loop.close()
+
+    def stop(self):
+        """Stops accepting, closes every connection and shuts the loop down."""
+        if not self.loop or self.loop.is_closed():
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._shutdown)
+        except RuntimeError:
+            return
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+
+    def _shutdown(self):
+        self._server.close()
+        for conn in list(self.connections):
+            conn.writer.close()
+        self.loop.stop()
+
+    def adopt(self, sock, pending=b""):
+        """
+        Serves a connection accepted by another process (see supervisor.RoomRouter).
+        `pending` holds the bytes that process already read from it. Thread-safe.
+        """
+        asyncio.run_coroutine_threadsafe(self._adopt(sock, pending), self.loop)
+
+    async def _adopt(self, sock, pending):
+        try:
+            reader, writer = await asyncio.open_connection(sock=sock)
+        except OSError:
+            sock.close()
+            return
+        await self._handle_client(reader, writer, pending)
+
+    async def _handle_client(self, reader, writer, pending=b""):
+        """
+        Coroutine equivalent of QuizServer.handle_client.
+        Only reads and puts events in the server queue; never touches game state.
+        """
+        address = writer.get_extra_info('peername')
+        conn = AsyncClientConnection(self.loop, writer, address, self.limits)
+        self.connections.add(conn)
+        self.server.log("New connection attempt from %s", address, level=DEBUG)
+        timeouts = self.server.timeouts
+        timeouts.configure_socket(writer.get_extra_info('socket'))
+        decoder = FrameDecoder(observer=self.server.metrics.frame_received)
+        handshake = None
+        # The whole handshake must arrive in time, however slowly its bytes trickle in
+        handshake_deadline = self.loop.time() + timeouts.handshake if timeouts.handshake else None
+        try:
+            while True:
+                if pending:
+                    data = pending
+                elif handshake is None and handshake_deadline is not None:
+                    data = await asyncio.wait_for(reader.read(4096), handshake_deadline - self.loop.time())
+                else:
+                    data = await reader.read(4096)
+                pending = b""
+                if not data:
+                    break
+                received_at = conn.last_received = time.perf_counter()
+                try:
+                    messages = decoder.feed(data)
+                except ProtocolError:
+                    break
+
+                for i, message in enumerate(messages):
+                    if handshake is None:
+                        # First message is always the connect message
+                        handshake = self.server.queue_handshake(conn, address, message, messages[i + 1:], decoder)
+                        if handshake is None:
+                            return
+                        decoder.set_version(handshake["protocol"])
+                    else:
+                        self.server.receive_message(conn, message, received_at)
+
+        except asyncio.TimeoutError:
+            self.server.log("Handshake timeout from %s", address, level=DEBUG)
+        except (ConnectionError, OSError, asyncio.CancelledError):
+            pass  # Just disconnect
+        finally:
+            self.connections.discard(conn)
+            self.server.queue.put(("disconnect", conn, None))
+
+    def stats(self):
+        """
+        Returns engine statistics: open connections, process RSS and the
+        approximate memory overhead per connection since the engine started.
+        """
+        rss = current_rss_bytes()
+        count = len(self.connections)
+        per_connection = None
+        if count and rss is not None and self.baseline_rss is not None:
+            per_connection = max(0, rss - self.baseline_rss) / count
+        return {
+            "engine": "asyncio",
+            "connections": count,
+            "rss_bytes": rss,
+            "baseline_rss_bytes": self.baseline_rss,
+            "per_connection_bytes": per_connection
+        }
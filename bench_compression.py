@@ -0,0 +1,80 @@
+"""
+Compression benchmark for the large protocol messages.
+
+Builds the frames that grow with the room size (full scoreboard, game_end
+with the final scoreboard, delta scoreboard resync) for N players and reports,
+as JSON, their size raw and compressed with and without the preset
+dictionary, the CPU time to compress one frame (paid once per broadcast) and
+to decode it with FrameDecoder (paid by every client).
+
+Usage:
+    python bench_compression.py --players 10,100,1000,10000
+"""
+import argparse
+import json
+import time
+import zlib
+
+from protocol import (FrameDecoder, compress_frame, encode_message, PROTOCOL_VERSION, COMPRESSION_DEFLATE,
+                      COMPRESSION_LEVEL, COMPRESSION_WINDOW_BITS)
+
+
+def make_messages(players):
+    scores = sorted(((f"player{i}", (i * 7919) % (players * 3)) for i in range(players)), key=lambda x: (-x[1], x[0]))
+    return {
+        "scoreboard": {"type": "scoreboard", "scoreboard": [{"name": n, "score": s} for n, s in scores]},
+        "game_end": {"type": "game_end", "reason": "All questions answered", "winners": [scores[0][0]],
+                     "final_scoreboard": [{"rank": i + 1, "name": n, "score": s} for i, (n, s) in enumerate(scores)]},
+        "scoreboard_delta": {"type": "scoreboard_delta", "version": 7, "full": True,
+                             "top": [{"rank": i + 1, "name": n, "score": s} for i, (n, s) in enumerate(scores[:100])],
+                             "total_players": players}
+    }
+
+
+def cpu_us(function, repeat):
+    started = time.thread_time()
+    for _ in range(repeat):
+        function()
+    return round((time.thread_time() - started) / repeat * 1e6, 1)
+
+
+def measure(message, repeat):
+    frame = encode_message(message)
+    compressed = compress_frame(frame)
+
+    def plain_deflate():
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, -COMPRESSION_WINDOW_BITS)
+        return compressor.compress(frame) + compressor.flush()
+
+    def decode():
+        messages = FrameDecoder(PROTOCOL_VERSION, compression=COMPRESSION_DEFLATE).feed(compressed)
+        assert messages == [message]
+
+    return {
+        "raw_bytes": len(frame),
+        "deflate_bytes": len(plain_deflate()),
+        "deflate_dict_bytes": len(compressed),
+        "ratio": round(len(frame) / len(compressed), 1),
+        "compress_us": cpu_us(lambda: compress_frame(frame), repeat),
+        "decode_us": cpu_us(decode, repeat),
+        "decode_raw_us": cpu_us(lambda: FrameDecoder(PROTOCOL_VERSION).feed(frame), repeat)
+    }
+
+
+def run(args):
+    results = []
+    for players in args.players:
+        repeat = max(3, args.repeat // players)
+        results.append({"players": players, "messages": {
+            msg_type: measure(message, repeat) for msg_type, message in make_messages(players).items()}})
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", default="10,100,1000,10000",
+                        type=lambda value: [int(v) for v in value.split(",")], help="Room sizes, comma separated")
+    parser.add_argument("--repeat", type=int, default=20000, help="Player-entries to process per measurement")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args), indent=2))
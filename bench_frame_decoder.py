@@ -0,0 +1,106 @@
+"""
+Client receive-path benchmark.
+
+Decodes the server -> client stream the way the client's receive thread
+does, with the old approach (bytes buffer, `buffer += data` and
+`buffer.split(b'\\n', 1)` per message) and with FrameDecoder, on two
+workloads:
+- one multi-megabyte full scoreboard, arriving in recv-sized chunks
+- a burst of many small frames (answer results, player_connected...)
+
+Each case runs over a local socketpair (a sender thread writes, the
+measured thread reads with recv() or FrameDecoder.receive()). The report, as
+JSON, has the time, MB/s and messages per second of each approach. The old
+loop re-scans and re-copies the buffer on every read, so its time grows with
+the square of the frame size.
+
+Usage:
+    python bench_frame_decoder.py --players 20000,100000,400000 --small-frames 100000
+"""
+import argparse
+import json
+import socket
+import threading
+import time
+
+from protocol import FrameDecoder, encode_message, PROTOCOL_VERSION, MAX_SERVER_FRAME_SIZE
+
+
+def scoreboard_stream(players):
+    return encode_message({"type": "scoreboard", "scoreboard": [
+        {"name": f"player{i}", "score": players - i} for i in range(players)]})
+
+
+def small_frames_stream(count):
+    return b"".join(encode_message({"type": "answer_result", "correct": i % 3 == 0, "your_answer": "A",
+                                    "correct_answer": "B", "points_earned": 1, "your_score": i})
+                    for i in range(count))
+
+
+def read_split(sock, expected, recv_size):
+    """The client's receive loop before FrameDecoder."""
+    buffer = b""
+    received = 0
+    while received < expected:
+        data = sock.recv(recv_size)
+        if not data:
+            break
+        buffer += data
+        while b'\n' in buffer:
+            line, buffer = buffer.split(b'\n', 1)
+            if line:
+                json.loads(line.decode('utf-8'))
+                received += 1
+    return received
+
+
+def read_decoder(sock, expected, recv_size):
+    decoder = FrameDecoder(PROTOCOL_VERSION, MAX_SERVER_FRAME_SIZE)
+    received = 0
+    while received < expected:
+        messages = decoder.receive(sock)
+        if messages is None:
+            break
+        received += len(messages)
+    return received
+
+
+def measure(reader, stream, expected, recv_size):
+    receiver, sender = socket.socketpair()
+    receiver.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, recv_size)
+    thread = threading.Thread(target=sender.sendall, args=(stream,))
+    started = time.perf_counter()
+    thread.start()
+    received = reader(receiver, expected, recv_size)
+    seconds = time.perf_counter() - started
+    thread.join()
+    receiver.close()
+    sender.close()
+    assert received == expected, (received, expected)
+    return {"seconds": round(seconds, 4), "mb_per_second": round(len(stream) / seconds / 1e6, 1),
+            "messages_per_second": round(expected / seconds)}
+
+
+def run(args):
+    cases = [(f"scoreboard_{players}", scoreboard_stream(players), 1) for players in args.players]
+    cases.append((f"small_frames_{args.small_frames}", small_frames_stream(args.small_frames), args.small_frames))
+    report = []
+    for name, stream, expected in cases:
+        report.append({
+            "case": name,
+            "mb": round(len(stream) / 1e6, 2),
+            "split": measure(read_split, stream, expected, args.recv_size),
+            "frame_decoder": measure(read_decoder, stream, expected, args.recv_size)
+        })
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", default="20000,100000,400000",
+                        type=lambda value: [int(v) for v in value.split(",")], help="Scoreboard sizes, comma separated")
+    parser.add_argument("--small-frames", type=int, default=100000, help="Frames in the small-frame burst")
+    parser.add_argument("--recv-size", type=int, default=4096, help="Bytes per recv() of the old loop")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args), indent=2))
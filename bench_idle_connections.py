@@ -0,0 +1,117 @@
+"""
+Idle connection benchmark for the asyncio engine.
+
+Opens N client connections (from a separate process, so client-side memory is
+not counted), has each one complete the 'connect' handshake and then stay idle.
+Reports the server process RSS while the connections sit idle, and the
+approximate memory overhead per connection, as JSON.
+
+Usage:
+    python bench_idle_connections.py --connections 10000
+"""
+import argparse
+import json
+import queue
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from async_engine import AsyncQuizEngine, current_rss_bytes, raise_fd_limit
+from metrics import ServerMetrics
+from protocol import encode_message, negotiate_version, PROTOCOL_VERSION
+
+
+class IdleSink:
+    """
+    Minimal stand-in for QuizServer: accepts every handshake and discards events.
+    Only the network engine is being measured here, not the game logic.
+    """
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.is_game_active = False
+        self.metrics = ServerMetrics()
+        self.accepted = 0
+
+    def log(self, message, *args, **kwargs):
+        pass
+
+    def send_message(self, client_socket, message):
+        pass
+
+    def queue_handshake(self, client_socket, address, message, rest=(), decoder=None):
+        self.accepted += 1
+        return {"protocol": negotiate_version(message)}
+
+    def drain(self):
+        while True:
+            self.queue.get()
+
+
+def run_clients(port, count):
+    """Client process: open `count` connections, handshake, then idle until stdin closes."""
+    raise_fd_limit()
+    sockets = []
+    for i in range(count):
+        s = socket.create_connection(("127.0.0.1", port))
+        s.sendall(encode_message({"type": "connect", "name": f"idle{i}", "protocol": PROTOCOL_VERSION}))
+        sockets.append(s)
+    print("ready", flush=True)
+    sys.stdin.read()
+    for s in sockets:
+        s.close()
+
+
+def run_benchmark(count, idle_seconds):
+    raise_fd_limit()
+    sink = IdleSink()
+    threading.Thread(target=sink.drain, daemon=True).start()
+
+    engine = AsyncQuizEngine(sink, host="127.0.0.1", port=0)
+    engine.start()
+    rss_start = current_rss_bytes()
+
+    started = time.perf_counter()
+    client = subprocess.Popen(
+        [sys.executable, __file__, "--client", "--port", str(engine.port), "--connections", str(count)],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    client.stdout.readline()  # Wait for "ready"
+
+    while sink.accepted < count:
+        time.sleep(0.05)
+    connect_seconds = time.perf_counter() - started
+
+    # Sample RSS while every connection sits idle to show memory stays flat
+    samples = []
+    for _ in range(5):
+        samples.append(current_rss_bytes())
+        time.sleep(idle_seconds / 5)
+
+    stats = engine.stats()
+    client.stdin.close()
+    client.wait()
+    engine.stop()
+
+    report = {
+        "connections": count,
+        "connect_seconds": round(connect_seconds, 3),
+        "rss_before_bytes": rss_start,
+        "rss_idle_samples_bytes": samples,
+        "per_connection_bytes": round(stats["per_connection_bytes"]) if stats["per_connection_bytes"] else None
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=10000)
+    parser.add_argument("--idle-seconds", type=float, default=5.0)
+    parser.add_argument("--client", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.client:
+        run_clients(args.port, args.connections)
+    else:
+        run_benchmark(args.connections, args.idle_seconds)
@@ -0,0 +1,106 @@
+"""
+Results store benchmark.
+
+Records N synthetic games (players drawn from a fixed population) through
+ResultsStore's batching writer, then times the indexed queries: one player's
+recent history and the all-time top N. Reports write throughput, how long
+record_game() blocked the caller, query latency percentiles and the database
+size, as JSON.
+
+Usage:
+    python bench_results_store.py --games 1000000 --db /tmp/results.db
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+from results_store import ResultsStore
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {
+        "p50": round(samples[len(samples) // 2] * 1000, 3),
+        "p99": round(samples[int(len(samples) * 0.99)] * 1000, 3),
+        "max": round(samples[-1] * 1000, 3)
+    }
+
+
+def make_game(rng, population, players, questions, with_answers):
+    names = [f"player{i}" for i in rng.sample(range(population), players)]
+    scores = {name: rng.randrange(questions * players) for name in names}
+    ranked = sorted(scores.items(), key=lambda x: (-x[1], x[0]))
+    rankings = []
+    for i, (name, score) in enumerate(ranked):
+        rank = i + 1 if i == 0 or ranked[i - 1][1] != score else rankings[-1]['rank']
+        rankings.append({"rank": rank, "name": name, "score": score})
+    answers = {}
+    if with_answers:
+        now = time.time()
+        for q in range(questions):
+            answers[q] = {name: {'answer': rng.choice("ABC"), 'timestamp': now, 'correct': False, 'points': 0}
+                          for name in names}
+    return rankings, answers
+
+
+def run(args):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(args.db + suffix):
+            os.remove(args.db + suffix)
+    rng = random.Random(1)
+    store = ResultsStore(args.db, batch_size=args.batch_size)
+
+    # Generating the games is not what is measured
+    games = [make_game(rng, args.population, args.players, args.questions, args.answers) for _ in range(1000)]
+    record_seconds = 0.0
+    started = time.perf_counter()
+    for i in range(args.games):
+        rankings, answers = games[i % len(games)]
+        call_started = time.perf_counter()
+        store.record_game(f"room{i % 100}", time.time() - 60, time.time(), "All questions completed",
+                          args.questions, rankings, answers)
+        record_seconds += time.perf_counter() - call_started
+    store.close()
+    write_seconds = time.perf_counter() - started
+
+    # Only 1000 distinct games were recorded repeatedly, so query players that appear in them
+    names = sorted({r['name'] for rankings, _ in games for r in rankings})
+    history, top = [], []
+    for _ in range(args.queries):
+        name = rng.choice(names)
+        started = time.perf_counter()
+        store.player_history(name, limit=20)
+        history.append(time.perf_counter() - started)
+    for _ in range(args.queries):
+        started = time.perf_counter()
+        store.top_players(10)
+        top.append(time.perf_counter() - started)
+
+    return {
+        "games": args.games,
+        "players_per_game": args.players,
+        "answers": args.answers,
+        "write_seconds": round(write_seconds, 2),
+        "games_per_second": round(args.games / write_seconds),
+        "record_game_us": round(record_seconds / args.games * 1e6, 2),
+        "history_ms": percentiles(history),
+        "top_ms": percentiles(top),
+        "db_mb": round(os.path.getsize(args.db) / 1e6, 1)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=1000000, help="Games to record")
+    parser.add_argument("--players", type=int, default=8, help="Players per game")
+    parser.add_argument("--population", type=int, default=100000, help="Distinct player names")
+    parser.add_argument("--questions", type=int, default=5, help="Questions per game")
+    parser.add_argument("--answers", action="store_true", help="Also record every player's answers")
+    parser.add_argument("--batch-size", type=int, default=500, help="Games per write transaction")
+    parser.add_argument("--queries", type=int, default=1000, help="Queries of each kind to time")
+    parser.add_argument("--db", default="bench_results.db", help="Database file (replaced)")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args), indent=2))
@@ -0,0 +1,120 @@
+"""
+Round-closing benchmark for GameRoom.
+
+Fills one room with N players (no sockets, no network), starts a game and
+feeds every player's answer to handle_client_message the way process_queue
+does. Reports, as JSON, how long the answers of one round took to record and
+how long closing the round (scoring, routing answer_result to each player,
+scoreboard, next question) took, so the per-event cost can be compared
+across room sizes.
+
+Usage:
+    python bench_round_close.py --players 1000,10000
+"""
+import argparse
+import json
+import time
+
+from game_room import GameRoom
+from metrics import ServerMetrics
+from structured_log import StructuredLogger
+from timers import TimerScheduler
+from protocol import encode_message, SCOREBOARD_DELTA
+
+
+class FakeSocket:
+    """Stands in for a client connection; only used as a dictionary key."""
+    def close(self):
+        pass
+
+
+class FakeRoot:
+    def after(self, ms, callback, *args):
+        pass
+
+    def after_cancel(self, after_id):
+        pass
+
+
+class SinkServer:
+    """
+    Minimal stand-in for QuizServer: messages are encoded like the real server
+    does, then dropped. Only the room's game logic is being measured.
+    """
+    def __init__(self):
+        self.root = FakeRoot()
+        self.is_listening = True
+        self.metrics = ServerMetrics()
+        self.timers = TimerScheduler(self.root)
+        self.results = None  # No results store or journal
+        self.journal = None
+        self.logger = StructuredLogger()  # INFO: per-player debug lines are skipped as in production
+        self.frames_sent = 0
+
+    def log(self, message, *args, level=None, **fields):
+        pass
+
+    def send_message(self, client_socket, message):
+        self.send_frame(client_socket, encode_message(message))
+
+    def send_frame(self, client_socket, frame, msg_type="unknown"):
+        self.frames_sent += 1
+        return True
+
+    def update_clients_list(self):
+        pass
+
+    def update_start_game_button(self):
+        pass
+
+
+def run_round(players, scoreboard):
+    server = SinkServer()
+    room = GameRoom(server, "bench")
+    sockets = []
+    # Joining broadcasts to everyone already in the room; that cost is not what
+    # is measured here, so mute the join notifications while filling the room
+    room.broadcast_message = room.send_scoreboard = lambda *args, **kwargs: None
+    for i in range(players):
+        sock = FakeSocket()
+        room.add_player(sock, ("127.0.0.1", i), f"player{i}", {"protocol": 1, "scoreboard": scoreboard})
+        sockets.append(sock)
+    del room.broadcast_message, room.send_scoreboard
+
+    questions = [{"question": f"Question {i}?", "A": "a", "B": "b", "C": "c", "correct": "ABC"[i % 3]}
+                 for i in range(2)]
+    room.start_game(questions, 2, question_timeout=30)
+    server.frames_sent = 0
+
+    # Every player but the last answers: recorded without closing the round
+    started = time.perf_counter()
+    for i, sock in enumerate(sockets[:-1]):
+        room.handle_client_message(sock, {"type": "answer", "answer": "ABC"[i % 3]})
+    answers_seconds = time.perf_counter() - started
+    assert room.current_question_index == 0
+
+    # The last answer closes the round
+    started = time.perf_counter()
+    room.handle_client_message(sockets[-1], {"type": "answer", "answer": "A"})
+    close_seconds = time.perf_counter() - started
+    assert room.current_question_index == 1
+
+    return {
+        "players": players,
+        "scoreboard": scoreboard,
+        "answers_seconds": round(answers_seconds, 4),
+        "per_answer_us": round(answers_seconds / max(1, players - 1) * 1e6, 2),
+        "round_close_seconds": round(close_seconds, 4),
+        "round_close_per_player_us": round(close_seconds / players * 1e6, 2),
+        "frames_sent": server.frames_sent
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", default="1000,10000", help="Comma-separated room sizes")
+    parser.add_argument("--scoreboard", default=SCOREBOARD_DELTA, help="Scoreboard mode of the players")
+    args = parser.parse_args()
+
+    report = [run_round(int(n), args.scoreboard) for n in args.players.split(',')]
+    print(json.dumps(report, indent=2))
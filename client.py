@@ -1,9 +1,65 @@
 import socket
 import threading
+import time
 import tkinter as tk
+from collections import deque
 from tkinter import ttk, messagebox
 from datetime import datetime
-import json
+
+from protocol import (FrameDecoder, ProtocolError, encode_message, PROTOCOL_VERSION, SCOREBOARD_DELTA, COMPRESSION_DEFLATE,
+                      MAX_SERVER_FRAME_SIZE)
+
+RESUME_ATTEMPTS = 6  # Reconnect attempts after a dropped connection (backoff 0.5 s, 1 s, 2 s, 4 s...)
+UI_FRAME_MS = 16  # How often the Main Thread applies queued UI updates (about 60 times per second)
+LOG_VIEW_LINES = 1000  # Lines kept in the activity log listbox
+SCOREBOARD_ROWS = 3  # Visible scoreboard rows
+GAME_END_SHOWN = 10  # Rankings listed in the game over dialog
+
+class VirtualListbox:
+    """
+    A Listbox showing a window of a long list of lines. Only the visible rows are
+    inserted into Tk, so replacing a 10,000-line scoreboard costs as much as
+    replacing a 3-line one; the scrollbar and the mouse wheel move the window.
+    """
+    def __init__(self, parent, height):
+        self.height = height
+        self.lines = []
+        self.offset = 0  # Index of the first visible line
+        self.listbox = tk.Listbox(parent, height=height)
+        self.scrollbar = ttk.Scrollbar(parent, command=self._on_scroll)
+        self.listbox.bind("<MouseWheel>", lambda e: self.scroll(-1 if e.delta > 0 else 1))
+        self.listbox.bind("<Button-4>", lambda e: self.scroll(-1))
+        self.listbox.bind("<Button-5>", lambda e: self.scroll(1))
+        self._shown = None
+        
+    def set_lines(self, lines):
+        """Replaces the content, keeping the scroll position."""
+        self.lines = lines
+        self._redraw()
+        
+    def scroll(self, rows):
+        self.offset += rows
+        self._redraw()
+        
+    def _on_scroll(self, action, amount, unit=None):
+        if action == "moveto":
+            self.offset = int(float(amount) * len(self.lines))
+        else:  # "scroll" by units (rows) or pages
+            self.offset += int(amount) * (self.height if unit == "pages" else 1)
+        self._redraw()
+        
+    def _redraw(self):
+        self.offset = max(0, min(self.offset, len(self.lines) - self.height))
+        visible = self.lines[self.offset:self.offset + self.height]
+        if visible != self._shown:
+            self.listbox.delete(0, tk.END)
+            if visible:
+                self.listbox.insert(tk.END, *visible)
+            self._shown = visible
+        if self.lines:
+            self.scrollbar.set(self.offset / len(self.lines), (self.offset + len(visible)) / len(self.lines))
+        else:
+            self.scrollbar.set(0, 1)
 
 class QuizClient:
     """
@@ -12,7 +68,8 @@ class QuizClient:
     Architecture:
     - Main Thread: Runs the Tkinter GUI Loop. Handles button clicks and updates UI.
     - Receive Thread: Background thread that listens for incoming messages from the server.
-      It uses `root.after()` to safely pass data to the Main Thread for UI updates.
+      It passes UI work to the Main Thread through one queue (see dispatch), which the
+      Main Thread drains once per UI frame, so a burst of messages costs one redraw.
     """
     def __init__(self, root):
         self.root = root
@@ -24,14 +81,34 @@ class QuizClient:
         self.is_connected = False
         self.is_in_game = False
         self.client_name = ""
+        self.room_id = ""
         self.receive_thread = None
+        self.server_address = None
+        self.session_token = None  # From connection_accepted; lets us resume after a dropped connection
+        self.is_resuming = False
+        self.send_lock = threading.Lock()  # Pongs go out from the Receive Thread, everything else from the Main Thread
         
         # Game state
         self.current_question = None
         self.scoreboard = []
         self.my_score = 0
+        self.my_rank = 0
+        # Delta scoreboard (see update_scoreboard)
+        self.scoreboard_version = None
+        self.scoreboard_entries = {}  # {name: {'rank': int, 'score': int}} of the top-K
+        self.scoreboard_total = 0
+        self.scoreboard_sync_pending = False
+        self.scoreboard_dirty = False  # Redrawn at the end of the UI frame (see drain_ui_queue)
+        
+        # UI dispatch queue: (key, callback) entries, drained on the Main Thread
+        self.ui_queue = deque()
+        self.ui_latest = {}  # {key: callback} - the newest callback queued under a key
+        self.ui_lock = threading.Lock()
+        self.log_pending = deque()  # Log lines waiting to be shown
+        self.log_view_lines = 0
         
         self.setup_gui()
+        self.root.after(UI_FRAME_MS, self.drain_ui_queue)
         
     def setup_gui(self):
         """
@@ -68,9 +145,15 @@ class QuizClient:
         name_entry = ttk.Entry(conn_frame, textvariable=self.name_var, width=20)
         name_entry.grid(row=1, column=1, padx=5, pady=5)
         
+        # Room (optional - empty joins the server's default room)
+        ttk.Label(conn_frame, text="Room:").grid(row=1, column=2, sticky=tk.W, padx=5, pady=5)
+        self.room_var = tk.StringVar()
+        room_entry = ttk.Entry(conn_frame, textvariable=self.room_var, width=15)
+        room_entry.grid(row=1, column=3, padx=5, pady=5)
+        
         # Connect/Disconnect button
         self.connect_button = ttk.Button(conn_frame, text="Connect", command=self.toggle_connection)
-        self.connect_button.grid(row=1, column=2, columnspan=2, padx=10, pady=5)
+        self.connect_button.grid(row=2, column=0, columnspan=4, padx=10, pady=5)
         
         # Question frame
         question_frame = ttk.LabelFrame(main_frame, text="Question", padding="10")
@@ -122,8 +205,9 @@ class QuizClient:
         scoreboard_frame = ttk.LabelFrame(main_frame, text="Scoreboard", padding="5")
         scoreboard_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=2)
         
-        self.scoreboard_listbox = tk.Listbox(scoreboard_frame, height=3)
-        self.scoreboard_listbox.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        self.scoreboard_view = VirtualListbox(scoreboard_frame, SCOREBOARD_ROWS)
+        self.scoreboard_view.listbox.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        self.scoreboard_view.scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
         scoreboard_frame.columnconfigure(0, weight=1)
         
         # Activity log frame
@@ -145,21 +229,67 @@ class QuizClient:
     def log(self, message):
         """
         Thread-safe logging method.
-        Updates the log listbox on the main thread using root.after().
+        The line is shown by the next drain_ui_queue; the listbox keeps the last LOG_VIEW_LINES lines.
+        """
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        self.log_pending.append(f"[{timestamp}] {message}")
+        
+    def dispatch(self, callback, key=None):
         """
-        def _log():
-            timestamp = datetime.now().strftime("%H:%M:%S")
-            log_message = f"[{timestamp}] {message}"
-            self.log_listbox.insert(tk.END, log_message)
-            self.log_listbox.see(tk.END)
-        self.root.after(0, _log)
+        Thread-safe: queues `callback` to run on the Main Thread.
+        Callbacks queued under the same `key` supersede each other: only the newest
+        one runs, in the place of the first one still waiting.
+        """
+        if key is not None:
+            with self.ui_lock:
+                pending = key in self.ui_latest
+                self.ui_latest[key] = callback
+            if pending:
+                return
+        self.ui_queue.append((key, callback))
+        
+    def drain_ui_queue(self):
+        """
+        Runs every UI_FRAME_MS on the Main Thread: runs the queued callbacks, then
+        shows new log lines and redraws the scoreboard once if anything changed it.
+        """
+        try:
+            for _ in range(len(self.ui_queue)):
+                key, callback = self.ui_queue.popleft()
+                if key is not None:
+                    with self.ui_lock:
+                        callback = self.ui_latest.pop(key)
+                try:
+                    callback()
+                except Exception as e:
+                    self.log(f"Error updating the display: {e}")
+            if self.scoreboard_dirty:
+                self.render_scoreboard()
+            self.flush_log()
+        finally:
+            self.root.after(UI_FRAME_MS, self.drain_ui_queue)
+            
+    def flush_log(self):
+        """Appends the pending log lines to the log listbox (Main Thread)."""
+        lines = [self.log_pending.popleft() for _ in range(len(self.log_pending))]
+        if not lines:
+            return
+        lines = lines[-LOG_VIEW_LINES:]
+        self.log_listbox.insert(tk.END, *lines)
+        self.log_view_lines += len(lines)
+        if self.log_view_lines > LOG_VIEW_LINES:
+            self.log_listbox.delete(0, self.log_view_lines - LOG_VIEW_LINES - 1)
+            self.log_view_lines = LOG_VIEW_LINES
+        self.log_listbox.see(tk.END)
         
     def toggle_connection(self):
         """
         Toggles the client connection state.
-        Connects if disconnected, disconnects if connected.
+        Connects if disconnected, disconnects if connected (or stops resuming a dropped session).
         """
-        if not self.is_connected:
+        if self.is_resuming:
+            self.disconnect()
+        elif not self.is_connected:
             self.connect()
         else:
             self.disconnect()
@@ -198,13 +328,20 @@ class QuizClient:
             self.client_socket.settimeout(None)
             
             # Send connection message with name
+            # A 'join' message carries the room id; a plain 'connect' joins the default room
             self.client_name = client_name
-            self.send_message({
-                "type": "connect",
-                "name": client_name
-            })
-            
-            self.log(f"Connecting to {server_ip}:{port} as '{client_name}'...")
+            self.room_id = self.room_var.get().strip()
+            self.my_rank = 0
+            self.scoreboard_version = None
+            self.scoreboard_entries = {}
+            self.scoreboard_sync_pending = False
+            self.server_address = (server_ip, port)
+            self.session_token = None
+            self.send_join()
+            if self.room_id:
+                self.log(f"Connecting to {server_ip}:{port} as '{client_name}' in room '{self.room_id}'...")
+            else:
+                self.log(f"Connecting to {server_ip}:{port} as '{client_name}'...")
             
             self.is_connected = True
             self.connect_button.config(text="Disconnect")
@@ -249,6 +386,74 @@ class QuizClient:
                     pass
                 self.client_socket = None
                 
+    def send_join(self, session=None):
+        """
+        Sends the first message of a connection.
+        A 'join' message carries the room id; a plain 'connect' joins the default room.
+        With a session token the server resumes our previous session instead.
+        """
+        message = {
+            "type": "join" if self.room_id else "connect",
+            "name": self.client_name,
+            "protocol": PROTOCOL_VERSION,
+            "scoreboard": SCOREBOARD_DELTA,
+            "compression": [COMPRESSION_DEFLATE],
+            "clock_sync": True  # Answer pings, so the server can time our answers fairly
+        }
+        if self.room_id:
+            message["room"] = self.room_id
+        if session:
+            message["session"] = session
+        self.send_message(message)
+        
+    def resume_session(self):
+        """
+        Reconnects in the background after the connection dropped and resumes
+        our session (score, current question) with the token from connection_accepted.
+        """
+        self.is_resuming = True
+        self.connect_button.config(text="Cancel")
+        self.log("Connection lost. Trying to resume the session...")
+        address = self.server_address
+        
+        def _attempt():
+            for attempt in range(RESUME_ATTEMPTS):
+                time.sleep(0.5 * 2 ** attempt)
+                if not self.is_resuming:
+                    return
+                try:
+                    sock = socket.create_connection(address, timeout=5)
+                    sock.settimeout(None)
+                except OSError:
+                    continue
+                self.dispatch(lambda: self._on_resume_connected(sock))
+                return
+            self.dispatch(self._on_resume_failed)
+            
+        threading.Thread(target=_attempt, daemon=True).start()
+        
+    def _on_resume_connected(self, sock):
+        if not self.is_resuming:
+            # The user gave up (or connected again) in the meantime
+            sock.close()
+            return
+        self.is_resuming = False
+        self.client_socket = sock
+        self.send_join(self.session_token)
+        self.is_connected = True
+        self.connect_button.config(text="Disconnect")
+        self.receive_thread = threading.Thread(target=self.receive_messages, daemon=True)
+        self.receive_thread.start()
+        
+    def _on_resume_failed(self):
+        if not self.is_resuming:
+            return
+        self.is_resuming = False
+        self.session_token = None
+        self.connect_button.config(text="Connect")
+        self.log("Could not resume the session")
+        messagebox.showwarning("Disconnected", "Connection to server lost")
+        
     def disconnect(self):
         """
         Closes the active connection and resets the client state.
@@ -256,6 +461,8 @@ class QuizClient:
         """
         self.is_connected = False
         self.is_in_game = False
+        self.is_resuming = False
+        self.session_token = None
         
         if self.client_socket:
             try:
@@ -270,49 +477,60 @@ class QuizClient:
         # Enable connection inputs
         # Reset UI
         self.reset_question_ui()
-        self.scoreboard_listbox.delete(0, tk.END)
+        self.scoreboard_dirty = False
+        self.scoreboard_view.set_lines([])
         
     def send_message(self, message):
         """
         Encodes and sends a JSON message to the server.
+        Messages are newline-terminated frames (see protocol.py), so the server
+        can split them apart even when TCP merges or splits writes.
         """
         if self.client_socket:
             try:
-                data = json.dumps(message).encode('utf-8')
-                self.client_socket.sendall(data)
+                with self.send_lock:
+                    self.client_socket.sendall(encode_message(message))
             except Exception as e:
                 self.log(f"Error sending message: {e}")
                 self.disconnect()
                 
+    def send_pong(self, ping):
+        """
+        Answers a server ping right away, from the Receive Thread, with our monotonic clock.
+        A failed send is left to the receive loop, which notices the broken connection.
+        """
+        sock = self.client_socket
+        if sock is None:
+            return
+        try:
+            with self.send_lock:
+                sock.sendall(encode_message({"type": "pong", "id": ping.get("id"), "time": time.monotonic()}))
+        except OSError:
+            pass
+            
     def receive_messages(self):
         """
         Background thread to listen for server messages.
-        This loops blocks on recv() until data arrives.
+        This loops blocks on recv_into() until data arrives.
         """
-        buffer = b""  # Buffer for incomplete messages (bytes)
+        # Splits the stream into messages, including the compressed frames we asked for (see protocol.py)
+        decoder = FrameDecoder(PROTOCOL_VERSION, MAX_SERVER_FRAME_SIZE, compression=COMPRESSION_DEFLATE)
         while self.is_connected:
             try:
                 if not self.client_socket:
                     break
                     
-                data = self.client_socket.recv(4096)
-                if not data:
+                messages = decoder.receive(self.client_socket)
+                if messages is None:
                     break
                 
-                # Add to buffer
-                buffer += data
-                
-                # Process all complete messages (separated by newline)
-                while b'\n' in buffer:
-                    # Split at first newline
-                    line, buffer = buffer.split(b'\n', 1)
-                    if line:
-                        try:
-                            message = json.loads(line.decode('utf-8'))
-                            self.handle_message(message)
-                        except (json.JSONDecodeError, UnicodeDecodeError) as e:
-                            self.log(f"Error parsing message: {e}")
+                # Process all complete messages
+                for message in messages:
+                    self.handle_message(message)
                     
+            except ProtocolError as e:
+                self.log(f"Error parsing message: {e}")
+                break
             except ConnectionResetError:
                 self.log("Connection reset by server")
                 break
@@ -324,29 +542,42 @@ class QuizClient:
                 
         # Connection lost
         if self.is_connected:
-            self.root.after(0, self.handle_disconnection)
+            self.dispatch(self.handle_disconnection)
             
     def handle_message(self, message):
         """
         Dispatches messages to the appropriate handler.
-        CRITICAL: Uses root.after() to ensure UI updates happen on the Main Thread.
+        CRITICAL: Uses dispatch() to ensure UI updates happen on the Main Thread.
         Tkinter is NOT thread-safe, so we cannot update labels directly from this background thread.
+        Full scoreboards and our own rank supersede older ones still waiting to be shown.
         """
         msg_type = message.get("type")
         
-        if msg_type == "connection_accepted":
-            msg = message.get("message", "Connected successfully")
-            self.root.after(0, lambda: self.log(msg))
+        if msg_type == "ping":
+            self.send_pong(message)
+            
+        elif msg_type == "connection_accepted":
+            self.session_token = message.get("session")
+            self.log(message.get("message", "Connected successfully"))
+            
+        elif msg_type == "session_resumed":
+            self.dispatch(lambda: self.handle_session_resumed(message))
             
         elif msg_type == "connection_error":
             error_msg = message.get("message", "Connection error")
-            self.root.after(0, lambda: messagebox.showerror("Connection Error", error_msg))
-            self.root.after(0, lambda: self.log(f"Connection error: {error_msg}"))
-            self.root.after(0, self.disconnect)
+            self.log(f"Connection error: {error_msg}")
+            
+            def _show_error():
+                messagebox.showerror("Connection Error", error_msg)
+                self.disconnect()
+            self.dispatch(_show_error)
+            
+        elif msg_type in ("scoreboard", "scoreboard_self"):
+            self.dispatch(lambda: self.update_scoreboard(message), key=msg_type)
             
-        elif msg_type == "scoreboard":
-            scoreboard = message.get("scoreboard", [])
-            self.root.after(0, lambda: self.update_scoreboard(scoreboard))
+        elif msg_type == "scoreboard_delta":
+            # Not superseded: each delta applies on top of the previous version
+            self.dispatch(lambda: self.update_scoreboard(message))
             
         elif msg_type == "question":
             question_data = {
@@ -355,11 +586,13 @@ class QuizClient:
                 "question": message.get("question", ""),
                 "A": message.get("A", ""),
                 "B": message.get("B", ""),
-                "C": message.get("C", "")
+                "C": message.get("C", ""),
+                "time_limit": message.get("time_limit"),
+                "received_at": time.monotonic()  # Our think time starts here (see submit_answer)
             }
             # Use a copy to avoid closure issues
             qd_copy = question_data.copy()
-            self.root.after(0, lambda: self.display_question(qd_copy))
+            self.dispatch(lambda: self.display_question(qd_copy))
             
         elif msg_type == "answer_result":
             result_msg = message.get("message", "")
@@ -367,30 +600,29 @@ class QuizClient:
             correct_answer = message.get("correct_answer", "")
             your_score = message.get("your_score", 0)
             
-            self.root.after(0, lambda: self.log(result_msg))
-            self.root.after(0, lambda: self.show_answer_result(your_answer, correct_answer, result_msg, your_score))
+            self.dispatch(lambda: self.show_answer_result(your_answer, correct_answer, result_msg, your_score))
             
         elif msg_type == "player_connected":
             player_name = message.get("player_name", "Unknown")
             connect_msg = message.get("message", f"{player_name} has joined")
             total_players = message.get("total_players", 0)
-            self.root.after(0, lambda: self.log(f"{connect_msg} (Total players: {total_players})"))
+            self.log(f"{connect_msg} (Total players: {total_players})")
             
         elif msg_type == "player_disconnected":
             player_name = message.get("player_name", "Unknown")
             disconnect_msg = message.get("message", f"{player_name} disconnected")
-            self.root.after(0, lambda: self.log(disconnect_msg))
+            self.log(disconnect_msg)
             
         elif msg_type == "game_end":
             reason = message.get("reason", "Game ended")
             final_scoreboard = message.get("final_scoreboard", [])
             winners = message.get("winners", [])
             
-            self.root.after(0, lambda: self.handle_game_end(reason, final_scoreboard, winners))
+            self.dispatch(lambda: self.handle_game_end(reason, final_scoreboard, winners))
             
         elif msg_type == "server_shutdown":
-            self.root.after(0, lambda: self.log("Server is shutting down"))
-            self.root.after(0, self.disconnect)
+            self.log("Server is shutting down")
+            self.dispatch(self.disconnect)
             
     def display_question(self, question_data):
         """
@@ -400,8 +632,11 @@ class QuizClient:
         try:
             self.is_in_game = True
             self.current_question = question_data
+            question_data.setdefault("received_at", time.monotonic())
             
             question_text = f"Question {question_data['question_number']}/{question_data['total_questions']}: {question_data['question']}"
+            if question_data.get('time_limit'):
+                question_text += f" ({question_data['time_limit']} s to answer)"
             self.question_label.config(text=question_text)
             
             choice_a_text = f"A: {question_data['A']}"
@@ -440,10 +675,13 @@ class QuizClient:
         # Disable UI immediately to prevent double submission
         self.disable_answer_ui()
         
-        # Send answer
+        # Send answer, with how long we took on our own clock: the server ranks answers by it,
+        # bounded by our measured round trip, rather than by when the answer reached it
         self.send_message({
             "type": "answer",
-            "answer": answer
+            "answer": answer,
+            "question_number": self.current_question['question_number'],
+            "think_ms": round((time.monotonic() - self.current_question['received_at']) * 1000)
         })
         
         self.log(f"Answer submitted: {answer}. Waiting for other players...")
@@ -464,6 +702,7 @@ class QuizClient:
         self.disable_answer_ui()
         
         # Show result message
+        self.log(result_msg)
         self.log(f"Your answer: {your_answer}, Correct answer: {correct_answer}")
         self.log(f"Your current score: {your_score} points")
         
@@ -476,23 +715,97 @@ class QuizClient:
         self.answer_var.set("")
         self.disable_answer_ui()
         
-    def update_scoreboard(self, scoreboard):
+    def update_scoreboard(self, message):
         """
-        Updates the scoreboard listbox with the latest scores from the server.
-        Highlights the current user's score.
+        Updates the scoreboard from a scoreboard message; the view is redrawn once
+        per UI frame (see render_scoreboard).
+        - 'scoreboard': the whole sorted list (older servers)
+        - 'scoreboard_delta': a top-K snapshot ("full") or the changes since version "base"
+        - 'scoreboard_self': our own rank and score, shown below the top-K if we are not in it
         """
-        self.scoreboard = scoreboard
-        self.scoreboard_listbox.delete(0, tk.END)
+        msg_type = message.get("type")
         
-        for entry in scoreboard:
+        if msg_type == "scoreboard":
+            self.scoreboard = message.get("scoreboard", [])
+            for entry in self.scoreboard:
+                if entry.get("name") == self.client_name:
+                    self.my_score = entry.get("score", 0)
+            self.scoreboard_dirty = True
+            return
+            
+        if msg_type == "scoreboard_self":
+            self.my_rank = message.get("rank", 0)
+            self.my_score = message.get("score", 0)
+            
+        elif message.get("full"):
+            self.scoreboard_entries = {
+                entry["name"]: {"rank": entry["rank"], "score": entry["score"]} for entry in message.get("top", [])
+            }
+            self.scoreboard_version = message.get("version")
+            self.scoreboard_total = message.get("total_players", len(self.scoreboard_entries))
+            self.scoreboard_sync_pending = False
+            
+        elif self.scoreboard_version is not None and message.get("base") == self.scoreboard_version:
+            for name in message.get("removed", []):
+                self.scoreboard_entries.pop(name, None)
+            for entry in message.get("changed", []):
+                self.scoreboard_entries[entry["name"]] = {"rank": entry["rank"], "score": entry["score"]}
+            self.scoreboard_version = message.get("version")
+            self.scoreboard_total = message.get("total_players", self.scoreboard_total)
+            
+        else:
+            # Missed a version - ask for a fresh snapshot (once) and ignore deltas until it arrives
+            if not self.scoreboard_sync_pending:
+                self.scoreboard_sync_pending = True
+                self.send_message({"type": "scoreboard_sync"})
+            return
+            
+        self.scoreboard = sorted(
+            ({"name": name, **entry} for name, entry in self.scoreboard_entries.items()),
+            key=lambda e: (e["rank"], e["name"]))
+        self.scoreboard_dirty = True
+        
+    def render_scoreboard(self):
+        """Shows self.scoreboard, highlighting the current user's score (Main Thread)."""
+        self.scoreboard_dirty = False
+        lines = []
+        for entry in self.scoreboard:
             name = entry.get("name", "Unknown")
-            score = entry.get("score", 0)
-            if name == self.client_name:
-                self.my_score = score
-                self.scoreboard_listbox.insert(tk.END, f"{name}: {score} points (You)")
-            else:
-                self.scoreboard_listbox.insert(tk.END, f"{name}: {score} points")
+            line = f"{name}: {entry.get('score', 0)} points"
+            if "rank" in entry:
+                line = f"{entry['rank']}. {line}"
+            lines.append(line + " (You)" if name == self.client_name else line)
+            
+        if self.scoreboard_version is not None and self.my_rank and self.client_name not in self.scoreboard_entries:
+            lines.append(f"... ({self.scoreboard_total} players)")
+            lines.append(f"{self.my_rank}. {self.client_name}: {self.my_score} points (You)")
+        self.scoreboard_view.set_lines(lines)
                 
+    def handle_session_resumed(self, message):
+        """Restores the scoreboard and the current question from the snapshot sent on resume."""
+        self.log(f"Session resumed (score {message.get('score', 0)}, rank {message.get('rank', 0)})")
+        self.my_rank = message.get("rank", 0)
+        self.my_score = message.get("score", 0)
+        self.update_scoreboard({
+            "type": "scoreboard_delta",
+            "full": True,
+            "version": message.get("version"),
+            "top": message.get("top", []),
+            "total_players": message.get("total_players", 0)
+        })
+        
+        question = message.get("question")
+        if not question:
+            self.is_in_game = message.get("game_active", False)
+            self.reset_question_ui()
+            return
+        if question.get("time_left") is not None:
+            question = dict(question, time_limit=question["time_left"])  # Shown as the time still left
+        self.display_question(question)
+        if message.get("answered"):
+            self.disable_answer_ui()
+            self.submit_button.config(text="Waiting for other players...", state=tk.DISABLED)
+            
     def handle_game_end(self, reason, final_scoreboard, winners):
         """
         Handles the end-of-game event.
@@ -502,15 +815,20 @@ class QuizClient:
         self.log(f"Game ended: {reason}")
         
         # Update final scoreboard with rankings
-        self.scoreboard_listbox.delete(0, tk.END)
-        for entry in final_scoreboard:
+        lines = []
+        own_line = None  # For the dialog, if we are not in its top GAME_END_SHOWN
+        for i, entry in enumerate(final_scoreboard):
             rank = entry.get("rank", 0)
             name = entry.get("name", "Unknown")
             score = entry.get("score", 0)
             if name == self.client_name:
-                self.scoreboard_listbox.insert(tk.END, f"Rank {rank}: {name}: {score} points (You)")
+                if i >= GAME_END_SHOWN:
+                    own_line = f"Rank {rank}: {name} - {score} points"
+                lines.append(f"Rank {rank}: {name}: {score} points (You)")
             else:
-                self.scoreboard_listbox.insert(tk.END, f"Rank {rank}: {name}: {score} points")
+                lines.append(f"Rank {rank}: {name}: {score} points")
+        self.scoreboard_dirty = False
+        self.scoreboard_view.set_lines(lines)
                 
         # Show winner message
         if self.client_name in winners:
@@ -518,11 +836,16 @@ class QuizClient:
         else:
             winner_msg = f"Game Over!\n\nFinal Rankings:\n"
             
-        for entry in final_scoreboard:
+        # The top of the rankings only; a dialog with every player of a large room would not fit the screen
+        for entry in final_scoreboard[:GAME_END_SHOWN]:
             rank = entry.get("rank", 0)
             name = entry.get("name", "Unknown")
             score = entry.get("score", 0)
             winner_msg += f"Rank {rank}: {name} - {score} points\n"
+        if len(final_scoreboard) > GAME_END_SHOWN:
+            winner_msg += f"... ({len(final_scoreboard)} players)\n"
+            if own_line:
+                winner_msg += own_line + "\n"
             
         messagebox.showinfo("Game Ended", winner_msg)
         self.log("Final scoreboard displayed")
@@ -538,6 +861,15 @@ class QuizClient:
         Updates UI to reflect disconnected state.
         """
         self.is_connected = False
+        if self.client_socket:
+            try:
+                self.client_socket.close()
+            except:
+                pass
+            self.client_socket = None
+        if self.session_token and self.server_address:
+            self.resume_session()
+            return
         self.is_in_game = False
         self.connect_button.config(text="Connect")
         self.log("Connection lost")
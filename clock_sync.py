@@ -0,0 +1,148 @@
+"""
+Round-trip time and clock offset estimation for fair answer timing.
+
+The server pings every client that asked for it ("clock_sync": true in
+'connect') every PING_INTERVAL_SECONDS:
+
+    <- {"type": "ping", "id": 7}
+    -> {"type": "pong", "id": 7, "time": <client monotonic clock, seconds>}
+
+The pong is handled by the network thread as soon as it is read (queueing it
+for the Main Thread would add the queue wait to the round trip), against the
+send time the server kept for that ping id, so a client cannot claim a
+shorter round trip than it really has. It can claim a longer one by holding
+its pongs back, so the answer time correction only trusts the lowest round
+trip seen since the handshake and, where the platform reports it, the
+kernel's own TCP round trip estimate, which the client cannot delay.
+
+Answers carry "think_ms", the time on the client's own clock from receiving
+the question to answering. The server ranks answers by that think time,
+bounded by what the network allows (see corrected_answer_time), instead of by
+when the answer happened to come off the event queue.
+"""
+import collections
+import socket
+import struct
+
+from protocol import encode_message
+
+
+PING_INTERVAL_SECONDS = 2.0
+PING_HISTORY = 8  # Pings whose send time is kept; later pongs are ignored
+RTT_WINDOW = 8  # Samples the minimum RTT and the clock offset are taken from
+RTT_GAIN = 0.125  # Smoothing like TCP's SRTT/RTTVAR (RFC 6298)
+RTT_VARIANCE_GAIN = 0.25
+MAX_RTT_CORRECTION_SECONDS = 0.25  # A slow link never buys more than this off an answer time
+TCP_INFO_RTT_OFFSET = 68  # tcpi_rtt (microseconds) in Linux's struct tcp_info
+
+
+def kernel_rtt(sock):
+    """
+    Returns the kernel's smoothed round trip of a TCP socket in seconds, or None
+    where TCP_INFO is not available (non-Linux, not a TCP socket, closed).
+    """
+    if sock is None or not hasattr(socket, "TCP_INFO"):
+        return None
+    try:
+        info = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, TCP_INFO_RTT_OFFSET + 4)
+        rtt_us, = struct.unpack_from("=I", info, TCP_INFO_RTT_OFFSET)
+    except (OSError, struct.error):
+        return None
+    return rtt_us / 1e6 if rtt_us else None
+
+
+class ClockEstimator:
+    """
+    Round trip and clock offset of one client, from its pongs.
+
+    Updated by the connection's network thread (on_pong), read by the Main
+    Thread when the client answers; every field is replaced in one assignment.
+    """
+    __slots__ = ('rtt', 'rtt_variance', 'min_rtt', 'floor_rtt', 'kernel_rtt', 'offset', 'samples', '_window')
+
+    def __init__(self):
+        self.rtt = None  # Smoothed round trip (seconds), None until the first pong
+        self.rtt_variance = None
+        self.min_rtt = None  # Lowest round trip of the last RTT_WINDOW pongs
+        self.floor_rtt = None  # Lowest round trip of any pong since the handshake
+        self.kernel_rtt = None  # Lowest TCP_INFO round trip read when a pong arrived
+        self.offset = None  # Client clock minus server clock, from the lowest round trip sample
+        self.samples = 0
+        self._window = collections.deque(maxlen=RTT_WINDOW)  # (rtt, offset) samples
+
+    def on_pong(self, sent_at, received_at, client_time, kernel_rtt=None):
+        """
+        Adds one sample: the ping left at `sent_at`, the pong carrying `client_time`
+        arrived at `received_at`. `kernel_rtt` is the TCP round trip read at that moment, if any.
+        """
+        rtt = max(0.0, received_at - sent_at)
+        if self.floor_rtt is None or rtt < self.floor_rtt:
+            self.floor_rtt = rtt
+        if kernel_rtt is not None and (self.kernel_rtt is None or kernel_rtt < self.kernel_rtt):
+            self.kernel_rtt = kernel_rtt
+        offset = None
+        if isinstance(client_time, (int, float)):
+            # The client read its clock about half a round trip after the ping left (as NTP assumes)
+            offset = client_time - (sent_at + rtt / 2)
+        if self.rtt is None:
+            self.rtt, self.rtt_variance = rtt, rtt / 2
+        else:
+            self.rtt_variance = (1 - RTT_VARIANCE_GAIN) * self.rtt_variance + RTT_VARIANCE_GAIN * abs(self.rtt - rtt)
+            self.rtt = (1 - RTT_GAIN) * self.rtt + RTT_GAIN * rtt
+        self._window.append((rtt, offset))
+        best_rtt, best_offset = min(self._window, key=lambda sample: sample[0])
+        self.min_rtt = best_rtt
+        if best_offset is not None:
+            self.offset = best_offset  # Least queueing, so the least asymmetry between the two directions
+        self.samples += 1
+        return rtt
+
+    def trusted_rtt(self):
+        """
+        Round trip the answer time correction may use: the lowest measured one,
+        which delaying pongs cannot raise once a fast one was seen, nor raise above
+        the kernel's estimate. None before the first pong.
+        """
+        candidates = [rtt for rtt in (self.floor_rtt, self.kernel_rtt) if rtt is not None]
+        return min(candidates) if candidates else None
+
+
+class Pinger:
+    """
+    Numbers the server's pings and remembers when the last PING_HISTORY were sent.
+    next_ping() runs on the Main Thread, sent_at() on the network threads.
+    """
+    def __init__(self):
+        self.last_id = 0
+        self._sent = {}  # {ping id: perf_counter() when it was sent}
+
+    def next_ping(self, now):
+        """Returns the frame of a new ping sent at `now`; the same frame goes to every client."""
+        self.last_id += 1
+        self._sent[self.last_id] = now
+        self._sent.pop(self.last_id - PING_HISTORY, None)
+        return encode_message({"type": "ping", "id": self.last_id})
+
+    def sent_at(self, ping_id):
+        return self._sent.get(ping_id)
+
+
+def corrected_answer_time(elapsed, think_ms, clock):
+    """
+    Returns how long a player took to answer, in seconds, for ranking answers.
+
+    `elapsed` is the server's time from sending the question to reading the
+    answer, which includes the round trip to the player. At most the trusted
+    round trip (see ClockEstimator.trusted_rtt), capped at
+    MAX_RTT_CORRECTION_SECONDS, is taken off it. The player's think time only
+    counts when it is longer than that, so a false think time gains nothing
+    over an honest one; an honest player loses only the jitter above the
+    fastest round trip. Without any pong yet the answer keeps the server's time.
+    """
+    trusted = clock.trusted_rtt() if clock is not None else None
+    if trusted is None:
+        return elapsed
+    lower = max(0.0, elapsed - min(trusted, MAX_RTT_CORRECTION_SECONDS))
+    if not isinstance(think_ms, (int, float)) or think_ms != think_ms:
+        return lower
+    return min(elapsed, max(lower, think_ms / 1000.0))
@@ -0,0 +1,95 @@
+import collections
+import os
+import queue
+import threading
+import time
+
+from metrics import percentiles
+
+try:
+    import tkinter
+except ImportError:
+    tkinter = None
+
+
+class EventQueue(queue.Queue):
+    """
+    Queue of network events for the Main Thread (see QuizServer.process_queue).
+
+    put() also writes a byte to a self-pipe. When the pipe is registered with
+    the Tk event loop (attach), the Main Thread wakes up and drains the queue as
+    soon as an event arrives instead of on the next poll. Only the first put
+    after a drain writes to the pipe, so a burst of events costs one wakeup.
+
+    With measure=True the time every event spent in the queue is recorded per
+    event type (see wait_report).
+    """
+    def __init__(self, measure=False, max_samples=100000):
+        super().__init__()
+        self.measure = measure
+        self.waits = collections.defaultdict(lambda: collections.deque(maxlen=max_samples))
+        self._wake_lock = threading.Lock()
+        self._wake_pending = False
+        self._wake_read, self._wake_write = os.pipe()
+        os.set_blocking(self._wake_read, False)
+        os.set_blocking(self._wake_write, False)
+
+    def attach(self, root, callback):
+        """
+        Calls callback() on the Tk Main Thread whenever events are put.
+        `root` may also be a headless loop with add_reader() (see headless_server.EventLoop).
+        Returns False where Tk cannot watch a pipe (Windows); the caller must poll then.
+        """
+        if hasattr(root, "add_reader"):
+            root.add_reader(self._wake_read, lambda: self._on_wakeup(callback))
+            return True
+        if tkinter is None or not hasattr(root, "createfilehandler"):
+            return False
+        try:
+            root.createfilehandler(self._wake_read, tkinter.READABLE, lambda fd, mask: self._on_wakeup(callback))
+        except (tkinter.TclError, RuntimeError):
+            return False
+        return True
+
+    def _on_wakeup(self, callback):
+        # Re-arm before draining so events put while draining wake us again
+        with self._wake_lock:
+            self._wake_pending = False
+            try:
+                while os.read(self._wake_read, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+        callback()
+
+    def put(self, item, block=True, timeout=None):
+        super().put(item, block, timeout)
+        with self._wake_lock:
+            if self._wake_pending:
+                return
+            self._wake_pending = True
+        try:
+            os.write(self._wake_write, b'\0')
+        except (BlockingIOError, OSError):
+            pass  # Pipe full or closed: a wakeup is already pending or nobody is listening
+
+    # Queue internals (called with the queue's mutex held): keep the enqueue time with each event
+    def _put(self, item):
+        self.queue.append((time.perf_counter(), item))
+
+    def _get(self):
+        enqueued_at, item = self.queue.popleft()
+        if self.measure:
+            self.waits[item[0]].append(time.perf_counter() - enqueued_at)
+        return item
+
+    def wait_report(self):
+        """Returns {event_type: queue wait percentiles in ms} of the measured events."""
+        return {event_type: percentiles(list(samples)) for event_type, samples in self.waits.items()}
+
+    def close(self):
+        for fd in (self._wake_read, self._wake_write):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
@@ -0,0 +1,999 @@
+import secrets
+import threading
+import time
+
+from clock_sync import corrected_answer_time
+from protocol import encode_message, SCOREBOARD_FULL
+from structured_log import DEBUG, INFO, WARNING
+
+
+DEFAULT_ROOM_ID = "main"  # Room used by clients that send a plain 'connect' without a room
+SCOREBOARD_TOP_K = 10  # Leaderboard size sent to clients using the delta scoreboard
+QUESTION_TIMEOUT_SECONDS = 30  # Default answer deadline per question (0 = wait for every player)
+SESSION_RESUME_SECONDS = 120  # How long a dropped player can reconnect with its session token
+ROLE_RELAY = "relay"  # Handshake role of a spectator relay ('subscribe' message, see relay.py)
+
+
+def build_question_frames(questions, num_questions, time_limit=None):
+    """
+    Pre-encodes the 'question' message of every round of a game.
+    Returns {(question_index, question_number): frame} where question_index is the
+    position in `questions`, so a round's broadcast only has to send the bytes.
+    With a time_limit (seconds to answer), the messages carry it for the clients to show.
+    """
+    frames = {}
+    for question_number in range(1, num_questions + 1):
+        question_index = (question_number - 1) % len(questions)
+        question = questions[question_index]
+        message = {
+            "type": "question",
+            "question_number": question_number,
+            "total_questions": num_questions,
+            "question": question['question'],
+            "A": question['A'],
+            "B": question['B'],
+            "C": question['C']
+        }
+        if time_limit:
+            message["time_limit"] = time_limit
+        frames[(question_index, question_number)] = encode_message(message)
+    return frames
+
+
+class GameRoom:
+    """
+    One independent quiz game hosted by the QuizServer.
+
+    All game state (players, questions, answers, scores) lives here so a single
+    server process can host many rooms at once. Scoreboards and broadcasts only
+    reach the players of this room.
+
+    Threading: like the rest of the game logic, every method runs on the Main Thread
+    (via the server's queue), except _end_game_worker, which only closes connections.
+    """
+    def __init__(self, server, room_id, top_k=SCOREBOARD_TOP_K):
+        self.server = server
+        self.room_id = room_id
+
+        # Player state
+        # {client_socket: {'name': str, 'address': tuple, 'protocol': int, 'scoreboard': str,
+        #                  'scoreboard_synced': bool, 'scoreboard_self': (rank, score) or None,
+        #                  'session': str}}
+        self.clients = {}
+        self.client_names = set()  # Track unique names within this room
+        self.sockets_by_name = {}  # {client_name: client_socket}, for routing results by name
+
+        # Resumable sessions (see resume_player)
+        self.sessions = {}  # {session_token: {'name': str, 'expiry': Timer or None while connected}}
+        self.session_by_name = {}  # {client_name: session_token}
+
+        # Game state
+        self.is_game_active = False
+        self.questions = []
+        self.question_frames = {}  # Pre-encoded question messages, see build_question_frames
+        self.current_question_index = 0
+        self.num_questions = 0
+        self.answers_received = {}  # {question_index: {client_name: {'answer': str, 'timestamp': float}}}
+                                    # ('correct' and 'points' are added when the round is scored; the
+                                    # timestamp is corrected for the player's RTT, see handle_client_message)
+        self.awaiting_answers = set()  # Connected players who have not answered the current question yet
+        self.question_sent_at = None  # perf_counter() when the current question was broadcast
+        self.question_sent_time = None  # The same moment on the wall clock, for answer timestamps
+        self.question_timeout = 0  # Seconds players get to answer a question (0 = no deadline)
+        self.question_deadline = None  # Timer closing the current round (see server.timers)
+        self.game_started_at = None
+        self.game_started_time = None  # Wall clock time of the start, for the results store
+        self.scores = {}  # {client_name: score}
+
+        # Delta scoreboard state (see send_scoreboard)
+        self.top_k = top_k
+        self.scoreboard_version = 0
+        self.scoreboard_top = {}  # {client_name: (rank, score)} as of scoreboard_version
+        self.scoreboard_ranks = {}  # {client_name: rank} as of scoreboard_version
+
+        # Spectator relays subscribed to this room (see relay.py). They are not players and
+        # get one copy of each question, scoreboard and game_end to fan out to their spectators.
+        self.relays = set()
+
+    def log(self, message, *args, level=INFO):
+        """Logs a message tagged with the room id."""
+        self.server.log(message, *args, level=level, room=self.room_id)
+
+    def debug(self, message, *args):
+        """Logs a debug message. Costs one comparison when debug logging is off, so use it on per-player paths."""
+        logger = self.server.logger
+        if logger.level <= DEBUG:
+            logger.log(DEBUG, message, *args, room=self.room_id)
+
+    def journal(self, record_type, **fields):
+        """Appends a game event of this room to the server's crash recovery journal, if any (see journal.py)."""
+        if self.server.journal is not None:
+            self.server.journal.append(record_type, self.room_id, fields)
+
+    def is_idle(self):
+        """True when the room has no players, no game and no relays, so the server can drop it."""
+        return not self.clients and not self.is_game_active and not self.relays
+
+    def add_player(self, client_socket, address, client_name, handshake):
+        """
+        Adds a newly connected player to this room.
+        Validates the username and notifies the other players.
+        `handshake` holds the options negotiated in the connect message (protocol version,
+        scoreboard mode and the session token of a reconnecting player, if any).
+        Returns False if the player was rejected (the socket is closed).
+        """
+        session = handshake.get('session')
+        if session is not None and session in self.sessions:
+            return self.resume_player(client_socket, address, session, handshake)
+
+        # Check if name is taken
+        if client_name in self.client_names:
+            self.server.send_message(client_socket, {
+                "type": "connection_error",
+                "message": f"Name '{client_name}' is already in use."
+            })
+            client_socket.close()
+            return False
+
+        # The handshake check runs in a background thread, so re-check here
+        if self.is_game_active:
+            self.server.send_message(client_socket, {
+                "type": "connection_error",
+                "message": "Session expired." if session is not None else "Game is already in progress."
+            })
+            client_socket.close()
+            return False
+
+        # A new player taking a name ends the session of the player who left with it
+        old_session = self.session_by_name.pop(client_name, None)
+        if old_session is not None:
+            self._drop_session(old_session)
+        session = secrets.token_urlsafe(16)
+        self.sessions[session] = {'name': client_name, 'expiry': None}
+        self.session_by_name[client_name] = session
+
+        # Accept connection
+        self.client_names.add(client_name)
+        self.sockets_by_name[client_name] = client_socket
+        self.clients[client_socket] = {
+            'name': client_name,
+            'address': address,
+            'protocol': handshake['protocol'],
+            'scoreboard': handshake.get('scoreboard', SCOREBOARD_FULL),
+            'scoreboard_synced': False,
+            'scoreboard_self': None,
+            'session': session
+        }
+        self.scores[client_name] = 0
+
+        self.server.send_message(client_socket, {
+            "type": "connection_accepted",
+            "room": self.room_id,
+            "protocol": handshake['protocol'],
+            "scoreboard": self.clients[client_socket]['scoreboard'],
+            "compression": handshake.get('compression'),
+            "clock_sync": bool(handshake.get('clock_sync')),
+            "session": session,
+            "resume_seconds": SESSION_RESUME_SECONDS,
+            "message": f"Welcome {client_name}! Waiting for game to start."
+        })
+
+        self.log(f"Client '{client_name}' connected from {address}")
+
+        # Send current scoreboard
+        self.send_scoreboard()
+
+        # Notify others
+        if len(self.clients) > 1:
+            self.broadcast_message({
+                "type": "player_connected",
+                "player_name": client_name,
+                "message": f"{client_name} has joined the game",
+                "total_players": len(self.clients)
+            }, exclude_socket=client_socket)
+        return True
+
+    def add_relay(self, relay_socket, address):
+        """
+        Subscribes a spectator relay to the room and sends it the current question
+        and scoreboard. A relay never counts toward the players, the answers awaited
+        or the bonus, so any number of spectators cost the room one connection per relay.
+        """
+        self.relays.add(relay_socket)
+        self.server.send_message(relay_socket, {
+            "type": "subscribed",
+            "room": self.room_id,
+            "game_active": self.is_game_active,
+            "clock_sync": getattr(relay_socket, 'clock', None) is not None  # Pinged: must answer (heartbeats)
+        })
+        if self.is_game_active and self.current_question_index in self.answers_received:
+            question_index = self.current_question_index % len(self.questions)
+            self.server.send_frame(relay_socket, self.question_frames[(question_index, self.current_question_index + 1)],
+                                   "question")
+        self.server.send_frame(relay_socket, self._scoreboard_snapshot_frame(), "scoreboard_delta")
+        self.log(f"Relay subscribed from {address} ({len(self.relays)} relays)")
+
+    def remove_relay(self, relay_socket):
+        self.relays.discard(relay_socket)
+        self.log(f"Relay unsubscribed ({len(self.relays)} relays)")
+
+    def relay_frame(self, frame, msg_type):
+        """Sends a broadcast frame once to every subscribed relay (send_frame never raises)."""
+        for relay_socket in list(self.relays):
+            self.server.send_frame(relay_socket, frame, msg_type)
+
+    def resume_player(self, client_socket, address, session, handshake):
+        """
+        Reattaches a reconnecting player to its name, score and the current question.
+        The player gets one 'session_resumed' snapshot (scoreboard top-K, own rank,
+        current question) instead of the join broadcast and scoreboard updates.
+        """
+        entry = self.sessions[session]
+        client_name = entry['name']
+        if entry['expiry'] is not None:
+            entry['expiry'].cancel()
+            entry['expiry'] = None
+
+        # The old connection may not have been noticed as dead yet (e.g. half-open after a Wi-Fi drop)
+        old_socket = self.sockets_by_name.get(client_name)
+        owes_answer = client_name in self.awaiting_answers
+        if old_socket is not None:
+            self._detach_player(old_socket)
+            old_socket.close()  # Its disconnect event finds the player gone and is ignored
+
+        info = {
+            'name': client_name,
+            'address': address,
+            'protocol': handshake['protocol'],
+            'scoreboard': handshake.get('scoreboard', SCOREBOARD_FULL),
+            'scoreboard_synced': True,  # The snapshot below is a full sync
+            'scoreboard_self': (self.scoreboard_ranks.get(client_name, 0), self.scores.get(client_name, 0)),
+            'session': session
+        }
+        self.client_names.add(client_name)
+        self.sockets_by_name[client_name] = client_socket
+        self.clients[client_socket] = info
+        self.scores.setdefault(client_name, 0)
+
+        snapshot = {
+            "type": "session_resumed",
+            "room": self.room_id,
+            "name": client_name,
+            "protocol": info['protocol'],
+            "scoreboard": info['scoreboard'],
+            "compression": handshake.get('compression'),
+            "clock_sync": bool(handshake.get('clock_sync')),
+            "session": session,
+            "game_active": self.is_game_active,
+            "score": self.scores[client_name],
+            "rank": info['scoreboard_self'][0],
+            "version": self.scoreboard_version,
+            "top": [{"rank": rank, "name": name, "score": score}
+                    for name, (rank, score) in sorted(self.scoreboard_top.items(), key=lambda x: (x[1][0], x[0]))],
+            "total_players": len(self.scoreboard_ranks),
+            "question": None,
+            "answered": False
+        }
+        answers = self.answers_received.get(self.current_question_index)
+        if self.is_game_active and answers is not None:
+            question = self.questions[self.current_question_index % len(self.questions)]
+            snapshot["question"] = {
+                "question_number": self.current_question_index + 1,
+                "total_questions": self.num_questions,
+                "question": question['question'],
+                "A": question['A'],
+                "B": question['B'],
+                "C": question['C']
+            }
+            if self.question_deadline is not None:
+                snapshot["question"]["time_limit"] = self.question_timeout
+                snapshot["question"]["time_left"] = round(self.question_deadline.remaining(), 1)
+            snapshot["answered"] = client_name in answers
+            # Players who left were dropped from the round; an unanswered question is owed again
+            if owes_answer or client_name not in answers:
+                self.awaiting_answers.add(client_name)
+        self.server.send_message(client_socket, snapshot)
+        self.server.metrics.sessions_resumed.inc()
+
+        self.log(f"Client '{client_name}' resumed its session from {address} (score {self.scores[client_name]})")
+        return True
+
+    def _drop_session(self, session):
+        entry = self.sessions.pop(session, None)
+        if entry is not None and entry['expiry'] is not None:
+            entry['expiry'].cancel()
+
+    def _expire_session(self, session):
+        """Timer callback: a dropped player did not come back in time."""
+        entry = self.sessions.pop(session, None)
+        if entry is not None:
+            if self.session_by_name.get(entry['name']) == session:
+                del self.session_by_name[entry['name']]
+            self.debug("Session of %s expired", entry['name'])
+
+    def _detach_player(self, client_socket):
+        """Removes a player's connection from the room state. Returns the player's info."""
+        info = self.clients.pop(client_socket)
+        client_name = info['name']
+        self.client_names.discard(client_name)
+        self.sockets_by_name.pop(client_name, None)
+        self.awaiting_answers.discard(client_name)
+        return info
+
+    def remove_player(self, client_socket):
+        """
+        Removes a disconnected player and notifies the other players.
+        Note: Disconnected players' scores are kept in the scoreboard, and the player
+        can resume with its session token for SESSION_RESUME_SECONDS.
+        """
+        if client_socket not in self.clients:
+            return
+
+        # Clean up
+        info = self._detach_player(client_socket)
+        client_name = info['name']
+        session = self.sessions.get(info['session'])
+        if session is not None:
+            session['expiry'] = self.server.timers.call_later(
+                SESSION_RESUME_SECONDS, self._expire_session, info['session'])
+
+        # Disconnected players should remain on scoreboard
+        # if client_name in self.scores:
+        #     del self.scores[client_name]
+
+        self.log(f"Client '{client_name}' disconnected (score kept on scoreboard)")
+
+        # Notify others
+        self.broadcast_message({
+            "type": "player_disconnected",
+            "player_name": client_name,
+            "message": f"{client_name} has disconnected"
+        })
+
+        # Update scoreboard so all players see the current state (including disconnected players)
+        if self.is_game_active:
+            self.send_scoreboard()
+
+            # Check if we're waiting for answers to current question
+            # If the player who left was the last one we waited for, close the round now
+            if self.is_waiting_for_answers():
+                if len(self.awaiting_answers) <= 10:
+                    self.log(f"Still waiting for answers from: {self.awaiting_answers}")
+                else:
+                    self.log(f"Still waiting for answers from {len(self.awaiting_answers)} players")
+            elif self.current_question_index in self.answers_received:
+                self.log(f"All remaining players have answered. Processing answers...")
+                self.process_question_answers()
+            # If not waiting for answers and less than 2 players, end game
+            elif len(self.clients) < 2:
+                self.log("Less than 2 players remaining and no active question. Ending game...")
+                self.end_game("Less than 2 players remaining")
+
+    def handle_client_message(self, client_socket, message, received_at=None):
+        """
+        Processes a specific message type (e.g., 'answer') from a player of this room.
+        `received_at` is the perf_counter() time the message was read from the socket.
+        Executed on the Main Thread.
+        """
+        msg_type = message.get("type")
+        client_name = self.clients.get(client_socket, {}).get('name', 'Unknown')
+
+        if msg_type == "scoreboard_sync":
+            # A delta client missed a version; resend its snapshot from the stored state
+            info = self.clients.get(client_socket)
+            if info is not None and info['scoreboard'] != SCOREBOARD_FULL:
+                self.server.send_frame(client_socket, self._scoreboard_snapshot_frame(), "scoreboard_delta")
+                info['scoreboard_synced'] = True
+                info['scoreboard_self'] = None
+                self._send_scoreboard_self(client_socket, info)
+
+        elif msg_type == "answer":
+            if not self.is_game_active:
+                return
+
+            answer = message.get("answer", "")
+            answer = answer.upper() if isinstance(answer, str) else None  # Any JSON value can arrive here
+            if answer not in ['A', 'B', 'C']:
+                return
+
+            # An answer sent before the client saw the round close belongs to the previous question
+            question_number = message.get("question_number")
+            if question_number is not None and question_number != self.current_question_index + 1:
+                self.debug("Ignoring late answer from %s to question %s", client_name, question_number)
+                return
+
+            # Record answer logic - NO LOCK NEEDED as we are on MAIN THREAD
+            # Since process_queue calls this, we are strictly sequential here.
+            # No race conditions between clients answering at the same time.
+            if self.current_question_index not in self.answers_received:
+                self.answers_received[self.current_question_index] = {}
+
+            if client_name in self.awaiting_answers:
+                self.awaiting_answers.discard(client_name)
+                if self.question_sent_at is not None:
+                    # Ranked by the player's own think time, bounded by its measured RTT (see clock_sync.py),
+                    # so the first-correct bonus doesn't go to whoever has the shortest link
+                    elapsed = (received_at or time.perf_counter()) - self.question_sent_at
+                    answer_time = corrected_answer_time(elapsed, message.get("think_ms"),
+                                                        getattr(client_socket, 'clock', None))
+                    self.server.metrics.answer_latency.observe(elapsed)
+                    self.server.metrics.answer_time_correction.observe(elapsed - answer_time)
+                    timestamp = self.question_sent_time + answer_time
+                else:
+                    timestamp = time.time()  # Question resent after a restart: server time
+                self.answers_received[self.current_question_index][client_name] = {
+                    'answer': answer,
+                    'timestamp': timestamp
+                }
+                self.journal("answer", index=self.current_question_index, name=client_name, answer=answer,
+                             timestamp=timestamp)
+                self.debug("Received answer '%s' from %s", answer, client_name)
+
+                # Check if all connected players answered
+                # Only process if all currently connected players have answered
+                if not self.awaiting_answers and self.clients:
+                    self.log(f"All connected players have answered. Processing answers...")
+                    self.process_question_answers()
+
+    def start_game(self, questions, num_questions, question_frames=None, question_timeout=0):
+        """
+        Starts the quiz game in this room with the given question list.
+        `question_frames` may be shared between rooms playing the same questions.
+        With a question_timeout (seconds), a round closes at its deadline with the
+        answers received so far instead of waiting for every player.
+        The caller validates requirements (question file, 2+ players).
+        """
+        self.questions = questions
+        self.num_questions = num_questions
+        self.question_timeout = question_timeout
+        self.question_frames = question_frames or build_question_frames(questions, num_questions, question_timeout)
+        self.is_game_active = True
+        self.game_started_at = time.perf_counter()
+        self.game_started_time = time.time()
+        self.current_question_index = 0
+        self.answers_received = {}
+        # Only reset scores for currently connected players
+        # Disconnected players' scores should remain on scoreboard
+        for client_socket, client_info in self.clients.items():
+            client_name = client_info['name']
+            self.scores[client_name] = 0
+        self.journal("game_start", questions=self._questions_played(), num_questions=num_questions,
+                     question_timeout=question_timeout, started_time=self.game_started_time, scores=dict(self.scores),
+                     sessions={token: entry['name'] for token, entry in self.sessions.items()})
+
+        self.log(f"Game started with {len(self.clients)} players. {self.num_questions} questions will be asked.")
+
+        # Send initial scoreboard
+        self.send_scoreboard()
+
+        # Send first question
+        self.send_next_question()
+
+    def _questions_played(self):
+        """The questions this game can ask; question i is the (i % len)-th of them, as in self.questions."""
+        return [self.questions[i] for i in range(min(self.num_questions, len(self.questions)))]
+
+    def snapshot(self):
+        """
+        State of the running game for a journal snapshot (see journal.apply_record for the format).
+        Connections, the scoreboard versions and timers are not included: restore() rebuilds them.
+        """
+        return {
+            "questions": self._questions_played(),
+            "num_questions": self.num_questions,
+            "question_timeout": self.question_timeout,
+            "started_time": self.game_started_time,
+            "current_question_index": self.current_question_index,
+            "answers": {str(index): [[name, data['answer'], data['timestamp'], data.get('points')]
+                                     for name, data in answers.items()]
+                        for index, answers in self.answers_received.items()},
+            "scores": self.scores,
+            "sessions": {token: entry['name'] for token, entry in self.sessions.items()}
+        }
+
+    def restore(self, state):
+        """
+        Resumes a game recovered from the journal after a restart. No player is
+        connected yet: every player can come back with its session token within
+        SESSION_RESUME_SECONDS and gets the current question again. The round
+        closes at its deadline (or once the players who came back have answered
+        and the others' sessions have expired), ending the game if fewer than 2 returned.
+        Returns False if the game had already asked all its questions.
+        """
+        if state['current_question_index'] >= state['num_questions'] or not state['questions']:
+            return False
+        self.questions = state['questions']
+        self.num_questions = state['num_questions']
+        self.question_timeout = state['question_timeout']
+        self.question_frames = build_question_frames(self.questions, self.num_questions, self.question_timeout)
+        self.is_game_active = True
+        self.game_started_at = time.perf_counter()
+        self.game_started_time = state['started_time']
+        self.current_question_index = state['current_question_index']
+        self.answers_received = {}
+        for index, rows in state['answers'].items():
+            correct_answer = self.questions[int(index) % len(self.questions)]['correct']
+            answers = self.answers_received[int(index)] = {}
+            for client_name, answer, timestamp, points in rows:
+                answers[client_name] = {'answer': answer, 'timestamp': timestamp}
+                if points is not None:
+                    answers[client_name].update(correct=answer == correct_answer, points=points)
+        self.scores = state['scores']
+        for session, client_name in state['sessions'].items():
+            self.sessions[session] = {
+                'name': client_name,
+                'expiry': self.server.timers.call_later(SESSION_RESUME_SECONDS, self._expire_session, session)
+            }
+            self.session_by_name[client_name] = session
+        self.send_scoreboard()  # Nobody to send to: builds the delta state resumed players are synced from
+
+        # The current question is open again (the journal may end between a scored round and the next
+        # question); everyone who had not answered it owes an answer
+        answers = self.answers_received.setdefault(self.current_question_index, {})
+        self.awaiting_answers = set(self.session_by_name) - set(answers)
+        if self.question_timeout:
+            self.question_deadline = self.server.timers.call_later(
+                self.question_timeout, self.on_question_deadline, self.current_question_index)
+        self.server.timers.call_later(SESSION_RESUME_SECONDS, self._on_recovery_timeout, self.current_question_index)
+
+        self.log(f"Game recovered at question {self.current_question_index + 1}/{self.num_questions} "
+                 f"with {len(self.scores)} players; waiting for them to resume")
+        return True
+
+    def _on_recovery_timeout(self, question_index):
+        """Timer callback: players who did not resume after the restart no longer hold up the round."""
+        if not self.is_game_active or question_index != self.current_question_index:
+            return
+        self.awaiting_answers &= set(self.sockets_by_name)
+        if not self.awaiting_answers:
+            self.process_question_answers()
+
+    def send_next_question(self):
+        """
+        Retrieves the next question and broadcasts it to all players of the room.
+        If no questions remain, ends the game.
+        """
+        # Check player count first
+        if len(self.clients) < 2:
+            self.end_game("Less than 2 players remaining")
+            return
+
+        if self.current_question_index >= self.num_questions:
+            self.end_game("All questions answered")
+            return
+
+        # Get question (reuse if needed)
+        # Verify index is within bounds to prevent crashes, using modulo for endless loops if intended
+        question_index = self.current_question_index % len(self.questions)
+        question = self.questions[question_index]
+
+        self.log(f"Question {self.current_question_index + 1}/{self.num_questions}: {question['question']}")
+
+        # Reset answers for this question; every connected player owes an answer
+        self.answers_received[self.current_question_index] = {}
+        self.awaiting_answers = set(self.sockets_by_name)
+        self.journal("question", index=self.current_question_index)
+
+        # Broadcast question to all connected clients (frame was encoded when the game started)
+        question_frame = self.question_frames[(question_index, self.current_question_index + 1)]
+        self.debug("Broadcasting question %d to %d clients...", self.current_question_index + 1, len(self.clients))
+        client_count = len(self.clients)
+        self.question_sent_at = time.perf_counter()  # Before the fan-out: answer times start when the first copy leaves
+        self.question_sent_time = time.time()
+        self.broadcast_frame(question_frame, "question")
+        self.relay_frame(question_frame, "question")
+        self.debug("Question broadcast completed to %d clients", client_count)
+
+        if self.question_timeout:
+            self.question_deadline = self.server.timers.call_later(
+                self.question_timeout, self.on_question_deadline, self.current_question_index)
+
+    def on_question_deadline(self, question_index):
+        """Timer callback: time is up for the question, close the round with the answers received."""
+        self.question_deadline = None
+        if not self.is_game_active or question_index != self.current_question_index:
+            return
+        answered = len(self.answers_received.get(question_index, ()))
+        self.log(f"Time is up for question {question_index + 1}: {answered} answers, "
+                 f"{len(self.awaiting_answers)} players did not answer")
+        self.awaiting_answers = set()
+        self.process_question_answers()
+
+    def cancel_question_deadline(self):
+        if self.question_deadline is not None:
+            self.question_deadline.cancel()
+            self.question_deadline = None
+
+    def process_question_answers(self):
+        """
+        Evaluates answers for the current question.
+        Calculates scores (including speed bonuses) and sends results to clients.
+        Triggers the next question after processing.
+        """
+        if self.current_question_index not in self.answers_received:
+            return
+        self.cancel_question_deadline()
+
+        # Check if we have enough players before processing
+        if len(self.clients) < 2:
+            self.end_game("Less than 2 players remaining")
+            return
+
+        question = self.questions[self.current_question_index % len(self.questions)]
+        correct_answer = question['correct']
+        answers = self.answers_received[self.current_question_index]
+
+        # Find first correct answer
+        first_correct = None
+        first_correct_time = float('inf')
+
+        for client_name, answer_data in answers.items():
+            if answer_data['answer'] == correct_answer:
+                timestamp = answer_data.get('timestamp', 0)
+                if timestamp < first_correct_time:
+                    first_correct_time = timestamp
+                    first_correct = client_name
+
+        # Calculate scores
+        bonus_points = len(self.clients) - 1 if first_correct else 0
+
+        # Update scores
+        for client_name, answer_data in answers.items():
+            answer = answer_data['answer']
+            answer_data['correct'] = answer == correct_answer
+            answer_data['points'] = 0
+            if answer == correct_answer:
+                points = 1
+                if client_name == first_correct:
+                    points += bonus_points
+                    answer_data['points'] = points
+                    self.scores[client_name] += points
+                    self.log(f"{client_name} answered correctly FIRST and received {points} points (1 + {bonus_points} bonus)")
+                else:
+                    answer_data['points'] = points
+                    self.scores[client_name] += points
+                    self.debug("%s answered correctly and received %d point", client_name, points)
+            else:
+                self.scores[client_name] += 0
+                self.debug("%s answered incorrectly (%s). Correct answer: %s", client_name, answer, correct_answer)
+
+        self.journal("round", index=self.current_question_index,
+                     points={client_name: answer_data['points'] for client_name, answer_data in answers.items()})
+
+        # Send personalized results to each client
+        for client_name, answer_data in answers.items():
+            answer = answer_data['answer']
+            if answer == correct_answer:
+                if client_name == first_correct:
+                    message = f"Correct! You answered first and received {1 + bonus_points} points (1 + {bonus_points} bonus)!"
+                else:
+                    message = f"Correct! You received 1 point."
+            else:
+                message = f"Incorrect. Your answer was {answer}. The correct answer is {correct_answer}. You received 0 points."
+
+            # Find client socket
+            client_socket = self.sockets_by_name.get(client_name)
+
+            if client_socket:
+                self.server.send_message(client_socket, {
+                    "type": "answer_result",
+                    "message": message,
+                    "your_answer": answer,
+                    "correct_answer": correct_answer,
+                    "your_score": self.scores[client_name]
+                })
+
+        # Send updated scoreboard to all
+        self.send_scoreboard()
+
+        # Check player count before moving to next question
+        if len(self.clients) < 2:
+            self.end_game("Less than 2 players remaining")
+            return
+
+        # Move to next question
+        self.current_question_index += 1
+
+        # Send next question
+        self.send_next_question()
+
+    def send_scoreboard(self):
+        """
+        Sends the room's current scoreboard to its connected players.
+
+        Legacy ('full') clients get the whole sorted list every time. 'delta' clients
+        get the top-K entries that changed since the previous version (one frame
+        shared by all of them) and their own entry when it changed, so the bytes
+        sent per update grow linearly with the room size instead of quadratically.
+        A delta client that has not been synced yet gets a snapshot instead.
+        """
+        ranked = sorted(self.scores.items(), key=lambda x: (-x[1], x[0]))
+
+        full_clients = [sock for sock, info in self.clients.items() if info['scoreboard'] == SCOREBOARD_FULL]
+        if full_clients:
+            scoreboard = []
+            for name, score in ranked:
+                scoreboard.append({"name": name, "score": score})
+            self.broadcast_frame(encode_message({
+                "type": "scoreboard",
+                "scoreboard": scoreboard
+            }), "scoreboard", recipients=full_clients)
+
+        # Delta state is kept current even without delta clients: resumed sessions are synced from it
+        self._send_scoreboard_delta(ranked)
+
+    def _send_scoreboard_delta(self, ranked):
+        """
+        Updates the delta scoreboard state for `ranked` ([(name, score)] sorted best first)
+        and sends it to the delta clients, if any.
+        """
+        # Same ranking as the final scoreboard: tied scores share a rank
+        ranks = {}
+        top = {}
+        rank = 0
+        previous_score = None
+        for i, (name, score) in enumerate(ranked):
+            if score != previous_score:
+                rank = i + 1
+                previous_score = score
+            ranks[name] = rank
+            if i < self.top_k:
+                top[name] = (rank, score)
+
+        changed = [{"rank": rank, "name": name, "score": score}
+                   for name, (rank, score) in top.items() if self.scoreboard_top.get(name) != (rank, score)]
+        removed = [name for name in self.scoreboard_top if name not in top]
+        size_changed = len(ranks) != len(self.scoreboard_ranks)
+
+        updated = changed or removed or size_changed
+        if updated:
+            self.scoreboard_version += 1
+        self.scoreboard_top = top
+        self.scoreboard_ranks = ranks
+
+        synced = []
+        unsynced = []
+        for client_socket, info in self.clients.items():
+            if info['scoreboard'] == SCOREBOARD_FULL:
+                continue
+            if info['scoreboard_synced']:
+                synced.append(client_socket)
+            else:
+                unsynced.append(client_socket)
+        if updated and synced:
+            self.broadcast_frame(encode_message({
+                "type": "scoreboard_delta",
+                "version": self.scoreboard_version,
+                "base": self.scoreboard_version - 1,
+                "changed": changed,
+                "removed": removed,
+                "total_players": len(ranks)
+            }), "scoreboard_delta", recipients=synced)
+        if unsynced or (updated and self.relays):
+            snapshot_frame = self._scoreboard_snapshot_frame()
+            if unsynced:
+                self.broadcast_frame(snapshot_frame, "scoreboard_delta", recipients=unsynced)
+            if updated:
+                # Relays keep only the latest snapshot for spectators joining later
+                self.relay_frame(snapshot_frame, "scoreboard_delta")
+
+        # Own entries last: broadcast_frame may have dropped unresponsive clients
+        for client_socket in synced + unsynced:
+            info = self.clients.get(client_socket)
+            if info is not None:
+                info['scoreboard_synced'] = True
+                self._send_scoreboard_self(client_socket, info)
+
+    def _scoreboard_snapshot_frame(self):
+        """Encodes the whole current top-K, for delta clients that have no base version."""
+        top = sorted(self.scoreboard_top.items(), key=lambda x: (x[1][0], x[0]))
+        return encode_message({
+            "type": "scoreboard_delta",
+            "version": self.scoreboard_version,
+            "full": True,
+            "top": [{"rank": rank, "name": name, "score": score} for name, (rank, score) in top],
+            "total_players": len(self.scoreboard_ranks)
+        })
+
+    def _send_scoreboard_self(self, client_socket, info):
+        """Sends a delta client its own rank and score if they changed since it last got them."""
+        name = info['name']
+        entry = (self.scoreboard_ranks.get(name, 0), self.scores.get(name, 0))
+        if info['scoreboard_self'] == entry:
+            return
+        info['scoreboard_self'] = entry
+        self.server.send_message(client_socket, {
+            "type": "scoreboard_self",
+            "version": self.scoreboard_version,
+            "rank": entry[0],
+            "score": entry[1]
+        })
+
+    def is_waiting_for_answers(self):
+        """
+        Checks if we're currently waiting for answers to the current question.
+        Returns True if a question is active and not all connected players have answered.
+        """
+        if not self.is_game_active:
+            return False
+
+        if self.current_question_index not in self.answers_received:
+            return False
+
+        # If there are connected players who haven't answered, we're still waiting
+        return bool(self.awaiting_answers)
+
+    def end_game(self, reason):
+        # Set game as inactive FIRST so new connections can be accepted AND to prevent multiple threads
+        self.is_game_active = False
+        self.question_sent_at = None
+        self.cancel_question_deadline()
+        # Sessions end with the game
+        for session in list(self.sessions):
+            self._drop_session(session)
+        self.session_by_name = {}
+        if self.game_started_at is not None:
+            self.server.metrics.game_seconds.observe(time.perf_counter() - self.game_started_at)
+            self.game_started_at = None
+        self.server.metrics.games_ended.inc(labels=(reason,))
+        self.journal("game_end", reason=reason)
+
+        record = (self.game_started_time, self.num_questions, self.answers_received)
+        self.game_started_time = None
+        self._send_final_results(reason, record)
+
+    def _send_final_results(self, reason, record):
+        """Ranks the players, stores the game and sends game_end to players and relays."""
+        started = time.perf_counter()
+        self.log(f"Game ended: {reason}")
+        self.debug("is_game_active set to False - new connections can now be accepted")
+
+        clients_snapshot = list(self.clients.items()) # List of (socket, info_dict)
+
+        # Calculate rankings
+        sorted_scores = sorted(self.scores.items(), key=lambda x: (-x[1], x[0]))
+        rankings = []
+        current_rank = 1
+
+        for i, (name, score) in enumerate(sorted_scores):
+            if i > 0 and sorted_scores[i-1][1] != score:
+                current_rank = i + 1
+            rankings.append({"rank": current_rank, "name": name, "score": score})
+
+        # Find winners
+        winners = [r for r in rankings if r['rank'] == 1]
+        winner_names = [w['name'] for w in winners]
+
+        if self.server.results is not None:
+            # Written by the store's thread; start_game replaces the answers dict, never modifies it
+            started_time, num_questions, answers = record
+            self.server.results.record_game(self.room_id, started_time, time.time(), reason, num_questions,
+                                            rankings, answers)
+
+        self.log(f"Final rankings:")
+        for i, ranking in enumerate(rankings):
+            # The top of the table is always shown; the rest only in debug logs
+            self.log("  %d. %s: %d points", ranking['rank'], ranking['name'], ranking['score'],
+                     level=INFO if i < 10 else DEBUG)
+
+        # Broadcast to remaining clients
+        remaining_names = [info['name'] for sock, info in clients_snapshot]
+        self.log(f"Sending game_end message to {len(clients_snapshot)} remaining clients")
+        self.debug("Remaining clients: %s", remaining_names)
+
+        # Delta scoreboard clients and relays get the top-K rankings
+        top_rankings = rankings[:self.top_k]
+        top_frame = encode_message({
+            "type": "game_end",
+            "reason": reason,
+            "final_scoreboard": top_rankings,
+            "winners": winner_names
+        })
+        for relay_socket in self.relays:
+            self.server.send_frame(relay_socket, top_frame, "game_end")
+
+        if len(clients_snapshot) == 0:
+            self.log("No clients remaining, skipping game_end message")
+        else:
+            # Encoded once and shared by every recipient
+            frame = encode_message({
+                "type": "game_end",
+                "reason": reason,
+                "final_scoreboard": rankings,
+                "winners": winner_names
+            })
+            # Delta scoreboard clients also get their own ranking when not in the top-K
+            top_names = {r['name'] for r in top_rankings}
+            own_rankings = {r['name']: r for r in rankings[self.top_k:]}
+
+            for client_socket, info in clients_snapshot:
+                client_frame = frame
+                if info['scoreboard'] != SCOREBOARD_FULL:
+                    client_frame = top_frame
+                    if info['name'] not in top_names and info['name'] in own_rankings:
+                        client_frame = encode_message({
+                            "type": "game_end",
+                            "reason": reason,
+                            "final_scoreboard": top_rankings + [own_rankings[info['name']]],
+                            "winners": winner_names
+                        })
+                if self.server.send_frame(client_socket, client_frame, "game_end"):
+                    self.debug("Sent game_end message to %s", info['name'])
+
+            self.log(f"game_end message sent phase completed")
+
+        # Closing waits for the game_end frames to go out; a thread so the GUI doesn't freeze with sleep
+        sockets = [client_socket for client_socket, _ in clients_snapshot]
+        threading.Thread(target=self._end_game_worker, args=(sockets, started), daemon=True).start()
+
+    def _end_game_worker(self, sockets, started):
+        """
+        Background worker: gives the game_end messages a moment to be sent, closes the
+        players' connections, then has the Main Thread reset the room (reset_after_game).
+        """
+        if sockets:
+            # Wait a bit for messages to be sent before closing connections
+            time.sleep(1.0)
+
+        # Close all client connections
+        for client_socket in sockets:
+            try:
+                client_socket.close()
+            except:
+                pass
+
+        self.server.queue.put(("game_closed", self, started))
+
+    def reset_after_game(self, started):
+        """
+        Clears the ended game's players and state once their connections are closed.
+        Executed on the Main Thread (a 'game_closed' event queued by _end_game_worker).
+        """
+        if self.is_game_active:
+            self.log("A new game already started; keeping its players", level=WARNING)
+            return
+
+        # Clear client data
+        self.clients.clear()
+        self.client_names.clear()
+        self.sockets_by_name.clear()
+        self.scores.clear()
+        self.scoreboard_top = {}
+        self.scoreboard_ranks = {}
+
+        # Reset game state
+        self.current_question_index = 0
+        self.answers_received = {}
+        self.awaiting_answers = set()
+        # Keep scores empty as they were cleared above
+
+        self.server.update_clients_list()
+        self.server.update_start_game_button()
+        self.server.metrics.game_end_seconds.observe(time.perf_counter() - started)
+
+        if self.server.is_listening:
+            self.log("Game ended. All connections closed. Server is still listening and ready for new connections.")
+        else:
+            self.log("Game ended. All connections closed.")
+
+    def broadcast_message(self, message, exclude_socket=None):
+        """Broadcast message to all players of this room, optionally excluding one"""
+        # Serialize once; every recipient gets the same immutable bytes
+        self.broadcast_frame(encode_message(message), message.get("type", "unknown"), exclude_socket)
+
+    def broadcast_frame(self, frame, msg_type, exclude_socket=None, recipients=None):
+        """
+        Sends an already encoded frame to all players of this room, optionally excluding one.
+        `recipients` limits the broadcast to the given sockets of this room.
+        """
+
+        # No lock needed - running on main thread via queue.
+        # A failed send is not handled here: the connection's reader reports the
+        # disconnect, and remove_player cleans up as for any other disconnect.
+        started = time.perf_counter()
+        for client_socket in (self.clients.keys() if recipients is None else recipients):
+            if client_socket == exclude_socket:
+                continue  # Skip excluded client
+            if self.server.send_frame(client_socket, frame, msg_type) and msg_type == "game_end":
+                self.debug("Sent game_end message to %s", self.clients[client_socket]['name'])
+        self.server.metrics.broadcast_seconds.observe(time.perf_counter() - started, (msg_type,))
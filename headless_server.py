@@ -0,0 +1,459 @@
+"""
+Headless Quiz Server for containers and automation.
+
+Runs the same QuizServer game logic without Tk. Settings come from an INI
+config file and/or command-line flags (flags win), the log goes to stdout
+(and optionally a rotating file), and games start automatically when a room
+has enough players. SIGTERM or SIGINT ends running games (players get
+game_end), tells waiting players the server is shutting down, and exits.
+
+Config file example (all keys optional):
+
+    [server]
+    port = 12345
+    engine = asyncio
+    question_file = quiz_qa.txt
+    num_questions = 5
+    question_timeout = 30
+    min_players = 2
+    auto_start = min_players
+    auto_start_delay = 10
+    lobby_timeout = 120
+    metrics_port = 9100
+    log_level = INFO
+    log_file = server.log
+    results_db = results.db
+    journal_dir = journal
+    workers = 4
+    handshake_timeout = 10
+    idle_timeout = 30
+
+With workers > 1 the server runs as several processes sharing the port (see supervisor.py);
+they all record finished games in the same results_db (see results_store.py), and
+each journals its running games to its own subdirectory of journal_dir (see journal.py).
+
+Usage:
+    python headless_server.py --config quiz.ini
+    python headless_server.py --question-file quiz_qa.txt --num-questions 10 --min-players 4 --port 12345
+"""
+import argparse
+import configparser
+import heapq
+import itertools
+import os
+import selectors
+import signal
+import sys
+import threading
+import time
+import traceback
+
+from game_room import DEFAULT_ROOM_ID, QUESTION_TIMEOUT_SECONDS
+from clock_sync import PING_INTERVAL_SECONDS
+from liveness import HANDSHAKE_TIMEOUT_SECONDS, IDLE_TIMEOUT_SECONDS
+from server import QuizServer, LOG_VIEW_REFRESH_MS
+from structured_log import format_line, parse_level, INFO, WARNING, ERROR
+
+
+AUTO_START_OFF = "off"
+AUTO_START_MIN_PLAYERS = "min_players"  # Start a room's game once it has min_players (after auto_start_delay)
+SHUTDOWN_GRACE_SECONDS = 5.0  # How long games get to send game_end and close on SIGTERM
+
+DEFAULTS = {
+    "port": 12345,
+    "engine": "asyncio",
+    "question_file": "",
+    "num_questions": 5,
+    "question_timeout": QUESTION_TIMEOUT_SECONDS,
+    "min_players": 2,
+    "auto_start": AUTO_START_MIN_PLAYERS,
+    "auto_start_delay": 10.0,
+    "lobby_timeout": 0,
+    "metrics_port": None,
+    "log_level": INFO,
+    "log_file": None,
+    "results_db": None,
+    "journal_dir": None,
+    "workers": 1,
+    "handshake_timeout": HANDSHAKE_TIMEOUT_SECONDS,
+    "idle_timeout": IDLE_TIMEOUT_SECONDS,
+}
+
+CONVERTERS = {
+    "port": int,
+    "num_questions": int,
+    "question_timeout": float,
+    "min_players": int,
+    "auto_start_delay": float,
+    "lobby_timeout": float,
+    "metrics_port": int,
+    "log_level": parse_level,
+    "workers": int,
+    "handshake_timeout": float,
+    "idle_timeout": float,
+}
+
+
+class EventLoop:
+    """
+    Stand-in for the Tk root when running without a GUI.
+
+    Provides the parts of the Tk API QuizServer uses: after()/after_cancel()
+    timers and title()/geometry()/destroy(). add_reader() lets the server's
+    EventQueue wake the loop as soon as an event is queued. after() may be
+    called from any thread.
+    """
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+        self._timers = []  # Heap of (deadline, id, callback, args)
+        self._cancelled = set()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+        self._wake_read, self._wake_write = os.pipe()
+        os.set_blocking(self._wake_read, False)
+        os.set_blocking(self._wake_write, False)
+        self.add_reader(self._wake_read, self._drain_wakeups)
+
+    def title(self, *args):
+        pass
+
+    def geometry(self, *args):
+        pass
+
+    def after(self, ms, callback, *args):
+        timer_id = next(self._ids)
+        with self._lock:
+            heapq.heappush(self._timers, (time.monotonic() + ms / 1000.0, timer_id, callback, args))
+        if threading.current_thread() is not self._thread:
+            self._wake()
+        return timer_id
+
+    def after_cancel(self, timer_id):
+        with self._lock:
+            self._cancelled.add(timer_id)
+
+    def add_reader(self, fd, callback):
+        self._selector.register(fd, selectors.EVENT_READ, callback)
+
+    def _wake(self):
+        try:
+            os.write(self._wake_write, b'\0')
+        except (BlockingIOError, OSError):
+            pass  # Already woken
+
+    def _drain_wakeups(self):
+        try:
+            while os.read(self._wake_read, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def mainloop(self):
+        """Runs timers and reader callbacks until destroy() is called."""
+        self._thread = threading.current_thread()
+        self._running = True
+        while self._running:
+            with self._lock:
+                timeout = max(0.0, self._timers[0][0] - time.monotonic()) if self._timers else None
+            for key, _ in self._selector.select(timeout):
+                self._run(key.data)
+
+            now = time.monotonic()
+            while self._running:
+                with self._lock:
+                    if not self._timers or self._timers[0][0] > now:
+                        break
+                    _, timer_id, callback, args = heapq.heappop(self._timers)
+                    if timer_id in self._cancelled:
+                        self._cancelled.discard(timer_id)
+                        continue
+                self._run(callback, *args)
+
+    def _run(self, callback, *args):
+        # Like Tk: an exception in a callback is reported and the loop keeps going
+        try:
+            callback(*args)
+        except Exception:
+            traceback.print_exc()
+
+    def destroy(self):
+        self._running = False
+        self._wake()
+
+
+class Setting:
+    """Plain value holder with the StringVar methods QuizServer uses (get/set/trace_add)."""
+    def __init__(self, value=""):
+        self._value = str(value)
+        self._callbacks = []
+
+    def get(self):
+        return self._value
+
+    def set(self, value):
+        self._value = str(value)
+        for callback in self._callbacks:
+            callback()
+
+    def trace_add(self, mode, callback):
+        self._callbacks.append(lambda: callback(mode))
+
+
+class NullWidget:
+    """Accepts the widget calls QuizServer makes (config, insert, delete, see) and ignores them."""
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class HeadlessQuizServer(QuizServer):
+    """
+    QuizServer driven by a config instead of widgets.
+    The log is written to `console`, and update_start_game_button is replaced
+    by the auto-start policy.
+    """
+    shutdown_signals = (signal.SIGTERM, signal.SIGINT)
+
+    def __init__(self, loop, config, console=sys.stdout):
+        self.config = config
+        self.console = console
+        self.auto_start_timers = {}  # {room_id: Timer} of rooms waiting to auto-start
+        self.shutting_down = False
+        super().__init__(loop, metrics_port=config["metrics_port"], log_level=config["log_level"],
+                         log_file=config["log_file"], results_db=config["results_db"],
+                         journal_dir=config["journal_dir"], handshake_timeout=config["handshake_timeout"],
+                         idle_timeout=config["idle_timeout"])
+
+    def setup_gui(self):
+        config = self.config
+        self.port_var = Setting(config["port"])
+        self.engine_var = Setting(config["engine"])
+        self.room_var = Setting(DEFAULT_ROOM_ID)
+        self.num_questions_var = Setting(config["num_questions"])
+        self.question_timeout_var = Setting(f"{config['question_timeout']:g}")
+        self.question_file_var = Setting(config["question_file"])
+        self.start_button = self.start_game_button = NullWidget()
+        self.available_questions_label = self.clients_listbox = self.log_listbox = NullWidget()
+
+        self.log(f"Headless server: engine={config['engine']}, {config['num_questions']} questions, "
+                 f"{config['question_timeout']:g}s to answer, auto_start={config['auto_start']} "
+                 f"(min {config['min_players']} players, {config['auto_start_delay']:g}s delay, "
+                 f"lobby timeout {config['lobby_timeout']:g}s)")
+        self.on_question_file_changed()
+
+    def refresh_log_view(self):
+        """Writes the log records added since the last refresh to the console."""
+        records = self.logger.records_since(self.log_view_sequence)
+        if records:
+            self.log_view_sequence = records[-1][0]
+            self.console.write("".join(format_line(record) + "\n" for record in records))
+            self.console.flush()
+        self.root.after(LOG_VIEW_REFRESH_MS, self.refresh_log_view)
+
+    def show_error(self, title, message):
+        self.log(f"{title}: {message}", level=ERROR)
+
+    def update_clients_list(self):
+        pass  # No client list to show
+
+    def update_start_game_button(self):
+        pass  # Games are started by the auto-start policy (see _handle_connect_event)
+
+    def _handle_connect_event(self, client_socket, address, client_name, room_id, handshake):
+        super()._handle_connect_event(client_socket, address, client_name, room_id, handshake)
+        self.schedule_auto_start(room_id)
+
+    def schedule_auto_start(self, room_id):
+        """
+        Starts the room's game auto_start_delay seconds after it reaches min_players.
+        With a lobby_timeout, a room that has 2+ players but never reaches
+        min_players starts anyway lobby_timeout seconds after its second player joined.
+        """
+        if self.config["auto_start"] != AUTO_START_MIN_PLAYERS or self.shutting_down:
+            return
+        room = self.rooms.get(room_id)
+        if room is None or room.is_game_active:
+            return
+        player_count = len(room.clients)
+        if player_count >= self.config["min_players"]:
+            delay, required = self.config["auto_start_delay"], self.config["min_players"]
+        elif player_count >= 2 and self.config["lobby_timeout"]:
+            delay, required = self.config["lobby_timeout"], 2
+        else:
+            return
+
+        # Keep a pending timer that fires sooner (e.g. the lobby timeout is almost over)
+        timer = self.auto_start_timers.get(room_id)
+        if timer is not None and not timer.cancelled:
+            if timer.remaining() <= delay:
+                return
+            timer.cancel()
+        self.log(f"Room '{room_id}' has {player_count} players; starting in {delay:g}s")
+        self.auto_start_timers[room_id] = self.timers.call_later(delay, self._auto_start, room_id, required)
+
+    def _auto_start(self, room_id, required):
+        self.auto_start_timers.pop(room_id, None)
+        room = self.rooms.get(room_id)
+        if self.shutting_down or room is None or room.is_game_active:
+            return
+        if len(room.clients) < required:
+            self.log(f"Room '{room_id}' auto-start skipped: only {len(room.clients)} players", level=WARNING)
+            self.schedule_auto_start(room_id)  # The lobby timeout may still apply
+            return
+        self.start_game(room_id)
+
+    def run(self):
+        """Starts listening and runs until SIGTERM/SIGINT. Returns the process exit code."""
+        self.start_server()
+        if not self.is_listening:
+            self.refresh_log_view()
+            return 1
+        for signum in self.shutdown_signals:
+            signal.signal(signum, self._on_signal)
+        self.root.mainloop()
+        self.refresh_log_view()  # Flush the last records
+        return 0
+
+    def _on_signal(self, signum, frame):
+        if self.shutting_down:
+            # Second signal: stop waiting for games to wind down
+            self.root.after(0, self.on_closing)
+            return
+        self.root.after(0, self.shutdown, signal.Signals(signum).name)
+
+    def shutdown(self, reason):
+        """
+        Graceful stop: ends running games (players get game_end), tells waiting
+        players the server is going away, then stops the server once the games
+        have closed their connections or SHUTDOWN_GRACE_SECONDS have passed.
+        """
+        if self.shutting_down:
+            return
+        self.shutting_down = True
+        self.log(f"Received {reason}, shutting down...")
+        for timer in self.auto_start_timers.values():
+            timer.cancel()
+        self.auto_start_timers.clear()
+
+        ending = []
+        for room in list(self.rooms.values()):
+            if room.is_game_active:
+                room.end_game("Server is shutting down")
+                ending.append(room)
+            else:
+                room.broadcast_message({"type": "server_shutdown", "message": "Server is shutting down"})
+        self._finish_shutdown(ending, time.monotonic() + SHUTDOWN_GRACE_SECONDS)
+
+    def _finish_shutdown(self, ending, deadline):
+        # An end_game worker clears its room's clients once game_end has been sent
+        if any(room.clients for room in ending) and time.monotonic() < deadline:
+            self.root.after(100, self._finish_shutdown, ending, deadline)
+            return
+        self.on_closing()
+
+
+def load_config(path=None, overrides=None):
+    """
+    Builds the server settings from DEFAULTS, the [server] section of an INI
+    file and command-line overrides (in that order). Raises ValueError on
+    invalid values.
+    """
+    config = dict(DEFAULTS)
+    if path:
+        parser = configparser.ConfigParser()
+        if not parser.read(path):
+            raise ValueError(f"Cannot read config file: {path}")
+        if parser.has_section("server"):
+            for key, value in parser.items("server"):
+                if key not in DEFAULTS:
+                    raise ValueError(f"Unknown setting '{key}' in {path}")
+                config[key] = value
+    for key, value in (overrides or {}).items():
+        if value is not None:
+            config[key] = value
+
+    for key, convert in CONVERTERS.items():
+        value = config[key]
+        if isinstance(value, str):
+            value = value.strip()
+            try:
+                config[key] = convert(value) if value else None
+            except ValueError:
+                raise ValueError(f"Invalid value for {key}: {value!r}")
+    for key in ("question_file", "log_file", "results_db", "journal_dir"):
+        config[key] = (config[key] or "").strip() or None
+    if config["question_file"] is None:
+        config["question_file"] = ""
+    if config["log_level"] is None:
+        config["log_level"] = INFO
+
+    if config["port"] is None or not 1 <= config["port"] <= 65535:
+        raise ValueError("port must be between 1 and 65535")
+    if config["engine"] not in ("threads", "asyncio"):
+        raise ValueError("engine must be 'threads' or 'asyncio'")
+    if config["workers"] is None or config["workers"] < 1:
+        raise ValueError("workers must be at least 1")
+    if config["num_questions"] is None or config["num_questions"] < 1:
+        raise ValueError("num_questions must be at least 1")
+    if config["min_players"] is None or config["min_players"] < 2:
+        raise ValueError("min_players must be at least 2")
+    if config["auto_start"] not in (AUTO_START_OFF, AUTO_START_MIN_PLAYERS):
+        raise ValueError(f"auto_start must be '{AUTO_START_OFF}' or '{AUTO_START_MIN_PLAYERS}'")
+    for key in ("question_timeout", "auto_start_delay", "lobby_timeout", "handshake_timeout", "idle_timeout"):
+        if config[key] is None:
+            config[key] = 0
+        if config[key] < 0:
+            raise ValueError(f"{key} must be 0 or more seconds")
+    if 0 < config["idle_timeout"] < 3 * PING_INTERVAL_SECONDS:
+        raise ValueError(f"idle_timeout must be 0 or at least {3 * PING_INTERVAL_SECONDS:g} seconds (3 pings)")
+    if config["auto_start"] != AUTO_START_OFF and not config["question_file"]:
+        raise ValueError("question_file is required when auto_start is enabled")
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", help="INI file with a [server] section")
+    parser.add_argument("--port", help="Port to listen on (default 12345)")
+    parser.add_argument("--engine", choices=["threads", "asyncio"], help="Network engine (default asyncio)")
+    parser.add_argument("--question-file", help="Question file")
+    parser.add_argument("--num-questions", help="Questions per game (default 5)")
+    parser.add_argument("--question-timeout",
+                        help=f"Seconds to answer each question, 0 = wait for every player (default {QUESTION_TIMEOUT_SECONDS})")
+    parser.add_argument("--min-players", help="Players needed before a room's game auto-starts (default 2)")
+    parser.add_argument("--auto-start", choices=[AUTO_START_OFF, AUTO_START_MIN_PLAYERS],
+                        help="Auto-start policy (default min_players)")
+    parser.add_argument("--auto-start-delay", help="Seconds to wait for more players once min_players is reached")
+    parser.add_argument("--lobby-timeout",
+                        help="Start with fewer than min_players (but 2+) after this many seconds (default 0 = never)")
+    parser.add_argument("--metrics-port", help="Serve Prometheus metrics on this port")
+    parser.add_argument("--log-level", help="DEBUG, INFO, WARNING or ERROR")
+    parser.add_argument("--log-file", help="Also write the log as JSON lines to this file")
+    parser.add_argument("--results-db", help="Record finished games in this SQLite database")
+    parser.add_argument("--journal-dir", help="Journal running games here and recover them after a crash")
+    parser.add_argument("--workers", help="Run this many worker processes sharing the port (see supervisor.py)")
+    parser.add_argument("--handshake-timeout",
+                        help=f"Seconds a new connection has to send its connect message, 0 = no limit "
+                             f"(default {HANDSHAKE_TIMEOUT_SECONDS:g})")
+    parser.add_argument("--idle-timeout",
+                        help=f"Disconnect heartbeating clients silent for this many seconds, 0 = never "
+                             f"(default {IDLE_TIMEOUT_SECONDS:g})")
+    args = parser.parse_args()
+
+    overrides = {key: value for key, value in vars(args).items() if key != "config"}
+    try:
+        config = load_config(args.config, overrides)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if config["workers"] > 1:
+        from supervisor import Supervisor
+        sys.exit(Supervisor(config, config["workers"]).run())
+
+    server = HeadlessQuizServer(EventLoop(), config)
+    sys.exit(server.run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""
+Crash recovery for running games: an append-only journal plus snapshots.
+
+Every room journals the events that change its game state (game started,
+question sent, answer received, round scored, game ended). Appending only
+puts the event on a queue; a writer thread encodes everything queued since
+its last write and commits it with one write and one fsync (group commit), so
+the Main Thread never waits for the disk and a busy server pays one fsync per
+batch instead of one per answer.
+
+Each commit is one frame: a binary header (payload length, CRC32) followed by
+a JSON array of the committed events, so recovery parses a whole group at once
+and a commit torn by a crash is detected and dropped.
+
+Once the journal has grown by as many records as the last snapshot has
+entries (answers and players, at least SNAPSHOT_EVERY_RECORDS), the state of
+all running games is written as a new snapshot, the journal continues in a new
+segment file and older segments are deleted. Snapshots cost amortized O(1) per
+record, and recovery (load the latest snapshot, replay the one segment written
+after it) is bounded by the size of the running games rather than by how long
+the server has been running.
+
+Files in the journal directory:
+    snapshot-00000042.snap   state of the running games when segment 42 began
+    journal-00000042.log     events after that snapshot
+
+Usage (shows what a restart would recover):
+    python journal.py journal_dir
+"""
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+from structured_log import WARNING
+
+
+FRAME_HEADER = struct.Struct('<II')  # Payload length, CRC32 of the payload
+SNAPSHOT_EVERY_RECORDS = 20000  # Fewest journal records between snapshots
+GROUP_COMMIT_MAX_RECORDS = 5000  # Most records written per frame and fsync
+_SNAPSHOT = object()  # Queue item: (_SNAPSHOT, segment, encoded state)
+
+
+def encode_frame(payload):
+    return FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_frames(data):
+    """
+    Yields the payloads of the frames in `data`, stopping at the first frame
+    that is incomplete or corrupt (the commit in progress when the process died).
+    """
+    view = memoryview(data)
+    offset = 0
+    while offset + FRAME_HEADER.size <= len(view):
+        length, crc = FRAME_HEADER.unpack_from(view, offset)
+        start = offset + FRAME_HEADER.size
+        payload = view[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return
+        yield payload
+        offset = start + length
+
+
+def apply_record(games, record_type, room_id, record):
+    """
+    Replays one journal record (the fields of a record_type event of room_id) onto
+    `games` ({room_id: state}, see GameRoom.snapshot).
+    A state's answers are {"<question_index>": [[name, answer, timestamp, points]]}, points
+    being None until the round is scored.
+    """
+    if record_type == "game_start":
+        games[room_id] = {
+            "questions": record['questions'],
+            "num_questions": record['num_questions'],
+            "question_timeout": record['question_timeout'],
+            "started_time": record['started_time'],
+            "current_question_index": 0,
+            "answers": {},
+            "scores": record['scores'],
+            "sessions": record['sessions']
+        }
+        return
+    state = games.get(room_id)
+    if state is None:
+        return  # Game started before the snapshot this journal follows and is not in it: ended
+    if record_type == "question":
+        state['current_question_index'] = record['index']
+        state['answers'][str(record['index'])] = []
+    elif record_type == "answer":
+        state['answers'].setdefault(str(record['index']), []).append(
+            [record['name'], record['answer'], record['timestamp'], None])
+    elif record_type == "round":
+        points = record['points']
+        for row in state['answers'].get(str(record['index']), ()):
+            row[3] = points.get(row[0], 0)
+        scores = state['scores']
+        for name, awarded in points.items():
+            scores[name] = scores.get(name, 0) + awarded
+        state['current_question_index'] = record['index'] + 1
+    elif record_type == "game_end":
+        del games[room_id]
+
+
+def segment_files(directory, prefix, suffix):
+    """Returns [(segment_number, path)] of the matching files in `directory`, oldest first."""
+    segments = []
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and name.endswith(suffix):
+            number = name[len(prefix):-len(suffix)]
+            if number.isdigit():
+                segments.append((int(number), os.path.join(directory, name)))
+    return sorted(segments)
+
+
+def load_games(directory):
+    """
+    Rebuilds the state of the games that were running from the latest snapshot
+    and the journal segments written after it.
+    Returns ({room_id: state}, number of the last segment found, records replayed).
+    """
+    games = {}
+    base = 0
+    snapshots = segment_files(directory, "snapshot-", ".snap")
+    for number, path in reversed(snapshots):
+        with open(path, 'rb') as f:
+            payloads = list(read_frames(f.read()))
+        if payloads:
+            games = json.loads(bytes(payloads[0]))
+            base = number
+            break
+
+    replayed = 0
+    journals = segment_files(directory, "journal-", ".log")
+    for number, path in journals:
+        if number < base:
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        for payload in read_frames(data):
+            records = json.loads(bytes(payload))
+            for record_type, room_id, record in records:
+                apply_record(games, record_type, room_id, record)
+            replayed += len(records)
+    last = max([number for number, _ in snapshots + journals], default=0)
+    return games, last, replayed
+
+
+class GameJournal:
+    """
+    Journal of the game events of every room in a directory.
+
+    append() and snapshot() are called on the Main Thread; `snapshot_source()`
+    returns the state of the running games ({room_id: GameRoom.snapshot()}).
+    Call recover() first, restore the games it returns, then start().
+    """
+    def __init__(self, directory, snapshot_source, snapshot_every=SNAPSHOT_EVERY_RECORDS, fsync=True, log=None,
+                 on_dropped=None):
+        self.directory = directory
+        self.snapshot_source = snapshot_source
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.log = log  # log(message, level=...) reports write errors
+        self.on_dropped = on_dropped  # Called (on the writer thread) with the number of records lost
+        self.records_since_snapshot = 0
+        self.next_snapshot = snapshot_every  # Records after which the next snapshot is taken
+        self.records_written = 0
+        self.records_dropped = 0
+        self.commits = 0
+        self._dropping = False  # Records are being lost; logged when it starts and when it stops
+        self._segment = 0
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        os.makedirs(directory, exist_ok=True)
+
+    def recover(self):
+        """
+        Returns {room_id: state} of the games that were running when the journal was last written.
+        Logs what was recovered and how long it took.
+        """
+        started = time.perf_counter()
+        games, self._segment, replayed = load_games(self.directory)
+        if games or replayed:
+            if self.log:
+                self.log(f"Journal: {len(games)} running games recovered ({replayed} records replayed) "
+                         f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return games
+
+    def start(self):
+        """Starts the writer; the first snapshot starts a fresh segment and removes the recovered files."""
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+        self.snapshot()
+
+    def append(self, record_type, room_id, fields):
+        """Queues one event of room_id. `fields` is encoded on the writer thread and must not be modified."""
+        self._queue.put((record_type, room_id, fields))
+        self.records_since_snapshot += 1
+        if self.records_since_snapshot >= self.next_snapshot:
+            self.snapshot()
+
+    def snapshot(self):
+        """Queues a snapshot of the running games; later records go to a new segment."""
+        self._segment += 1
+        games = self.snapshot_source()
+        state = json.dumps(games, separators=(',', ':')).encode('utf-8')
+        self._queue.put((_SNAPSHOT, self._segment, state))
+        self.records_since_snapshot = 0
+        # Replaying a record costs about as much as loading one snapshot entry
+        entries = sum(len(game['scores']) + sum(len(rows) for rows in game['answers'].values())
+                      for game in games.values())
+        self.next_snapshot = max(self.snapshot_every, entries)
+
+    def close(self, timeout=None):
+        """Writes everything still queued and stops the writer."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def _write_loop(self):
+        segment_file = None
+        segment = None  # Segment the records go to once a snapshot was requested
+        running = True
+        while running:
+            group = [self._queue.get()]
+            while len(group) < GROUP_COMMIT_MAX_RECORDS:
+                try:
+                    group.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            records = []
+            for item in group:
+                if item is None:
+                    running = False
+                elif item[0] is _SNAPSHOT:
+                    segment_file = self._commit(segment_file, segment, records)
+                    records = []
+                    segment = item[1]
+                    segment_file = self._write_snapshot(segment_file, segment, item[2])
+                else:
+                    records.append(item)
+            segment_file = self._commit(segment_file, segment, records)
+        if segment_file is not None:
+            segment_file.close()
+
+    def _commit(self, segment_file, segment, records):
+        """
+        Appends `records` ([(type, room_id, fields)]) to the current segment as one frame, with one fsync.
+        Without an open segment (a snapshot or opening its segment failed), segment `segment` is
+        opened again first. Returns the segment file to use next.
+        """
+        if not records:
+            return segment_file
+        if segment_file is None and segment is not None:
+            # Records after a failed snapshot are replayed after the previous snapshot instead
+            segment_file = self._open_segment(segment)
+        if segment_file is None:
+            self._drop(records, "no journal segment is open")
+            return None
+        try:
+            segment_file.write(encode_frame(json.dumps(records, separators=(',', ':')).encode('utf-8')))
+            segment_file.flush()
+            if self.fsync:
+                os.fsync(segment_file.fileno())
+            self.records_written += len(records)
+            self.commits += 1
+        except OSError as e:
+            self._drop(records, f"write failed: {e}")
+            return segment_file
+        if self._dropping:
+            self._dropping = False
+            if self.log:
+                self.log(f"Journal writes resumed ({self.records_dropped} records dropped so far)", level=WARNING)
+        return segment_file
+
+    def _open_segment(self, segment):
+        try:
+            return open(os.path.join(self.directory, f"journal-{segment:08d}.log"), 'ab')
+        except OSError as e:
+            if self.log and not self._dropping:
+                self.log(f"Journal segment {segment} could not be opened: {e}", level=WARNING)
+            return None
+
+    def _drop(self, records, reason):
+        """Counts records that could not be journaled; logs when dropping starts, not for every commit."""
+        self.records_dropped += len(records)
+        if self.on_dropped:
+            self.on_dropped(len(records))
+        if not self._dropping:
+            self._dropping = True
+            if self.log:
+                self.log(f"Journal records dropped ({reason}); a crash now loses them", level=WARNING)
+
+    def _write_snapshot(self, segment_file, segment, state):
+        """Writes snapshot `segment`, switches to journal segment `segment` and deletes older files."""
+        path = os.path.join(self.directory, f"snapshot-{segment:08d}.snap")
+        try:
+            with open(path + ".tmp", 'wb') as f:
+                f.write(encode_frame(state))
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)  # A crash leaves either the old or the new snapshot, never half of one
+            if segment_file is not None:
+                segment_file.close()
+                segment_file = None
+            segment_file = open(os.path.join(self.directory, f"journal-{segment:08d}.log"), 'ab')
+            for prefix, suffix in (("journal-", ".log"), ("snapshot-", ".snap")):
+                for number, old_path in segment_files(self.directory, prefix, suffix):
+                    if number < segment:
+                        os.remove(old_path)
+        except OSError as e:
+            if self.log:
+                self.log(f"Journal snapshot failed: {e}", level=WARNING)
+        return segment_file
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="Journal directory")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    games, segment, replayed = load_games(args.directory)
+    print(json.dumps({
+        "segment": segment,
+        "records_replayed": replayed,
+        "recovery_ms": round((time.perf_counter() - started) * 1000, 1),
+        "games": {room_id: {
+            "question": state['current_question_index'] + 1,
+            "num_questions": state['num_questions'],
+            "players": len(state['scores']),
+            "top": sorted(state['scores'].items(), key=lambda x: (-x[1], x[0]))[:10]
+        } for room_id, state in games.items()}
+    }, indent=2))
@@ -0,0 +1,76 @@
+"""
+Connection lifecycle timeouts: handshake deadline, heartbeats and TCP keepalive.
+
+Three layers make sure a peer that went away (crashed, unplugged, half-open
+after a NAT or Wi-Fi drop) or never meant to play (a slowloris connection
+trickling bytes) does not hold a socket, a thread or a coroutine forever:
+
+- Handshake deadline: a new connection has `handshake` seconds in total to
+  send its connect/join/subscribe message, however slowly bytes arrive.
+- Heartbeats: connections that negotiated clock sync are pinged every
+  PING_INTERVAL_SECONDS (see clock_sync.py) and answer with a pong, so they
+  send something at least that often. One that sends nothing for `idle`
+  seconds is evicted.
+- TCP keepalive: every connection has keepalive probes on, and on Linux a
+  TCP_USER_TIMEOUT, so the kernel reports dead peers of clients that do not
+  answer pings (older clients), including while data is unacknowledged.
+
+Evicting a connection makes its reader see the connection end, so the server
+reaps it through the usual 'disconnect' event like any other disconnect.
+"""
+import socket
+
+from clock_sync import PING_INTERVAL_SECONDS
+
+
+HANDSHAKE_TIMEOUT_SECONDS = 10.0
+IDLE_TIMEOUT_SECONDS = 30.0  # 15 missed pings
+KEEPALIVE_IDLE_SECONDS = 30  # Idle time before the first keepalive probe
+KEEPALIVE_INTERVAL_SECONDS = 10
+KEEPALIVE_PROBES = 3
+
+
+class ConnectionTimeouts:
+    """
+    Liveness settings shared by every client connection (0 disables a timeout).
+    The idle timeout must leave room for a few pings to be lost or delayed.
+    """
+    def __init__(self, handshake=HANDSHAKE_TIMEOUT_SECONDS, idle=IDLE_TIMEOUT_SECONDS,
+                 keepalive_idle=KEEPALIVE_IDLE_SECONDS, keepalive_interval=KEEPALIVE_INTERVAL_SECONDS,
+                 keepalive_probes=KEEPALIVE_PROBES):
+        if handshake < 0 or idle < 0:
+            raise ValueError("Timeouts must be 0 or more seconds")
+        if idle and idle < 3 * PING_INTERVAL_SECONDS:
+            raise ValueError(f"idle timeout must be at least {3 * PING_INTERVAL_SECONDS:g}s (3 pings)")
+        self.handshake = handshake
+        self.idle = idle
+        self.keepalive_idle = keepalive_idle
+        self.keepalive_interval = keepalive_interval
+        self.keepalive_probes = keepalive_probes
+
+    def configure_socket(self, sock):
+        """
+        Turns TCP keepalive on for a connected socket with this object's timings,
+        where the platform lets us set them. Never raises.
+        """
+        options = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+        for name, value in (("TCP_KEEPIDLE", self.keepalive_idle),
+                            ("TCP_KEEPALIVE", self.keepalive_idle),  # macOS name of TCP_KEEPIDLE
+                            ("TCP_KEEPINTVL", self.keepalive_interval),
+                            ("TCP_KEEPCNT", self.keepalive_probes)):
+            if hasattr(socket, name):
+                options.append((socket.IPPROTO_TCP, getattr(socket, name), value))
+        if hasattr(socket, "TCP_USER_TIMEOUT"):
+            # Keepalive only probes an idle connection; this also drops a peer that stops
+            # acknowledging what we send, after the same time the probes would take
+            user_timeout = self.keepalive_idle + self.keepalive_interval * self.keepalive_probes
+            options.append((socket.IPPROTO_TCP, socket.TCP_USER_TIMEOUT, user_timeout * 1000))
+        for level, option, value in options:
+            try:
+                sock.setsockopt(level, option, value)
+            except OSError:
+                pass  # Not supported for this socket or platform
+
+    def is_idle(self, conn, now):
+        """True if a heartbeating connection sent nothing for longer than the idle timeout."""
+        return bool(self.idle) and now - conn.last_received > self.idle
@@ -0,0 +1,315 @@
+"""
+Headless load generator for the Quiz Server.
+
+Spawns many simulated players ("bots") on one asyncio event loop. Each bot
+follows the same flow as client.py (connect -> question -> answer ->
+answer_result ... -> game_end) without any GUI, so the server's real scaling
+limit can be measured and compared between versions.
+
+Bots answer correctly with a configurable probability (the correct answers
+are read from the question file) after a think time drawn from a configurable
+distribution. The game itself is started on the server as usual.
+
+The report is printed (or written) as JSON:
+- connect throughput and connect latency percentiles
+- question broadcast fan-out: time between the first and the last bot
+  receiving the same question
+- answer -> answer_result latency percentiles
+- bytes received by all bots (compare --scoreboard full and delta)
+- server CPU and RSS (when --server-pid is given, Linux only)
+
+Usage:
+    python loadgen.py --bots 2000 --questions quiz_qa.txt --accuracy 0.7 --think exp:1.5
+    python loadgen.py --bots 2000 --scoreboard delta --questions quiz_qa.txt
+    python loadgen.py --bots 500 --rooms 50 --think uniform:0.5,3 --server-pid 1234 --output run.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+from async_engine import raise_fd_limit
+from metrics import percentiles
+from protocol import (FrameDecoder, ProtocolError, encode_message, PROTOCOL_VERSION, SCOREBOARD_DELTA, SCOREBOARD_FULL,
+                      COMPRESSION_DEFLATE, MAX_SERVER_FRAME_SIZE)
+from question_bank import parse_questions
+
+
+def parse_think_time(spec):
+    """
+    Parses a think-time distribution spec into a function returning seconds.
+    Supported: fixed:S, uniform:LOW,HIGH, exp:MEAN, normal:MEAN,STDDEV, lognormal:MU,SIGMA
+    """
+    kind, _, args = spec.partition(':')
+    try:
+        values = [float(v) for v in args.split(',')] if args else []
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid think time parameters: {spec}")
+
+    if kind == "fixed" and len(values) == 1:
+        return lambda: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "exp" and len(values) == 1 and values[0] > 0:
+        return lambda: random.expovariate(1.0 / values[0])
+    if kind == "normal" and len(values) == 2:
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if kind == "lognormal" and len(values) == 2:
+        return lambda: random.lognormvariate(values[0], values[1])
+    raise argparse.ArgumentTypeError(f"Unknown think time distribution: {spec}")
+
+
+def load_answer_key(filename):
+    """
+    Reads {question text: correct letter} from a question file,
+    so bots can answer correctly on purpose.
+    """
+    with open(filename, 'r', encoding='utf-8') as f:
+        questions = parse_questions(f.read())
+    return {q['question']: q['correct'] for q in questions}
+
+
+class ProcessSampler:
+    """Samples CPU usage and RSS of another process from /proc (Linux only)."""
+    def __init__(self, pid):
+        self.pid = pid
+        self.clock_ticks = os.sysconf('SC_CLK_TCK')
+        self.page_size = os.sysconf('SC_PAGE_SIZE')
+        self.cpu_percent = []
+        self.rss_bytes = []
+
+    def _read(self):
+        with open(f'/proc/{self.pid}/stat', 'r') as f:
+            # Fields after the command name; utime and stime are fields 14 and 15
+            fields = f.read().rsplit(')', 1)[1].split()
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / self.clock_ticks
+        with open(f'/proc/{self.pid}/statm', 'r') as f:
+            rss = int(f.read().split()[1]) * self.page_size
+        return cpu_seconds, rss
+
+    async def run(self, interval=0.5):
+        try:
+            last_cpu, _ = self._read()
+            last_time = time.monotonic()
+            while True:
+                await asyncio.sleep(interval)
+                cpu, rss = self._read()
+                now = time.monotonic()
+                self.cpu_percent.append(100.0 * (cpu - last_cpu) / (now - last_time))
+                self.rss_bytes.append(rss)
+                last_cpu, last_time = cpu, now
+        except (OSError, ValueError, IndexError):
+            pass  # Process gone or /proc not available
+
+    def report(self):
+        if not self.rss_bytes:
+            return None
+        return {
+            "pid": self.pid,
+            "cpu_percent_avg": round(sum(self.cpu_percent) / len(self.cpu_percent), 1),
+            "cpu_percent_max": round(max(self.cpu_percent), 1),
+            "rss_max_bytes": max(self.rss_bytes),
+            "rss_last_bytes": self.rss_bytes[-1]
+        }
+
+
+class Swarm:
+    """Shared configuration and measurements for all bots."""
+    def __init__(self, args):
+        self.host = args.host
+        self.port = args.port
+        self.rooms = args.rooms
+        self.accuracy = args.accuracy
+        self.think_time = args.think
+        self.scoreboard = args.scoreboard
+        self.compression = COMPRESSION_DEFLATE if args.compression else None
+        self.answer_key = load_answer_key(args.questions) if args.questions else {}
+        self.connect_semaphore = asyncio.Semaphore(args.connect_concurrency)
+
+        self.connected = 0
+        self.rejected = 0
+        self.failed = 0
+        self.games_completed = 0
+        self.bytes_received = 0
+        self.connect_latency = []
+        self.answer_latency = []
+        self.question_received = {}  # {(room, question_number): [first_time, last_time, count]}
+        self.first_connect = None
+        self.last_connect = None
+
+
+class Bot:
+    """One simulated player, mirroring QuizClient.receive_messages/submit_answer."""
+    def __init__(self, swarm, index):
+        self.swarm = swarm
+        self.name = f"bot{index}"
+        self.room = f"room{index % swarm.rooms}" if swarm.rooms > 1 else None
+        self.writer = None
+        self.answer_sent_at = None
+
+    async def run(self):
+        swarm = self.swarm
+        async with swarm.connect_semaphore:
+            started = time.perf_counter()
+            try:
+                reader, self.writer = await asyncio.open_connection(swarm.host, swarm.port)
+            except OSError:
+                swarm.failed += 1
+                return
+            hello = {"type": "join" if self.room else "connect", "name": self.name,
+                     "protocol": PROTOCOL_VERSION, "scoreboard": swarm.scoreboard, "clock_sync": True}
+            if self.room:
+                hello["room"] = self.room
+            if swarm.compression:
+                hello["compression"] = [swarm.compression]
+            self.writer.write(encode_message(hello))
+
+        decoder = FrameDecoder(PROTOCOL_VERSION, MAX_SERVER_FRAME_SIZE, compression=swarm.compression)
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                swarm.bytes_received += len(data)
+                for message in decoder.feed(data):
+                    if not self.handle_message(message, started):
+                        return
+        except (OSError, ProtocolError):
+            pass
+        finally:
+            self.writer.close()
+
+    def handle_message(self, message, started):
+        """Handles one server message. Returns False when the bot is done."""
+        swarm = self.swarm
+        msg_type = message.get("type")
+        now = time.perf_counter()
+
+        if msg_type == "ping":
+            self.writer.write(encode_message({"type": "pong", "id": message.get("id"), "time": time.monotonic()}))
+
+        elif msg_type == "connection_accepted":
+            swarm.connected += 1
+            swarm.connect_latency.append(now - started)
+            swarm.first_connect = swarm.first_connect or started
+            swarm.last_connect = now
+
+        elif msg_type == "connection_error":
+            swarm.rejected += 1
+            return False
+
+        elif msg_type == "question":
+            key = (self.room, message.get("question_number"))
+            seen = swarm.question_received.get(key)
+            if seen is None:
+                swarm.question_received[key] = [now, now, 1]
+            else:
+                seen[1] = now
+                seen[2] += 1
+            asyncio.ensure_future(self.answer(message, time.monotonic()))
+
+        elif msg_type == "answer_result":
+            if self.answer_sent_at is not None:
+                swarm.answer_latency.append(now - self.answer_sent_at)
+                self.answer_sent_at = None
+
+        elif msg_type in ("game_end", "server_shutdown"):
+            if msg_type == "game_end":
+                swarm.games_completed += 1
+            return False
+
+        return True
+
+    async def answer(self, question, received_at):
+        """Thinks, then answers like QuizClient.submit_answer."""
+        await asyncio.sleep(self.swarm.think_time())
+        correct = self.swarm.answer_key.get(question.get("question"))
+        if correct and random.random() < self.swarm.accuracy:
+            answer = correct
+        else:
+            choices = [c for c in ("A", "B", "C") if c != correct]
+            answer = random.choice(choices)
+        if self.writer.is_closing():
+            return
+        self.answer_sent_at = time.perf_counter()
+        self.writer.write(encode_message({"type": "answer", "answer": answer,
+                                          "question_number": question.get("question_number"),
+                                          "think_ms": round((time.monotonic() - received_at) * 1000)}))
+
+
+async def run_swarm(args):
+    swarm = Swarm(args)
+    sampler = ProcessSampler(args.server_pid) if args.server_pid else None
+    sampler_task = asyncio.ensure_future(sampler.run()) if sampler else None
+
+    started = time.perf_counter()
+    bots = [Bot(swarm, i) for i in range(args.bots)]
+    tasks = [asyncio.ensure_future(bot.run()) for bot in bots]
+    done, pending = await asyncio.wait(tasks, timeout=args.timeout)
+    for task in pending:
+        task.cancel()
+    elapsed = time.perf_counter() - started
+
+    if sampler_task:
+        sampler_task.cancel()
+
+    connect_seconds = (swarm.last_connect - swarm.first_connect) if swarm.connected else None
+    fanout = [last - first for first, last, count in swarm.question_received.values() if count > 1]
+    return {
+        "bots": args.bots,
+        "rooms": args.rooms,
+        "connected": swarm.connected,
+        "rejected": swarm.rejected,
+        "failed": swarm.failed,
+        "timed_out": len(pending),
+        "elapsed_seconds": round(elapsed, 3),
+        "connect": {
+            "seconds": round(connect_seconds, 3) if connect_seconds is not None else None,
+            "per_second": round(swarm.connected / connect_seconds, 1) if connect_seconds else None,
+            "latency_ms": percentiles(swarm.connect_latency)
+        },
+        "questions_broadcast": len(swarm.question_received),
+        "question_fanout_ms": percentiles(fanout),
+        "answer_result_latency_ms": percentiles(swarm.answer_latency),
+        "games_completed": swarm.games_completed,
+        "scoreboard": swarm.scoreboard,
+        "compression": swarm.compression,
+        "bytes_received": swarm.bytes_received,
+        "server": sampler.report() if sampler else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12345)
+    parser.add_argument("--bots", type=int, default=100, help="Number of simulated players")
+    parser.add_argument("--rooms", type=int, default=1, help="Spread bots over this many rooms")
+    parser.add_argument("--questions", help="Question file, used to answer correctly on purpose")
+    parser.add_argument("--accuracy", type=float, default=0.5, help="Probability of a correct answer (0-1)")
+    parser.add_argument("--think", type=parse_think_time, default=parse_think_time("uniform:0.5,2"),
+                        help="Think time distribution (default uniform:0.5,2)")
+    parser.add_argument("--scoreboard", choices=[SCOREBOARD_FULL, SCOREBOARD_DELTA], default=SCOREBOARD_FULL,
+                        help="Scoreboard mode the bots request (default full)")
+    parser.add_argument("--compression", action="store_true", help="Request compressed frames for large messages")
+    parser.add_argument("--connect-concurrency", type=int, default=200,
+                        help="Maximum connection attempts in flight")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Give up after this many seconds")
+    parser.add_argument("--server-pid", type=int, help="Server process to sample CPU/RSS from")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    report = asyncio.run(run_swarm(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""
+Metrics for the Quiz Server, exposed over HTTP in the Prometheus text format.
+
+Counters and histograms are updated on hot paths (every frame sent, every
+answer), so updates never take a lock: each thread writes to its own shard and
+the shards are only summed when the endpoint is scraped. When a thread exits,
+its shard is folded into a shared total, so per-connection threads do not
+leave a shard behind each. Gauges are callbacks evaluated at scrape time.
+
+Scrape with:
+    curl http://127.0.0.1:9100/metrics
+"""
+import bisect
+import threading
+import weakref
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (64, 128, 256, 512, 1024, 4096, 16384, 65536, 262144, 1048576)
+DURATION_BUCKETS = (0.01, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def percentiles(samples):
+    """Summarizes latency samples (seconds) as milliseconds percentiles."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+
+    def pick(p):
+        index = min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered))) - 1))
+        return round(ordered[index] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "p50": pick(50),
+        "p90": pick(90),
+        "p99": pick(99),
+        "max": round(ordered[-1] * 1000, 3)
+    }
+
+
+class _ShardHolder:
+    """Per-thread owner of a shard; its finalizer runs when the thread's locals are freed."""
+    __slots__ = ('shard', '__weakref__')
+
+    def __init__(self):
+        self.shard = {}
+
+
+class _ShardedMetric:
+    """Base for metrics whose values live in one dictionary per writing thread."""
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}  # Values of the threads that exited, merged
+        self._shards_lock = threading.Lock()  # Only taken when a thread writes for the first or last time
+
+    def _shard(self):
+        try:
+            return self._local.holder.shard
+        except AttributeError:
+            holder = self._local.holder = _ShardHolder()
+            with self._shards_lock:
+                self._shards.append(holder.shard)
+            weakref.finalize(holder, self._retire, holder.shard)
+            return holder.shard
+
+    def _retire(self, shard):
+        # The thread that owned `shard` has exited, so nothing writes to it any more
+        with self._shards_lock:
+            self._shards = [other for other in self._shards if other is not shard]
+            self._merge(self._retired, shard.items())
+
+    def _merge(self, totals, items):
+        raise NotImplementedError
+
+    def _snapshot_shards(self):
+        with self._shards_lock:
+            shards = list(self._shards)
+            snapshot = [[(labels, value[:] if isinstance(value, list) else value)
+                         for labels, value in self._retired.items()]]
+        # A writer may add a key while we copy; retry that shard
+        for shard in shards:
+            while True:
+                try:
+                    snapshot.append(list(shard.items()))
+                    break
+                except RuntimeError:
+                    continue
+        return snapshot
+
+    def _totals(self):
+        totals = {}
+        for items in self._snapshot_shards():
+            self._merge(totals, items)
+        return totals
+
+
+class Counter(_ShardedMetric):
+    """Monotonic counter, optionally split by label values."""
+    kind = "counter"
+
+    def inc(self, amount=1, labels=()):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def _merge(self, totals, items):
+        for labels, value in items:
+            totals[labels] = totals.get(labels, 0) + value
+
+    def total(self):
+        """Sum over all label values (for reports)."""
+        return sum(self._totals().values())
+
+    def collect(self):
+        lines = []
+        for labels, value in sorted(self._totals().items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_ShardedMetric):
+    """Histogram with fixed bucket upper bounds, optionally split by label values."""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets, label_names=()):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, labels=()):
+        shard = self._shard()
+        state = shard.get(labels)
+        if state is None:
+            # Per-bucket counts (not cumulative), then sum and count
+            state = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    def _merge(self, totals, items):
+        for labels, state in items:
+            total = totals.get(labels)
+            if total is None:
+                totals[labels] = list(state)
+            else:
+                for i, value in enumerate(state):
+                    total[i] += value
+
+    def collect(self):
+        lines = []
+        for labels, state in sorted(self._totals().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state):
+                cumulative += count
+                label_text = _format_labels(self.label_names, labels, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            label_text = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{label_text} {state[-1]}")
+        return lines
+
+
+class Gauge:
+    """
+    Value computed by a callback when the metrics are scraped. With label_names,
+    the callback returns {label values: value}, one series per entry.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, help_text, func, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.func = func
+        self.label_names = tuple(label_names)
+
+    def collect(self):
+        try:
+            if not self.label_names:
+                return [f"{self.name} {_format_value(self.func())}"]
+            return [f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+                    for labels, value in sorted(self.func().items())]
+        except Exception:
+            return []  # Source not available (e.g. server stopped); skip this scrape
+
+
+class MetricsRegistry:
+    """Holds every metric and renders them in the Prometheus text format."""
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help_text, label_names=()):
+        return self._register(Counter(name, help_text, label_names))
+
+    def histogram(self, name, help_text, buckets, label_names=()):
+        return self._register(Histogram(name, help_text, buckets, label_names))
+
+    def gauge(self, name, help_text, func, label_names=()):
+        return self._register(Gauge(name, help_text, func, label_names))
+
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+class ServerMetrics:
+    """The Quiz Server's metrics. Gauges are added by the server, which owns their sources."""
+    def __init__(self, registry=None):
+        self.registry = registry or MetricsRegistry()
+        registry = self.registry
+        self.messages_sent = registry.histogram(
+            "quiz_message_sent_bytes", "Size of frames sent to clients, by message type",
+            SIZE_BUCKETS, ("type",))
+        self.messages_received = registry.histogram(
+            "quiz_message_received_bytes", "Size of frames received from clients, by message type",
+            SIZE_BUCKETS, ("type",))
+        self.events_dispatched = registry.counter(
+            "quiz_events_dispatched_total", "Events handled by process_queue, by event type", ("event",))
+        self.broadcast_seconds = registry.histogram(
+            "quiz_broadcast_fanout_seconds", "Time to hand one broadcast to every player of a room, by message type",
+            LATENCY_BUCKETS, ("type",))
+        self.answer_latency = registry.histogram(
+            "quiz_answer_latency_seconds", "Time from question broadcast to the answer being received",
+            LATENCY_BUCKETS)
+        self.client_rtt = registry.histogram(
+            "quiz_client_rtt_seconds", "Round trips measured by ping/pong, one sample per pong", LATENCY_BUCKETS)
+        self.answer_time_correction = registry.histogram(
+            "quiz_answer_time_correction_seconds",
+            "Server-measured answer time minus the RTT-corrected time the answer is ranked by", LATENCY_BUCKETS)
+        self.game_seconds = registry.histogram(
+            "quiz_game_duration_seconds", "Time from game start to game end", DURATION_BUCKETS)
+        self.game_end_seconds = registry.histogram(
+            "quiz_game_end_seconds", "Time to rank players, send game_end and close connections at game end",
+            DURATION_BUCKETS)
+        self.games_ended = registry.counter("quiz_games_ended_total", "Games ended, by reason", ("reason",))
+        self.sessions_resumed = registry.counter(
+            "quiz_sessions_resumed_total", "Players who reconnected with their session token")
+        self.journal_records_dropped = registry.counter(
+            "quiz_journal_records_dropped_total", "Game events that could not be written to the journal")
+        self.connections_handed_off = registry.counter(
+            "quiz_connections_handed_off_total", "Connections passed to the worker process owning their room")
+        self.frames_compressed = registry.counter(
+            "quiz_frames_compressed_total", "Frames compressed (once per broadcast), by message type", ("type",))
+        self.compression_input_bytes = registry.counter(
+            "quiz_compression_input_bytes_total", "Size of the frames compressed, by message type", ("type",))
+        self.compression_output_bytes = registry.counter(
+            "quiz_compression_output_bytes_total", "Compressed size of those frames, by message type", ("type",))
+        self.compression_cpu_seconds = registry.counter(
+            "quiz_compression_cpu_seconds_total", "CPU time spent compressing frames")
+
+    def frame_sent(self, msg_type, size):
+        self.messages_sent.observe(size, (msg_type,))
+
+    def frame_compressed(self, msg_type, size, compressed_size, cpu_seconds):
+        self.frames_compressed.inc(labels=(msg_type,))
+        self.compression_input_bytes.inc(size, (msg_type,))
+        self.compression_output_bytes.inc(compressed_size, (msg_type,))
+        self.compression_cpu_seconds.inc(cpu_seconds)
+
+    def frame_received(self, message, size):
+        """FrameDecoder observer: counts one decoded client frame."""
+        self.messages_received.observe(size, (str(message.get("type", "unknown")),))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes are not worth a log line
+
+
+class MetricsExporter:
+    """HTTP endpoint serving a MetricsRegistry at /metrics, from a background thread."""
+    def __init__(self, registry, host="127.0.0.1", port=9100):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._httpd = None
+
+    def start(self):
+        """Binds and starts serving. Raises OSError if the port is not available."""
+        self._httpd = ThreadingHTTPServer((self.host, self.port), _MetricsHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.registry = self.registry
+        self.port = self._httpd.server_address[1]
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
@@ -0,0 +1,160 @@
+import os
+import socket
+import threading
+import time
+
+
+class SlowConsumerError(OSError):
+    """Raised by sendall() when a client is disconnected for not reading fast enough."""
+
+
+class OutboundLimits:
+    """
+    Backpressure settings shared by every client connection.
+
+    - Queued bytes above high_watermark mark a client as congested; it is no longer
+      congested once its queue drains below low_watermark.
+    - A client that stays congested for slow_consumer_timeout seconds, or whose
+      queue grows beyond max_queue_bytes, is disconnected.
+    """
+    def __init__(self, high_watermark=256 * 1024, low_watermark=64 * 1024,
+                 max_queue_bytes=1024 * 1024, slow_consumer_timeout=10.0):
+        if not 0 <= low_watermark <= high_watermark <= max_queue_bytes:
+            raise ValueError("Expected low_watermark <= high_watermark <= max_queue_bytes")
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.max_queue_bytes = max_queue_bytes
+        self.slow_consumer_timeout = slow_consumer_timeout
+
+    def check(self, conn, queued_bytes):
+        """
+        Updates conn.congested_since for the current queue size.
+        Returns the reason the client must be evicted, or None.
+        """
+        if queued_bytes > self.max_queue_bytes:
+            return f"outbound queue exceeded {self.max_queue_bytes} bytes"
+        if queued_bytes > self.high_watermark:
+            if conn.congested_since is None:
+                conn.congested_since = time.monotonic()
+            elif time.monotonic() - conn.congested_since > self.slow_consumer_timeout:
+                return f"congested for more than {self.slow_consumer_timeout:g}s"
+        elif queued_bytes <= self.low_watermark:
+            conn.congested_since = None
+        return None
+
+
+class QueuedSocketConnection:
+    """
+    Client socket with a bounded outbound queue, used by the threaded engine.
+
+    sendall() only appends to the queue and returns immediately, so the Main Thread
+    never blocks on a client with a full receive window. A per-connection writer
+    thread drains the queue. recv() and settimeout() are passed through to the
+    socket for the client's reader thread (handle_client).
+    """
+    def __init__(self, sock, address, limits):
+        self.sock = sock
+        self.address = address
+        self.limits = limits
+        self.queued_bytes = 0
+        self.congested_since = None
+        self.evicted_reason = None
+        self.compression = None  # Negotiated in the handshake (see protocol.negotiate_compression)
+        self.clock = None  # clock_sync.ClockEstimator when the client negotiated clock sync
+        self.last_received = time.perf_counter()  # Updated by the reader thread (see liveness.py)
+        self._frames = []
+        self._closing = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def recv(self, bufsize):
+        return self.sock.recv(bufsize)
+
+    @property
+    def closed(self):
+        """True once the connection is closing, closed or evicted: sends would fail."""
+        return self._closing or self._closed or self.evicted_reason is not None
+
+    def settimeout(self, timeout):
+        """Timeout of recv(); only changed while nothing is being sent (before the handshake)."""
+        self.sock.settimeout(timeout)
+
+    def sendall(self, data):
+        with self._cond:
+            if self._closing or self._closed:
+                raise OSError(self.evicted_reason or "Connection is closed")
+            self._frames.append(data)
+            self.queued_bytes += len(data)
+            reason = self.limits.check(self, self.queued_bytes)
+            if reason is None:
+                self._cond.notify()
+                return
+        self.evict(reason)
+        raise SlowConsumerError(f"Slow client {self.address} disconnected: {reason}")
+
+    def evict(self, reason):
+        """Drops everything still queued and closes the connection immediately."""
+        with self._cond:
+            if self._closed:
+                return
+            self.evicted_reason = reason
+            self._frames = []
+            self.queued_bytes = 0
+            self._cond.notify()
+        self._shutdown()
+
+    def close(self):
+        """Closes the connection after the writer has sent everything already queued."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+
+    def detach(self):
+        """
+        Hands the connection over to another process: returns a duplicate of the
+        socket's file descriptor and closes this side without shutting the TCP
+        connection down. Only used before anything was sent.
+        """
+        fd = os.dup(self.sock.fileno())
+        with self._cond:
+            self._closed = True
+            self._closing = True
+            self._cond.notify()
+        self.sock.close()
+        return fd
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                while not self._frames and not self._closing and self.evicted_reason is None:
+                    self._cond.wait()
+                if not self._frames:
+                    break
+                # Send everything queued so far with one system call
+                chunk = b"".join(self._frames)
+                self._frames = []
+            try:
+                self.sock.sendall(chunk)
+            except OSError:
+                break
+            with self._cond:
+                self.queued_bytes = max(0, self.queued_bytes - len(chunk))
+                self.limits.check(self, self.queued_bytes)
+        self._shutdown()
+
+    def _shutdown(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+        try:
+            # shutdown() also wakes the reader thread blocked in recv()
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self.sock.close()
+        except OSError:
+            pass
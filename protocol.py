@@ -0,0 +1,299 @@
+import json
+import re
+import struct
+import zlib
+
+
+# Wire protocol versions:
+# 0 - Legacy clients: raw JSON objects with no delimiter (server -> client is newline-delimited)
+# 1 - Newline-delimited JSON frames in both directions, announced with "protocol": 1 in 'connect'
+PROTOCOL_VERSION = 1
+LEGACY_PROTOCOL_VERSION = 0
+
+MAX_FRAME_SIZE = 1024 * 1024  # Largest message accepted from a peer (bytes)
+MAX_SERVER_FRAME_SIZE = 64 * 1024 * 1024  # Largest message a client accepts (final scoreboards grow with the room)
+RECV_BUFFER_SIZE = 65536  # Bytes read per FrameDecoder.receive() call
+
+# Scoreboard modes, requested with "scoreboard": "delta" in 'connect':
+# full  - every update is the whole sorted scoreboard ('scoreboard' message)
+# delta - versioned changes to a top-K leaderboard plus the player's own entry
+#         ('scoreboard_delta' / 'scoreboard_self' messages, protocol 1 and up)
+SCOREBOARD_FULL = "full"
+SCOREBOARD_DELTA = "delta"
+
+# Compression, requested with "compression": ["deflate-dict1"] in 'connect' (protocol 1 and up).
+# The server then sends frames of COMPRESS_MIN_BYTES or more as a binary frame: a zero byte
+# (no JSON frame starts with one), the 4-byte big-endian length of the data, and the JSON
+# message (without the newline) as raw DEFLATE data compressed with PRESET_DICTIONARY.
+# Every frame is compressed on its own, so a broadcast is compressed once for all recipients.
+COMPRESSION_DEFLATE = "deflate-dict1"
+COMPRESS_MIN_BYTES = 512
+COMPRESSION_LEVEL = 6
+COMPRESSION_WINDOW_BITS = 13  # 8 KB window: 4x cheaper to set up per frame than 32 KB, same ratio on scoreboards
+COMPRESSED_FRAME_HEADER = struct.Struct('>BI')  # 0, length of the compressed data
+
+# Clients that send "clock_sync": true in 'connect' (protocol 1 and up) are pinged and answer
+# with a pong, and time their answers themselves ("think_ms"); see clock_sync.py.
+
+# Strings the large messages repeat, so even the first entries of a frame compress well.
+# DEFLATE reaches the end of the dictionary most cheaply, so the most common strings are last.
+# Changing it requires a new COMPRESSION_DEFLATE name.
+PRESET_DICTIONARY = (
+    b'{"type": "question", "question_number": 1, "total_questions": 10, "question": "", '
+    b'"A": "", "B": "", "C": "", "time_limit": 30}'
+    b'{"type": "scoreboard_delta", "version": 2, "base": 1, "changed": [], "removed": [], "full": true, '
+    b'"top": [], "total_players": 100}'
+    b'{"type": "session_resumed", "game_active": true, "score": 0, "rank": 1, "answered": false}'
+    b'{"type": "game_end", "reason": "All questions answered", "winners": ["player1"], '
+    b'"final_scoreboard": [{"rank": 1, "name": "player1", "score": 10}, {"rank": 2, "name": "player2", "score": 9}]}'
+    b'{"type": "scoreboard", "scoreboard": [{"name": "player1", "score": 10}, {"name": "player2", "score": 9}, '
+    b'{"name": "player3", "score": 8}, {"name": "player4", "score": 7}]}'
+)
+
+# Bytes that delimit a legacy JSON object, outside and inside strings. They are ASCII,
+# which never occurs inside a multi-byte UTF-8 character, so the raw bytes can be scanned.
+_OBJECT_TOKENS = re.compile(rb'[{}"]')
+_STRING_TOKENS = re.compile(rb'["\\]')
+
+
+class ProtocolError(Exception):
+    """Raised when a peer sends data that can never form a valid frame."""
+
+
+def encode_message(message):
+    """Encodes one message as a newline-terminated JSON frame."""
+    return json.dumps(message).encode('utf-8') + b'\n'
+
+
+def negotiate_version(message):
+    """
+    Returns the protocol version to use with a peer, given its 'connect' message.
+    Old clients don't send a "protocol" field and get the legacy version.
+    """
+    try:
+        requested = int(message.get("protocol", LEGACY_PROTOCOL_VERSION))
+    except (TypeError, ValueError):
+        return LEGACY_PROTOCOL_VERSION
+    return max(LEGACY_PROTOCOL_VERSION, min(requested, PROTOCOL_VERSION))
+
+
+def negotiate_scoreboard(message, version):
+    """Returns the scoreboard mode for a peer, given its 'connect' message and protocol version."""
+    if version >= 1 and message.get("scoreboard") == SCOREBOARD_DELTA:
+        return SCOREBOARD_DELTA
+    return SCOREBOARD_FULL
+
+
+def negotiate_compression(message, version):
+    """
+    Returns the compression to use when sending to a peer (COMPRESSION_DEFLATE or None),
+    given its 'connect' message and protocol version.
+    """
+    requested = message.get("compression")
+    if isinstance(requested, str):
+        requested = [requested]
+    if version >= 1 and isinstance(requested, list) and COMPRESSION_DEFLATE in requested:
+        return COMPRESSION_DEFLATE
+    return None
+
+
+def negotiate_clock_sync(message, version):
+    """True if a peer's 'connect' message asks to be pinged for RTT and clock offset estimation."""
+    return version >= 1 and message.get("clock_sync") is True
+
+
+def compress_frame(frame):
+    """Compresses an encoded (newline-terminated) frame into a compressed frame."""
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, -COMPRESSION_WINDOW_BITS,
+                                  zdict=PRESET_DICTIONARY)
+    data = compressor.compress(memoryview(frame)[:-1]) + compressor.flush()
+    return COMPRESSED_FRAME_HEADER.pack(0, len(data)) + data
+
+
+class FrameDecoder:
+    """
+    Incremental decoder turning a TCP byte stream into JSON messages.
+
+    feed() accepts whatever recv() returned and returns every complete message,
+    so a read may contain half a frame or many frames. Bytes are appended to one
+    bytearray; the scan for the delimiter resumes where the previous feed stopped
+    and consumed bytes are dropped once per feed, so a frame split across many
+    reads is never re-scanned or re-copied.
+
+    receive() reads from a blocking socket with recv_into() into a buffer
+    allocated once, so a client reading a multi-megabyte scoreboard does not
+    allocate a bytes object per read either.
+
+    Until the handshake is negotiated the decoder runs in legacy mode, which
+    also accepts back-to-back JSON objects without delimiters (old clients).
+    With `compression` (a client that requested it), compressed frames are
+    accepted between the lines from the start, since the server may send one
+    right behind its connection_accepted.
+
+    `observer(message, size)`, if given, is called for every decoded message
+    with its size on the wire (used for metrics).
+    """
+    def __init__(self, version=LEGACY_PROTOCOL_VERSION, max_frame_size=MAX_FRAME_SIZE, observer=None,
+                 compression=None):
+        self.version = version
+        self.compression = compression
+        self.max_frame_size = max_frame_size
+        self.observer = observer
+        self.buffer = bytearray()
+        self.errors = 0  # Frames dropped because they were not valid JSON objects
+        self._scan_pos = 0  # Where the next delimiter search starts
+        self._depth = 0  # Legacy mode: brace depth and string state at _scan_pos
+        self._in_string = False
+        self._recv_view = None  # memoryview of the receive() buffer, allocated on first use
+
+    def set_version(self, version):
+        """Switches framing after negotiation; bytes already buffered are kept."""
+        self.version = version
+        self._scan_pos = 0
+        self._depth = 0
+        self._in_string = False
+
+    def feed(self, data):
+        """Adds received bytes and returns the list of complete messages (dicts)."""
+        self.buffer += data
+        if self.version >= PROTOCOL_VERSION:
+            return self._decode_lines()
+        return self._decode_legacy()
+
+    def receive(self, sock):
+        """Reads once from `sock` and returns the complete messages, or None when the peer closed."""
+        if self._recv_view is None:
+            self._recv_view = memoryview(bytearray(RECV_BUFFER_SIZE))
+        size = sock.recv_into(self._recv_view)
+        if not size:
+            return None
+        return self.feed(self._recv_view[:size])
+
+    def _decode_lines(self):
+        messages = []
+        buffer = self.buffer
+        start = 0
+        while start < len(buffer):
+            if self.compression and buffer[start] == 0:
+                frame_end = self._parse_compressed_frame(buffer, start, messages)
+                if frame_end is None:
+                    break  # Incomplete
+                start = frame_end
+                continue
+            # All complete lines up to the next compressed frame (JSON text never contains a zero byte)
+            scan_from = max(start, self._scan_pos)
+            limit = buffer.find(b'\0', scan_from) if self.compression else -1
+            end = buffer.rfind(b'\n', scan_from, len(buffer) if limit < 0 else limit)
+            if end < 0:
+                break
+            self._parse_lines(buffer, start, end, messages)
+            start = end + 1
+        if start:
+            del buffer[:start]
+        self._scan_pos = len(buffer)
+        if len(buffer) > self.max_frame_size:
+            raise ProtocolError(f"Frame exceeds {self.max_frame_size} bytes")
+        return messages
+
+    def _parse_compressed_frame(self, buffer, start, messages):
+        """Decodes the compressed frame at `start`. Returns where the next frame starts, or None if incomplete."""
+        if len(buffer) - start < COMPRESSED_FRAME_HEADER.size:
+            return None
+        _, length = COMPRESSED_FRAME_HEADER.unpack_from(buffer, start)
+        if length > self.max_frame_size:
+            raise ProtocolError(f"Frame exceeds {self.max_frame_size} bytes")
+        data_start = start + COMPRESSED_FRAME_HEADER.size
+        if len(buffer) - data_start < length:
+            return None
+        decompressor = zlib.decompressobj(-15, zdict=PRESET_DICTIONARY)
+        try:
+            # Bounded, so a small frame cannot expand into gigabytes
+            frame = decompressor.decompress(memoryview(buffer)[data_start:data_start + length], self.max_frame_size)
+        except zlib.error:
+            raise ProtocolError("Corrupt compressed frame")
+        if decompressor.unconsumed_tail:
+            raise ProtocolError(f"Frame exceeds {self.max_frame_size} bytes")
+        self._parse_frame(frame, messages, COMPRESSED_FRAME_HEADER.size + length)
+        return data_start + length
+
+    def _parse_lines(self, buffer, start, end, messages):
+        """Parses the newline-separated frames in buffer[start:end], decoding the text once for all of them."""
+        with memoryview(buffer) as view:
+            try:
+                lines = str(view[start:end], 'utf-8').split('\n')
+            except UnicodeDecodeError:
+                lines = bytes(view[start:end]).split(b'\n')  # Only the frames with invalid UTF-8 are dropped
+        for line in lines:
+            if line:
+                self._parse_frame(line, messages)
+
+    def _parse_frame(self, frame, messages, wire_size=None):
+        try:
+            message = json.loads(frame)
+        except (ValueError, UnicodeDecodeError):
+            self.errors += 1
+            return
+        if isinstance(message, dict):
+            messages.append(message)
+            if self.observer:
+                if wire_size is None:
+                    wire_size = (len(frame) if isinstance(frame, (bytes, bytearray)) or frame.isascii()
+                                 else len(frame.encode('utf-8'))) + 1
+                self.observer(message, wire_size)
+        else:
+            self.errors += 1
+
+    def _decode_legacy(self):
+        """
+        Splits back-to-back JSON objects by tracking brace depth and strings, resuming
+        where the previous feed stopped, so a large object arriving in many reads is
+        scanned once. Bytes outside an object (or an object that is not valid JSON)
+        are dropped up to the next '{', as a bad read was dropped before framing existed.
+        """
+        messages = []
+        buffer = self.buffer
+        start = 0  # Start of the object being scanned; everything before it is consumed
+        pos, depth, in_string = self._scan_pos, self._depth, self._in_string
+        while True:
+            if depth == 0:
+                # Between objects: skip to the next one
+                next_object = buffer.find(b'{', start)
+                end = len(buffer) if next_object < 0 else next_object
+                if buffer[start:end].strip():
+                    self.errors += 1
+                if next_object < 0:
+                    start = pos = len(buffer)
+                    break
+                start, pos, depth = next_object, next_object + 1, 1
+                continue
+            match = (_STRING_TOKENS if in_string else _OBJECT_TOKENS).search(buffer, pos)
+            if match is None:
+                pos = len(buffer)
+                break  # Incomplete object - wait for more data
+            token = buffer[match.start()]
+            pos = match.end()
+            if in_string:
+                if token == 0x5c:  # Backslash: skip the escaped character
+                    if pos >= len(buffer):
+                        pos = match.start()  # Rescanned once the escaped character arrives
+                        break
+                    pos += 1
+                else:
+                    in_string = False
+            elif token == 0x22:
+                in_string = True
+            elif token == 0x7b:
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    with memoryview(buffer) as view:
+                        self._parse_frame(bytes(view[start:pos]), messages, pos - start)
+                    start = pos
+
+        if start:
+            del buffer[:start]
+        self._scan_pos, self._depth, self._in_string = pos - start, depth, in_string
+        if len(buffer) > self.max_frame_size:
+            raise ProtocolError(f"Frame exceeds {self.max_frame_size} bytes")
+        return messages
@@ -0,0 +1,502 @@
+import hashlib
+import mmap
+import os
+import struct
+import threading
+
+from game_room import build_question_frames
+
+
+def parse_correct_answer(line):
+    """
+    Parses the answer line of a question ("Answer: A", "ANSWER A" or just "A").
+    Returns 'A', 'B' or 'C', or the invalid value that was found.
+    """
+    # Parse correct answer (remove "Answer: " prefix if present)
+    correct_answer_line = line.upper().strip()
+    correct_answer = None
+
+    if correct_answer_line.startswith("ANSWER:"):
+        correct_answer = correct_answer_line[7:].strip()
+    elif correct_answer_line.startswith("ANSWER"):
+        # Handle "ANSWER A" format
+        parts = correct_answer_line.split()
+        if len(parts) > 1:
+            correct_answer = parts[1].strip()
+    else:
+        correct_answer = correct_answer_line.strip()
+
+    # Extract just the letter (A, B, or C)
+    if correct_answer:
+        # Remove any extra characters, keep only A, B, or C
+        correct_answer = correct_answer[0] if len(correct_answer) > 0 else None
+    return correct_answer
+
+
+def parse_question_record(lines):
+    """
+    Builds a question dict from the 5 stripped, non-empty lines of one question.
+    Returns None if the correct answer is not A, B or C.
+    """
+    # Parse question text
+    question_text = lines[0]
+
+    # Parse choice A (remove "A - " prefix if present)
+    choice_a = lines[1]
+    if choice_a.startswith("A - "):
+        choice_a = choice_a[4:].strip()
+    elif choice_a.startswith("A:"):
+        choice_a = choice_a[2:].strip()
+
+    # Parse choice B (remove "B - " prefix if present)
+    choice_b = lines[2]
+    if choice_b.startswith("B - "):
+        choice_b = choice_b[4:].strip()
+    elif choice_b.startswith("B:"):
+        choice_b = choice_b[2:].strip()
+
+    # Parse choice C (remove "C - " prefix if present)
+    choice_c = lines[3]
+    if choice_c.startswith("C - "):
+        choice_c = choice_c[4:].strip()
+    elif choice_c.startswith("C:"):
+        choice_c = choice_c[2:].strip()
+
+    correct_answer = parse_correct_answer(lines[4])
+    if correct_answer not in ['A', 'B', 'C']:
+        return None
+
+    return {
+        'question': question_text,
+        'A': choice_a,
+        'B': choice_b,
+        'C': choice_c,
+        'correct': correct_answer
+    }
+
+
+def parse_questions(text, log=None):
+    """
+    Parse questions from the text of a question file.
+    Format: Each question spans 5 lines:
+    - Line 1: Question text
+    - Line 2: Choice A (can be "A - [text]" or just "[text]")
+    - Line 3: Choice B (can be "B - [text]" or just "[text]")
+    - Line 4: Choice C (can be "C - [text]" or just "[text]")
+    - Line 5: Correct answer (can be "Answer: A" or just "A")
+    Warnings about skipped questions go to `log`.
+    """
+    log = log or (lambda message: None)
+    questions = []
+
+    # Remove empty lines and strip whitespace
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+
+    # Each question is 5 lines
+    if len(lines) % 5 != 0:
+        log(f"Warning: File has {len(lines)} lines, which is not a multiple of 5. Some questions may be incomplete.")
+
+    for i in range(0, len(lines), 5):
+        if i + 4 < len(lines):
+            question = parse_question_record(lines[i:i + 5])
+
+            # Validate correct answer
+            if question is None:
+                log(f"Warning: Invalid correct answer '{lines[i + 4]}' (parsed as '{parse_correct_answer(lines[i + 4])}') for question {len(questions) + 1}. Skipping.")
+                continue
+
+            questions.append(question)
+        else:
+            log(f"Warning: Incomplete question at line {i + 1}. Skipping.")
+
+    return questions
+
+
+# Sidecar offset index (<question file>.idx) for very large question files:
+# header, then one little-endian uint64 per valid question with the byte offset
+# of its first line in the text file.
+INDEX_MAGIC = b'QZIDX1\x00\x00'
+INDEX_HEADER = struct.Struct('<8sQqQ32s')  # magic, source size, source mtime_ns, count, sha256
+INDEX_OFFSET = struct.Struct('<Q')
+INDEX_THRESHOLD_BYTES = 16 * 1024 * 1024  # Files at least this large are indexed instead of parsed
+
+
+def index_path_for(path):
+    return path + ".idx"
+
+
+def _decode_line(line):
+    """Text of one raw line of a large question file, exactly as the indexer and the reader both see it."""
+    return line.decode('utf-8', 'replace').strip()
+
+
+def build_question_index(path, log=None):
+    """
+    Scans a question file once and writes its sidecar offset index.
+    Only the answer line of each question is parsed, and nothing is kept in memory
+    but the offsets. Returns the index path.
+    """
+    log = log or (lambda message: None)
+    index_path = index_path_for(path)
+    # Unique, as the watcher and a reader that found its file edited may build at the same time
+    tmp_path = f"{index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    digest = hashlib.sha256()
+    count = skipped = 0
+
+    with open(path, 'rb') as source, open(tmp_path, 'wb') as out:
+        stat = os.fstat(source.fileno())
+        out.write(INDEX_HEADER.pack(INDEX_MAGIC, 0, 0, 0, b'\x00' * 32))  # Placeholder
+        offset = 0
+        record_offset = None
+        record_lines = 0
+        for line in source:
+            digest.update(line)
+            text = _decode_line(line)
+            if text:
+                if record_lines == 0:
+                    record_offset = offset
+                record_lines += 1
+                if record_lines == 5:
+                    record_lines = 0
+                    if parse_correct_answer(text) in ('A', 'B', 'C'):
+                        out.write(INDEX_OFFSET.pack(record_offset))
+                        count += 1
+                    else:
+                        skipped += 1
+            offset += len(line)
+        out.seek(0)
+        out.write(INDEX_HEADER.pack(INDEX_MAGIC, stat.st_size, stat.st_mtime_ns, count, digest.digest()))
+
+    # Replace atomically so readers never see a half-written index
+    os.replace(tmp_path, index_path)
+    if skipped:
+        log(f"Warning: Skipped {skipped} questions with an invalid correct answer in {path}")
+    if record_lines:
+        log(f"Warning: Incomplete question at the end of {path}. Skipping.")
+    return index_path
+
+
+class IndexedQuestions:
+    """
+    Read-only sequence of questions backed by a memory-mapped offset index.
+
+    len() and questions[i] are O(1): the offset of question i is read from the
+    index and only its 5 lines are read from the text file and parsed. A game
+    only ever touches the questions it asks.
+
+    If the file is edited in place while in use (its size or mtime no longer
+    match the index), the index is rebuilt before the next read; a question
+    that still cannot be read is skipped for the next one, with a warning.
+    """
+    def __init__(self, path, index_path, cache_size=1024, log=None):
+        self.path = path
+        self.index_path = index_path
+        self.log = log or (lambda message: None)
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._cache_size = cache_size
+        self._open()
+
+    def _open(self):
+        index_file = open(self.index_path, 'rb')
+        try:
+            index = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, source_size, source_mtime_ns, count, digest = INDEX_HEADER.unpack_from(index, 0)
+            if magic != INDEX_MAGIC or len(index) != INDEX_HEADER.size + count * INDEX_OFFSET.size:
+                raise ValueError(f"Corrupt question index: {self.index_path}")
+            # Keep our own handle so a replaced file keeps serving this version
+            source = open(self.path, 'rb')
+        except BaseException:
+            index_file.close()
+            raise
+        self._index_file, self._index, self._source = index_file, index, source
+        self.source_size, self.source_mtime_ns, self._count = source_size, source_mtime_ns, count
+        self.digest = digest.hex()
+        if self._source_changed():
+            raise ValueError(f"Question index is out of date: {self.index_path}")
+
+    def _source_changed(self):
+        stat = os.fstat(self._source.fileno())
+        return (stat.st_size, stat.st_mtime_ns) != (self.source_size, self.source_mtime_ns)
+
+    def _reopen(self):
+        """Rebuilds the index of the file as it is now. Called with the lock held."""
+        self.log(f"Warning: {self.path} changed on disk while in use; rebuilding its index")
+        for handle in (self._source, self._index, self._index_file):
+            handle.close()
+        build_question_index(self.path, self.log)
+        self._open()
+        self._cache.clear()
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("question index out of range")
+        question = self._cache.get(i)
+        if question is None:
+            question = self._read(i)
+            if len(self._cache) >= self._cache_size:
+                self._cache.clear()
+            self._cache[i] = question
+        return question
+
+    def _read(self, i):
+        with self._lock:
+            if self._source_changed():
+                self._reopen()
+            for skipped in range(self._count):
+                question = self._read_record((i + skipped) % self._count)
+                if question is not None:
+                    if skipped:
+                        self.log(f"Warning: Question {i} in {self.path} could not be read; "
+                                 f"skipped {skipped} question(s)")
+                    return question
+        raise ValueError(f"No readable question left in {self.path}")
+
+    def _read_record(self, i):
+        offset, = INDEX_OFFSET.unpack_from(self._index, INDEX_HEADER.size + i * INDEX_OFFSET.size)
+        lines = []
+        self._source.seek(offset)
+        while len(lines) < 5:
+            line = self._source.readline()
+            if not line:
+                break
+            line = _decode_line(line)
+            if line:
+                lines.append(line)
+        return parse_question_record(lines) if len(lines) == 5 else None
+
+
+def index_is_current(path, stat):
+    """True if the sidecar index of path exists and was built for this version of the file."""
+    try:
+        with open(index_path_for(path), 'rb') as f:
+            magic, size, mtime_ns, _, _ = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+    except (OSError, struct.error):
+        return False
+    return magic == INDEX_MAGIC and (size, mtime_ns) == (stat.st_size, stat.st_mtime_ns)
+
+
+def open_indexed_questions(path, stat, log=None):
+    """
+    Opens the sidecar index of a large question file, (re)building it when it is
+    missing or was built for a different version of the file.
+    """
+    index_path = index_path_for(path)
+    try:
+        questions = IndexedQuestions(path, index_path, log=log)
+        if (questions.source_size, questions.source_mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+            return questions
+    except (OSError, ValueError, struct.error):
+        pass
+    if log:
+        log(f"Building question index for {path} (one-time scan)...")
+    build_question_index(path, log)
+    return IndexedQuestions(path, index_path, log=log)
+
+
+class QuestionBank:
+    """
+    One parsed version of a question file. Its questions never change:
+    a reload creates a new QuestionBank, so games holding this one are unaffected.
+    `questions` is a tuple, or an IndexedQuestions sequence for very large files.
+    """
+    def __init__(self, path, mtime_ns, size, digest, questions, version):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.digest = digest  # sha256 of the file contents
+        self.questions = tuple(questions) if isinstance(questions, list) else questions
+        self.version = version
+        self._frames = {}  # {(num_questions, time_limit): frames} cache, see question_frames()
+
+    def __len__(self):
+        return len(self.questions)
+
+    def question_frames(self, num_questions, time_limit=None):
+        """Pre-encoded question messages for a game of num_questions (built once per count and time limit)."""
+        key = (num_questions, time_limit)
+        frames = self._frames.get(key)
+        if frames is None:
+            frames = build_question_frames(self.questions, num_questions, time_limit)
+            self._frames[key] = frames
+        return frames
+
+
+class QuestionBankManager:
+    """
+    Caches parsed question banks keyed by path, mtime, size and content hash.
+
+    get() is a dictionary lookup once a path is known. warm() loads a path in a
+    background thread, so building the index of a very large file never stalls
+    the Main Thread; a get() before that is done parses the file directly. A
+    watcher thread stats the known files and, when one changes, parses it and
+    swaps the new QuestionBank in with a single assignment. Games that already
+    started keep their old bank.
+    """
+    def __init__(self, log=None, on_reload=None, poll_interval=1.0, index_threshold=INDEX_THRESHOLD_BYTES):
+        self.log = log or (lambda message: None)
+        self.on_reload = on_reload  # Called (from a background thread) with a loaded or reloaded bank, or None
+        self.poll_interval = poll_interval
+        self.index_threshold = index_threshold  # Larger files use a sidecar offset index
+        self._banks = {}  # {path: QuestionBank or None if missing/unreadable}
+        self._stat_keys = {}  # {path: (mtime_ns, size)} last seen on disk, also for unusable files
+        self._versions = 0
+        self._stop = threading.Event()
+        self._load_lock = threading.Lock()
+        self._warming = {}  # {path: thread loading it in the background}
+        self._warm_lock = threading.Lock()  # Orders a warm-up's result against get()'s fallback
+        self._watcher = None
+
+    def get(self, path):
+        """Returns the current QuestionBank for path, or None if it cannot be loaded."""
+        try:
+            return self._banks[path]
+        except KeyError:
+            pass
+        if path not in self._warming and not self._needs_index_build(path):
+            bank = self._load(path, None)
+            self._banks[path] = bank
+            self._ensure_watcher()
+            return bank
+
+        # The index is still being built in the background: parse the file meanwhile
+        self.warm(path)
+        try:
+            bank = self._parse(path, os.stat(path), None)
+        except OSError:
+            bank = None
+        with self._warm_lock:
+            if path in self._warming:
+                self._banks[path] = bank  # Replaced by the indexed bank when the warm-up is done
+            return self._banks.get(path, bank)
+
+    def peek(self, path):
+        """Returns the QuestionBank for path if it is already loaded, without touching the file."""
+        return self._banks.get(path)
+
+    def warm(self, path):
+        """
+        Loads path in a background thread (building its index if it is a very large file)
+        unless it is loaded or loading already. on_reload is called when it is ready.
+        """
+        with self._warm_lock:
+            if path in self._banks or path in self._warming:
+                return
+            thread = self._warming[path] = threading.Thread(target=self._warm, args=(path,), daemon=True)
+        thread.start()
+
+    def _warm(self, path):
+        bank = self._load(path, None)
+        with self._warm_lock:
+            if self._warming.get(path) is not threading.current_thread():
+                return  # Forgotten meanwhile
+            del self._warming[path]
+            self._banks[path] = bank
+        self._ensure_watcher()
+        if self.on_reload:
+            self.on_reload(path, bank)
+
+    def forget(self, path):
+        """Stops watching a path (e.g. when the GUI switches to another file)."""
+        with self._warm_lock:
+            self._warming.pop(path, None)
+            self._banks.pop(path, None)
+        self._stat_keys.pop(path, None)
+
+    def stop(self):
+        self._stop.set()
+
+    def _needs_index_build(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return stat.st_size >= self.index_threshold and not index_is_current(path, stat)
+
+    def _ensure_watcher(self):
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch_loop, daemon=True)
+            self._watcher.start()
+
+    def _watch_loop(self):
+        while not self._stop.wait(self.poll_interval):
+            for path, bank in list(self._banks.items()):
+                if path in self._warming:
+                    continue  # The warm-up installs the current version
+                new_bank = self._load(path, bank)
+                if new_bank is not bank and path in self._banks:
+                    # Atomic swap: readers see either the old or the new version
+                    self._banks[path] = new_bank
+                    if self.on_reload:
+                        self.on_reload(path, new_bank)
+
+    def _load(self, path, current):
+        """
+        Loads path unless its mtime and size are unchanged since the last look.
+        Returns `current` itself when nothing changed.
+        """
+        with self._load_lock:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self._stat_keys.pop(path, None)
+                return None
+            stat_key = (stat.st_mtime_ns, stat.st_size)
+            if self._stat_keys.get(path) == stat_key:
+                return current
+            self._stat_keys[path] = stat_key
+
+            if stat.st_size >= self.index_threshold:
+                return self._load_indexed(path, stat, current)
+            return self._parse(path, stat, current)
+
+    def _parse(self, path, stat, current):
+        """Reads and parses the whole file. Returns `current` itself if its contents are unchanged."""
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            text = data.decode('utf-8')
+        except PermissionError:
+            self.log(f"Permission denied: Cannot read {path}")
+            return None
+        except (OSError, UnicodeDecodeError) as e:
+            self.log(f"Error loading question file {path}: {e}")
+            return None
+
+        digest = hashlib.sha256(data).hexdigest()
+        if current is not None and current.digest == digest:
+            # Touched but not edited - keep the parsed questions
+            return current
+
+        questions = parse_questions(text, self.log)
+        if not questions:
+            return None
+        self._versions += 1
+        return QuestionBank(path, stat.st_mtime_ns, stat.st_size, digest, questions, self._versions)
+
+    def _load_indexed(self, path, stat, current):
+        """Loads a very large file through its offset index, without parsing every question."""
+        try:
+            questions = open_indexed_questions(path, stat, self.log)
+        except (OSError, ValueError) as e:
+            self.log(f"Error indexing question file {path}: {e}")
+            return None
+        if current is not None and current.digest == questions.digest:
+            return current
+        if not len(questions):
+            return None
+        self._versions += 1
+        return QuestionBank(path, stat.st_mtime_ns, stat.st_size, questions.digest, questions, self._versions)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Build the sidecar offset index for a large question file.")
+    parser.add_argument("--build-index", metavar="FILE", required=True, help="Question file to index")
+    args = parser.parse_args()
+    print(f"Index written: {build_question_index(args.build_index, print)}")
@@ -0,0 +1,287 @@
+"""
+Spectator relay for the Quiz Server.
+
+Spectators are read-only viewers of a room. They connect to a relay instead
+of the Quiz Server; the relay subscribes once per room to the server (a
+'subscribe' connection, see GameRoom.add_relay) and fans every question,
+scoreboard (top-K snapshot) and game_end it receives out to all of that
+room's spectators. However many spectators watch, the server sends each
+frame once per relay, and spectators never count as players.
+
+Spectator protocol (newline-delimited JSON, like players):
+    -> {"type": "spectate", "room": "main", "protocol": 1, "compression": ["deflate-dict1"]}
+    <- {"type": "spectate_accepted", "room": "main", "compression": "deflate-dict1" or null}
+    <- the latest question and scoreboard (or the last game_end), then every new one
+
+The relay subscribes to a room when its first spectator arrives and drops the
+subscription when the last one leaves; a lost upstream connection is retried
+with backoff while spectators wait. The relay answers the server's pings, and
+treats an upstream that stays silent for the idle timeout as lost; spectators
+must send 'spectate' within the handshake deadline (see liveness.py). Slow spectators are disconnected by the
+same outbound limits as players. With --workers N, N relay processes share
+the port (SO_REUSEPORT) and each subscribes on its own.
+
+Usage:
+    python relay.py --upstream 127.0.0.1:12345 --port 12400
+    python relay.py --upstream quiz.example.com:12345 --port 12400 --workers 4
+"""
+import argparse
+import asyncio
+import multiprocessing
+import signal
+import sys
+import time
+from datetime import datetime
+
+from async_engine import AsyncClientConnection, raise_fd_limit
+from game_room import DEFAULT_ROOM_ID
+from liveness import ConnectionTimeouts
+from outbound import OutboundLimits
+from protocol import (FrameDecoder, ProtocolError, encode_message, compress_frame, negotiate_version,
+                      negotiate_compression, PROTOCOL_VERSION, COMPRESS_MIN_BYTES, MAX_SERVER_FRAME_SIZE,
+                      RECV_BUFFER_SIZE)
+
+
+RELAYED_TYPES = ("question", "scoreboard_delta", "game_end")
+RECONNECT_MIN_SECONDS = 0.5
+RECONNECT_MAX_SECONDS = 10.0
+
+
+class RelayedFrame:
+    """A frame fanned out to spectators, compressed at most once for all who negotiated compression."""
+    __slots__ = ('frame', '_compressed')
+
+    def __init__(self, frame):
+        self.frame = frame
+        self._compressed = None
+
+    def for_spectator(self, spectator):
+        if not spectator.compression or len(self.frame) < COMPRESS_MIN_BYTES:
+            return self.frame
+        if self._compressed is None:
+            compressed = compress_frame(self.frame)
+            self._compressed = compressed if len(compressed) < len(self.frame) else self.frame
+        return self._compressed
+
+
+class RelayRoom:
+    """The spectators of one room and the upstream subscription feeding them."""
+    def __init__(self, relay, room_id):
+        self.relay = relay
+        self.room_id = room_id
+        self.spectators = set()  # AsyncClientConnection objects
+        self.latest = {}  # {message type: RelayedFrame} shown to spectators who join later
+        self.frames_relayed = 0
+        self.task = relay.loop.create_task(self._subscribe())
+
+    def add(self, spectator):
+        self.spectators.add(spectator)
+        for relayed in list(self.latest.values()):
+            self.send(spectator, relayed)
+
+    def remove(self, spectator):
+        self.spectators.discard(spectator)
+        if not self.spectators and self.relay.rooms.get(self.room_id) is self:
+            self.task.cancel()
+            del self.relay.rooms[self.room_id]
+            self.relay.log(f"Room '{self.room_id}': last spectator left, unsubscribed "
+                           f"({self.frames_relayed} frames relayed)")
+
+    def send(self, spectator, relayed):
+        try:
+            spectator.sendall(relayed.for_spectator(spectator))
+        except OSError:
+            self.spectators.discard(spectator)  # Evicted (slow) or closed; its reader removes it for good
+
+    def publish(self, message):
+        """Fans one upstream message out to every spectator of the room."""
+        msg_type = message.get("type")
+        relayed = RelayedFrame(encode_message(message))  # Encoded once for all spectators
+        if msg_type == "game_end":
+            self.latest.pop("question", None)
+        elif msg_type == "question":
+            self.latest.pop("game_end", None)
+        self.latest[msg_type] = relayed
+        self.frames_relayed += 1
+        for spectator in list(self.spectators):
+            self.send(spectator, relayed)
+
+    async def _subscribe(self):
+        """Keeps one upstream subscription to the room open while it has spectators."""
+        timeouts = self.relay.timeouts
+        delay = RECONNECT_MIN_SECONDS
+        while True:
+            try:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(*self.relay.upstream),
+                                                        timeouts.handshake or None)
+            except (OSError, asyncio.TimeoutError) as e:
+                self.relay.log(f"Room '{self.room_id}': cannot reach {self.relay.upstream_address}: "
+                               f"{e or 'connect timed out'}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_SECONDS)
+                continue
+            timeouts.configure_socket(writer.get_extra_info('socket'))
+            writer.write(encode_message({"type": "subscribe", "room": self.room_id, "protocol": PROTOCOL_VERSION,
+                                         "clock_sync": True}))
+            decoder = FrameDecoder(PROTOCOL_VERSION, MAX_SERVER_FRAME_SIZE)
+            subscribed = heartbeats = False
+            try:
+                while True:
+                    # Until it confirms, and then while it pings us, the server is never silent for long
+                    if (not subscribed or heartbeats) and timeouts.idle:
+                        data = await asyncio.wait_for(reader.read(RECV_BUFFER_SIZE), timeouts.idle)
+                    else:
+                        data = await reader.read(RECV_BUFFER_SIZE)
+                    if not data:
+                        break
+                    for message in decoder.feed(data):
+                        msg_type = message.get("type")
+                        if msg_type == "ping":
+                            writer.write(encode_message({"type": "pong", "id": message.get("id"),
+                                                         "time": time.monotonic()}))
+                        elif msg_type == "subscribed":
+                            subscribed, heartbeats = True, bool(message.get("clock_sync"))
+                            delay = RECONNECT_MIN_SECONDS
+                            self.relay.log(f"Room '{self.room_id}': subscribed to {self.relay.upstream_address}")
+                        elif msg_type in RELAYED_TYPES:
+                            self.publish(message)
+            except asyncio.TimeoutError:
+                self.relay.log(f"Room '{self.room_id}': upstream sent nothing for {timeouts.idle:g}s")
+            except (OSError, ProtocolError):
+                pass
+            finally:
+                writer.close()
+            self.relay.log(f"Room '{self.room_id}': upstream connection lost; reconnecting")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_SECONDS)
+
+
+class SpectatorRelay:
+    """Serves spectators on one port, subscribing to the upstream Quiz Server per room."""
+    def __init__(self, upstream, host='', port=12400, limits=None, reuse_port=False, name="relay"):
+        self.upstream = upstream  # (host, port) of the Quiz Server
+        self.host = host
+        self.port = port
+        self.limits = limits or OutboundLimits()
+        self.timeouts = ConnectionTimeouts()
+        self.reuse_port = reuse_port
+        self.name = name
+        self.rooms = {}  # {room_id: RelayRoom}
+        self.loop = None
+
+    @property
+    def upstream_address(self):
+        return f"{self.upstream[0]}:{self.upstream[1]}"
+
+    def log(self, message):
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] [{self.name}] {message}", flush=True)
+
+    def run(self):
+        """Serves spectators until SIGTERM/SIGINT. Returns the process exit code."""
+        raise_fd_limit()
+        self.loop = asyncio.new_event_loop()
+        try:
+            server = self.loop.run_until_complete(asyncio.start_server(
+                self._handle_spectator, self.host or None, self.port, backlog=1024,
+                reuse_port=self.reuse_port or None))
+        except OSError as e:
+            self.log(f"Cannot listen on port {self.port}: {e}")
+            return 1
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            self.loop.add_signal_handler(signum, self.loop.stop)
+        self.log(f"Relaying {self.upstream_address} to spectators on port {self.port}")
+        try:
+            self.loop.run_forever()
+        finally:
+            server.close()
+            for task in asyncio.all_tasks(self.loop):
+                task.cancel()
+            self.loop.run_until_complete(asyncio.sleep(0))
+            self.loop.close()
+        self.log("Relay stopped")
+        return 0
+
+    async def _handle_spectator(self, reader, writer):
+        address = writer.get_extra_info('peername')
+        spectator = AsyncClientConnection(self.loop, writer, address, self.limits)
+        self.timeouts.configure_socket(writer.get_extra_info('socket'))
+        decoder = FrameDecoder()
+        room = None
+        handshake_deadline = self.loop.time() + self.timeouts.handshake if self.timeouts.handshake else None
+        try:
+            while True:
+                if room is None and handshake_deadline is not None:
+                    data = await asyncio.wait_for(reader.read(4096), handshake_deadline - self.loop.time())
+                else:
+                    data = await reader.read(4096)
+                if not data:
+                    break
+                for message in decoder.feed(data):
+                    if room is not None:
+                        continue  # Spectators are read-only
+                    if message.get("type") != "spectate":
+                        return
+                    version = negotiate_version(message)
+                    decoder.set_version(version)
+                    spectator.compression = negotiate_compression(message, version)
+                    room_id = str(message.get("room") or DEFAULT_ROOM_ID).strip() or DEFAULT_ROOM_ID
+                    spectator.sendall(encode_message({
+                        "type": "spectate_accepted",
+                        "room": room_id,
+                        "compression": spectator.compression
+                    }))
+                    room = self.rooms.get(room_id)
+                    if room is None:
+                        room = self.rooms[room_id] = RelayRoom(self, room_id)
+                    room.add(spectator)
+        except (ConnectionError, OSError, ProtocolError, asyncio.CancelledError, asyncio.TimeoutError):
+            pass  # Just disconnect (asyncio.TimeoutError: no 'spectate' before the handshake deadline)
+        finally:
+            if room is not None:
+                room.remove(spectator)
+            writer.close()
+
+
+def parse_address(value):
+    host, _, port = value.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def run_relay(args, index=None):
+    """Relay process entry point."""
+    relay = SpectatorRelay(args.upstream, args.host, args.port, reuse_port=args.workers > 1,
+                           name="relay" if index is None else f"relay{index}")
+    return relay.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--upstream", type=parse_address, default=("127.0.0.1", 12345),
+                        help="Quiz Server to subscribe to, HOST:PORT (default 127.0.0.1:12345)")
+    parser.add_argument("--host", default="", help="Address to serve spectators on (default all)")
+    parser.add_argument("--port", type=int, default=12400, help="Port to serve spectators on (default 12400)")
+    parser.add_argument("--workers", type=int, default=1, help="Relay processes sharing the port (SO_REUSEPORT)")
+    args = parser.parse_args()
+
+    if args.workers <= 1:
+        return run_relay(args)
+
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=run_relay, args=(args, index), name=f"quiz-relay-{index}")
+                 for index in range(args.workers)]
+    for process in processes:
+        process.start()
+
+    def _stop(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, _stop)
+    for process in processes:
+        process.join()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,11 @@
 import socket
 import threading
-import tkinter as tk
-from tkinter import ttk, messagebox
-from datetime import datetime
+try:
+    import tkinter as tk
+    from tkinter import ttk, messagebox
+except ImportError:
+    # Tk is optional: headless_server.py runs the same server without a GUI
+    tk = ttk = messagebox = None
 import json
 import time
 import time
@@ -11,6 +14,27 @@ import time
 import os
 import traceback
 import queue
+import argparse
+
+from async_engine import AsyncQuizEngine
+from clock_sync import ClockEstimator, Pinger, PING_INTERVAL_SECONDS, kernel_rtt
+from event_queue import EventQueue
+from game_room import GameRoom, DEFAULT_ROOM_ID, QUESTION_TIMEOUT_SECONDS, ROLE_RELAY
+from metrics import MetricsExporter, ServerMetrics
+from structured_log import StructuredLogger, RotatingFileSink, format_line, parse_level, DEBUG, INFO, WARNING, ERROR
+from question_bank import QuestionBankManager
+from outbound import OutboundLimits, QueuedSocketConnection
+from journal import GameJournal
+from liveness import ConnectionTimeouts, HANDSHAKE_TIMEOUT_SECONDS, IDLE_TIMEOUT_SECONDS
+from results_store import ResultsStore
+from protocol import (FrameDecoder, ProtocolError, encode_message, negotiate_version, negotiate_scoreboard,
+                      negotiate_compression, negotiate_clock_sync, compress_frame, COMPRESS_MIN_BYTES)
+from timers import TimerScheduler
+
+
+DISPATCH_BATCH_SIZE = 1000  # Most events handled per process_queue call before the GUI gets a turn
+LOG_VIEW_LINES = 2000  # Lines kept in the activity log listbox
+LOG_VIEW_REFRESH_MS = 200  # How often the activity log samples new records
 
 
 class QuizServer:
@@ -21,40 +45,130 @@ class QuizServer:
     - Main Thread: Handles all GUI (Tkinter) updates and Game Logic (scoring, state).
     - Accept Thread: Background thread that waits for new client connections.
     - Client Threads: One background thread per client to listen for incoming messages.
+      (With the "asyncio" engine, accept and client reads run on one event loop instead,
+      see async_engine.AsyncQuizEngine.)
     - Queue System: A thread-safe queue connects Client Threads -> Main Thread. 
       Background threads put events in the queue, and the Main Thread processes them.
-      This prevents "Freezing" and race conditions.
+      This prevents "Freezing" and race conditions. Putting an event wakes the Main
+      Thread through a pipe watched by Tk (see event_queue.EventQueue), so events are
+      handled right away, in batches.
+    - Outbound Queues: Sending never blocks the Main Thread. Each client has a bounded
+      outbound queue (see outbound.py); clients that stop reading are disconnected.
+    - Rooms: Each game lives in its own GameRoom, so one server hosts many
+      independent games. Clients pick a room with a 'join' message (or the
+      'room' field of 'connect'); plain 'connect' goes to the default room.
     """
-    def __init__(self, root):
+    def __init__(self, root, measure_queue=False, metrics_port=None, metrics_host="127.0.0.1",
+                 log_level=INFO, log_file=None, log_max_bytes=10 * 1024 * 1024, log_backups=5,
+                 results_db=None, journal_dir=None, handshake_timeout=HANDSHAKE_TIMEOUT_SECONDS,
+                 idle_timeout=IDLE_TIMEOUT_SECONDS):
         self.root = root
         self.root.title("Quiz Server")
         self.root.geometry("800x600")
         
         # Server state
         self.server_socket = None
+        self.engine = None  # AsyncQuizEngine when running with the asyncio engine
+        self.outbound_limits = OutboundLimits()  # Per-client outbound queue watermarks
+        # Handshake deadline, heartbeat idle timeout and TCP keepalive of every connection (see liveness.py)
+        self.timeouts = ConnectionTimeouts(handshake=handshake_timeout, idle=idle_timeout)
+        
+        # Log records go to a ring buffer the GUI samples (see refresh_log_view) and optionally a file
+        self.logger = StructuredLogger(level=log_level, capacity=LOG_VIEW_LINES * 5)
+        if log_file:
+            self.logger.add_sink(RotatingFileSink(log_file, log_max_bytes, log_backups))
+        self.log_view_sequence = 0  # Last record shown in the listbox
+        self.log_view_lines = 0
+        
+        # Parsed question files, reloaded in the background when they change on disk
+        self.question_banks = QuestionBankManager(log=self.log, on_reload=self._on_question_bank_reloaded)
+        self.watched_question_file = None
         self.is_listening = False
-        self.is_game_active = False
-        self.clients = {}  # {client_socket: {'name': str, 'address': tuple}}
-        self.client_names = set()  # Track unique names
+        self.reuse_port = False  # Set by supervisor workers that share the listening port
+        self.router = None  # supervisor.RoomRouter when running as one of several worker processes
+        self.rooms = {}  # {room_id: GameRoom}
+        self.client_rooms = {}  # {client_socket: GameRoom} for every accepted client
+        self.relay_rooms = {}  # {relay_socket: GameRoom} for every subscribed spectator relay (see relay.py)
+        
+        # Counters and histograms (see metrics.py)
+        self.metrics = ServerMetrics()
+        self._last_compressed = None  # (frame, compressed frame) of the last frame compressed, see compressed_frame
+        self._send_failed = set()  # Connections a send failed on, warned about once until they disconnect
+        
+        # Clients that asked for clock sync are pinged to estimate their RTT (see clock_sync.py);
+        # the pings double as heartbeats (see send_heartbeats)
+        self.pinger = Pinger()
+        self.ping_timer = None
+        
+        # Game deadlines (answer time limits, lobby timeouts) share one heap-based scheduler
+        self.timers = TimerScheduler(self.root, log=self.log)
+        
+        # Finished games are written to SQLite by a background thread when a results database is given
+        self.results = ResultsStore(results_db, log=self.log) if results_db else None
+        
+        # Game events are journaled so running games survive a crash (see journal.py)
+        self.journal = GameJournal(journal_dir, self.journal_snapshot, log=self.log,
+                                   on_dropped=self.metrics.journal_records_dropped.inc) if journal_dir else None
         
         # message queue for thread safety
         # This is CRITICAL for the architecture.
         # Tkinter (GUI) is not thread-safe. We cannot update the UI from background threads.
         # Instead, background threads put data into this queue, and the main thread reads it.
-        self.queue = queue.Queue()
+        # Putting an event wakes the main thread, so events are handled immediately.
+        self.queue = EventQueue(measure=measure_queue)
+        self.queue_wakeups = self.queue.attach(self.root, self.process_queue)
+        self.register_metric_gauges()
         
         # Start queue processing
-        # This initiates the periodic check of the queue on the main thread.
+        # Without wakeups (Windows) this initiates the periodic check of the queue on the main thread.
         self.process_queue()
         
-        # Game state
-        self.questions = []
-        self.current_question_index = 0
-        self.num_questions = 0
-        self.answers_received = {}  # {question_index: {client_name: {'answer': str, 'timestamp': float}}}
-        self.scores = {}  # {client_name: score}
-        
         self.setup_gui()
+        self.refresh_log_view()
+        
+        if self.journal:
+            self.recover_games()
+        
+        # Metrics are served over HTTP when a metrics port is given
+        self.metrics_exporter = None
+        if metrics_port is not None:
+            self.metrics_exporter = MetricsExporter(self.metrics.registry, metrics_host, metrics_port)
+            try:
+                self.metrics_exporter.start()
+                self.log(f"Metrics available at http://{metrics_host}:{self.metrics_exporter.port}/metrics")
+            except OSError as e:
+                self.log(f"Could not start metrics endpoint on port {metrics_port}: {e}")
+                self.metrics_exporter = None
+        
+    def recover_games(self):
+        """Restores the games the journal says were running when the server last stopped."""
+        for room_id, state in self.journal.recover().items():
+            room = GameRoom(self, room_id)
+            if room.restore(state):
+                self.rooms[room_id] = room
+        self.journal.start()
+        
+    def journal_snapshot(self):
+        """State of every running game, for the journal's snapshots. Executed on the Main Thread."""
+        return {room_id: room.snapshot() for room_id, room in self.rooms.items() if room.is_game_active}
+        
+    def register_metric_gauges(self):
+        """Gauges read live server state when scraped (from the exporter's thread)."""
+        registry = self.metrics.registry
+        registry.gauge("quiz_connected_clients", "Accepted clients in all rooms", lambda: len(self.client_rooms))
+        registry.gauge("quiz_relays", "Spectator relays subscribed to a room", lambda: len(self.relay_rooms))
+        registry.gauge("quiz_rooms", "Open rooms", lambda: len(self.rooms))
+        registry.gauge("quiz_active_games", "Rooms with a game in progress",
+                       lambda: sum(1 for room in list(self.rooms.values()) if room.is_game_active))
+        registry.gauge("quiz_event_queue_depth", "Events waiting for process_queue", lambda: self.queue.qsize())
+        # One series per player: a room lives in one worker, so the supervisor's sum never merges two
+        registry.gauge("quiz_client_rtt_estimate_seconds",
+                       "Per-client RTT estimates from ping/pong: smoothed, min (recent), trusted (used to "
+                       "correct answer times) and jitter", self.client_rtt_series, ("room", "player", "estimate"))
+        registry.gauge("quiz_outbound_queued_bytes", "Bytes waiting in all client outbound queues",
+                       lambda: sum(getattr(sock, 'queued_bytes', 0) for sock in list(self.client_rooms)))
+        registry.gauge("quiz_client_outbound_queued_bytes", "Bytes waiting in each player's outbound queue",
+                       self.outbound_queue_series, ("room", "player"))
         
     def setup_gui(self):
         """
@@ -81,6 +195,13 @@ class QuizServer:
         self.start_button = ttk.Button(config_frame, text="Start Server", command=self.toggle_server)
         self.start_button.grid(row=0, column=2, padx=10)
         
+        # Network engine selection
+        ttk.Label(config_frame, text="Engine:").grid(row=0, column=3, sticky=tk.W, padx=5)
+        self.engine_var = tk.StringVar(value="threads")
+        engine_combo = ttk.Combobox(config_frame, textvariable=self.engine_var, values=("threads", "asyncio"),
+                                    state="readonly", width=10)
+        engine_combo.grid(row=0, column=4, padx=5)
+        
         # Game configuration frame
         game_frame = ttk.LabelFrame(main_frame, text="Game Configuration", padding="10")
         game_frame.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=5)
@@ -92,6 +213,13 @@ class QuizServer:
         question_file_entry = ttk.Entry(game_frame, textvariable=self.question_file_var, width=30)
         question_file_entry.grid(row=0, column=1, sticky=tk.W, padx=5)
         
+        # Room to start
+        ttk.Label(game_frame, text="Room:").grid(row=0, column=2, sticky=tk.W, padx=5)
+        self.room_var = tk.StringVar(value=DEFAULT_ROOM_ID)
+        self.room_var.trace_add('write', lambda *args: self.update_start_game_button())
+        room_entry = ttk.Entry(game_frame, textvariable=self.room_var, width=15)
+        room_entry.grid(row=0, column=3, sticky=tk.W, padx=10)
+        
         # Number of questions
         ttk.Label(game_frame, text="Number of Questions:").grid(row=1, column=0, sticky=tk.W, padx=5, pady=5)
         self.num_questions_var = tk.StringVar(value="5")  # Default to 5 questions
@@ -99,6 +227,12 @@ class QuizServer:
         num_questions_entry = ttk.Entry(game_frame, textvariable=self.num_questions_var, width=15)
         num_questions_entry.grid(row=1, column=1, sticky=tk.W, padx=5, pady=5)
         
+        # Answer deadline per question
+        ttk.Label(game_frame, text="Answer Time (s, 0 = no limit):").grid(row=2, column=0, sticky=tk.W, padx=5, pady=5)
+        self.question_timeout_var = tk.StringVar(value=str(QUESTION_TIMEOUT_SECONDS))
+        question_timeout_entry = ttk.Entry(game_frame, textvariable=self.question_timeout_var, width=15)
+        question_timeout_entry.grid(row=2, column=1, sticky=tk.W, padx=5, pady=5)
+        
         # Available questions info
         self.available_questions_label = ttk.Label(game_frame, text="Available Questions: 0")
         self.available_questions_label.grid(row=1, column=2, padx=10, pady=5)
@@ -137,135 +271,73 @@ class QuizServer:
     def on_question_file_changed(self):
         """Called when question file path changes"""
         question_file = self.question_file_var.get().strip()
+        
+        # Only the file currently entered is watched for changes
+        if self.watched_question_file and self.watched_question_file != question_file:
+            self.question_banks.forget(self.watched_question_file)
+        self.watched_question_file = question_file or None
+        
         if question_file:
             # Check if file exists
             if os.path.exists(question_file):
                 self.log(f"Question file found: {question_file}")
-                questions = self.load_questions_from_file(question_file)
-                if questions:
-                    self.available_questions_label.config(text=f"Available Questions: {len(questions)}")
-                    self.log(f"Question file loaded successfully: {len(questions)} questions found")
+                bank = self.question_banks.peek(question_file)
+                if bank:
+                    self.available_questions_label.config(text=f"Available Questions: {len(bank)}")
                 else:
-                    self.available_questions_label.config(text="Available Questions: 0")
-                    self.log("Failed to load questions from file or file is empty")
+                    # Loaded (and a very large file indexed) in the background, so the GUI
+                    # doesn't freeze; _on_question_bank_reloaded reports the result
+                    self.available_questions_label.config(text="Available Questions: loading...")
+                    self.question_banks.warm(question_file)
             else:
                 self.available_questions_label.config(text="Available Questions: 0")
                 self.log(f"Question file not found: {question_file}")
+                # Still watched, so it is picked up as soon as it is created
+                self.question_banks.warm(question_file)
         else:
             self.available_questions_label.config(text="Available Questions: 0")
         self.update_start_game_button()
     
-    def load_questions_from_file(self, filename):
+    def _on_question_bank_reloaded(self, path, bank):
         """
-        Load questions from a text file.
-        Format: Each question spans 5 lines:
-        - Line 1: Question text
-        - Line 2: Choice A (can be "A - [text]" or just "[text]")
-        - Line 3: Choice B (can be "B - [text]" or just "[text]")
-        - Line 4: Choice C (can be "C - [text]" or just "[text]")
-        - Line 5: Correct answer (can be "Answer: A" or just "A")
+        Called by the question bank's background threads when a question file was loaded
+        or changed on disk. Games already in progress keep the questions they started with.
         """
-        questions = []
-        try:
-            if not os.path.exists(filename):
-                self.log(f"Question file not found: {filename}")
-                return questions
-                
-            with open(filename, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            
-            # Remove empty lines and strip whitespace
-            lines = [line.strip() for line in lines if line.strip()]
-            
-            # Each question is 5 lines
-            if len(lines) % 5 != 0:
-                self.log(f"Warning: File has {len(lines)} lines, which is not a multiple of 5. Some questions may be incomplete.")
-            
-            for i in range(0, len(lines), 5):
-                if i + 4 < len(lines):
-                    # Parse question text
-                    question_text = lines[i]
-                    
-                    # Parse choice A (remove "A - " prefix if present)
-                    choice_a = lines[i + 1]
-                    if choice_a.startswith("A - "):
-                        choice_a = choice_a[4:].strip()
-                    elif choice_a.startswith("A:"):
-                        choice_a = choice_a[2:].strip()
-                    
-                    # Parse choice B (remove "B - " prefix if present)
-                    choice_b = lines[i + 2]
-                    if choice_b.startswith("B - "):
-                        choice_b = choice_b[4:].strip()
-                    elif choice_b.startswith("B:"):
-                        choice_b = choice_b[2:].strip()
-                    
-                    # Parse choice C (remove "C - " prefix if present)
-                    choice_c = lines[i + 3]
-                    if choice_c.startswith("C - "):
-                        choice_c = choice_c[4:].strip()
-                    elif choice_c.startswith("C:"):
-                        choice_c = choice_c[2:].strip()
-                    
-                    # Parse correct answer (remove "Answer: " prefix if present)
-                    correct_answer_line = lines[i + 4].upper().strip()
-                    correct_answer = None
-                    
-                    if correct_answer_line.startswith("ANSWER:"):
-                        correct_answer = correct_answer_line[7:].strip()
-                    elif correct_answer_line.startswith("ANSWER"):
-                        # Handle "ANSWER A" format
-                        parts = correct_answer_line.split()
-                        if len(parts) > 1:
-                            correct_answer = parts[1].strip()
-                    else:
-                        correct_answer = correct_answer_line.strip()
-                    
-                    # Extract just the letter (A, B, or C)
-                    if correct_answer:
-                        # Remove any extra characters, keep only A, B, or C
-                        correct_answer = correct_answer[0] if len(correct_answer) > 0 else None
-                    
-                    # Validate correct answer
-                    if correct_answer not in ['A', 'B', 'C']:
-                        self.log(f"Warning: Invalid correct answer '{lines[i + 4]}' (parsed as '{correct_answer}') for question {len(questions) + 1}. Skipping.")
-                        continue
-                    
-                    question = {
-                        'question': question_text,
-                        'A': choice_a,
-                        'B': choice_b,
-                        'C': choice_c,
-                        'correct': correct_answer
-                    }
-                    
-                    questions.append(question)
-                else:
-                    self.log(f"Warning: Incomplete question at line {i + 1}. Skipping.")
-            
-            return questions
+        if bank:
+            self.log(f"Question file loaded: {path} ({len(bank)} questions, version {bank.version})")
+        else:
+            self.log(f"No questions available in {path} (missing, unreadable or empty)")
             
-        except FileNotFoundError:
-            self.log(f"Question file not found: {filename}")
-            return questions
-        except PermissionError:
-            self.log(f"Permission denied: Cannot read {filename}")
-            return questions
-        except Exception as e:
-            self.log(f"Error loading question file {filename}: {e}")
-            return questions
+        def _update():
+            if path == self.question_file_var.get().strip():
+                self.available_questions_label.config(text=f"Available Questions: {len(bank) if bank else 0}")
+                self.update_start_game_button()
+        self.root.after(0, _update)
         
-    def log(self, message):
+    def log(self, message, *args, level=INFO, **fields):
         """
         Thread-safe logging method.
-        Updates the log listbox on the main thread using root.after().
+        Records go into self.logger's ring buffer; the GUI picks them up in refresh_log_view.
+        `message % args` is only formatted when the record is displayed or written.
+        """
+        self.logger.log(level, message, *args, **fields)
+        
+    def refresh_log_view(self):
         """
-        def _log():
-            timestamp = datetime.now().strftime("%H:%M:%S")
-            log_message = f"[{timestamp}] {message}"
-            self.log_listbox.insert(tk.END, log_message)
+        Appends the log records added since the last refresh to the log listbox.
+        Runs every LOG_VIEW_REFRESH_MS on the main thread; the listbox keeps the last LOG_VIEW_LINES lines.
+        """
+        records = self.logger.records_since(self.log_view_sequence)
+        if records:
+            self.log_view_sequence = records[-1][0]
+            records = records[-LOG_VIEW_LINES:]
+            self.log_listbox.insert(tk.END, *[format_line(record) for record in records])
+            self.log_view_lines += len(records)
+            if self.log_view_lines > LOG_VIEW_LINES:
+                self.log_listbox.delete(0, self.log_view_lines - LOG_VIEW_LINES - 1)
+                self.log_view_lines = LOG_VIEW_LINES
             self.log_listbox.see(tk.END)
-        self.root.after(0, _log)
+        self.root.after(LOG_VIEW_REFRESH_MS, self.refresh_log_view)
         
     def toggle_server(self):
         """
@@ -285,14 +357,24 @@ class QuizServer:
         try:
             port = int(self.port_var.get())
             if port < 1 or port > 65535:
-                messagebox.showerror("Error", "Port must be between 1 and 65535")
+                self.show_error("Error", "Port must be between 1 and 65535")
                 return
                 
-            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.server_socket.bind(('', port))
-            self.server_socket.listen(5)
+            use_asyncio = self.engine_var.get() == "asyncio"
+            if use_asyncio:
+                # One event loop handles accept and all client reads/writes
+                self.engine = AsyncQuizEngine(self, port=port, limits=self.outbound_limits,
+                                              reuse_port=self.reuse_port)
+                self.engine.start()
+            else:
+                self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                if self.reuse_port:
+                    self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+                self.server_socket.bind(('', port))
+                self.server_socket.listen(5)
             self.is_listening = True
+            self.ping_timer = self.timers.call_later(PING_INTERVAL_SECONDS, self.send_heartbeats)
             
             # Get local IP address
             try:
@@ -310,17 +392,20 @@ class QuizServer:
             self.log(f"Server IP Address: {local_ip}")
             self.log(f"Clients should connect to: {local_ip}:{port}")
             
-            # Start accepting connections
-            # We run this in a SEPARATE thread (daemon=True) so the GUI doesn't freeze
-            # while waiting for a client to connect.
-            accept_thread = threading.Thread(target=self.accept_connections, daemon=True)
-            accept_thread.start()
+            if use_asyncio:
+                self.log("Using asyncio engine (single event loop for all clients)")
+            else:
+                # Start accepting connections
+                # We run this in a SEPARATE thread (daemon=True) so the GUI doesn't freeze
+                # while waiting for a client to connect.
+                accept_thread = threading.Thread(target=self.accept_connections, daemon=True)
+                accept_thread.start()
             
         except ValueError:
-            messagebox.showerror("Error", "Invalid port number")
+            self.show_error("Error", "Invalid port number")
         except OSError as e:
-            messagebox.showerror("Error", f"Failed to start server: {e}")
-            self.log(f"Error starting server: {e}")
+            self.show_error("Error", f"Failed to start server: {e}")
+            self.log(f"Error starting server: {e}", level=ERROR)
             
     def stop_server(self):
         """
@@ -328,10 +413,14 @@ class QuizServer:
         If a game is active, it force-ends the game first.
         """
         self.is_listening = False
+        if self.ping_timer is not None:
+            self.ping_timer.cancel()
+            self.ping_timer = None
         
-        # If game is active, end it first (this will close all client connections)
-        if self.is_game_active:
-            self.end_game("Server is stopping")
+        # If games are active, end them first (this will close their client connections)
+        for room in list(self.rooms.values()):
+            if room.is_game_active:
+                room.end_game("Server is stopping")
         
         # Close server socket
         if self.server_socket:
@@ -339,6 +428,20 @@ class QuizServer:
                 self.server_socket.close()
             except:
                 pass
+            self.server_socket = None
+            
+        # Stop the asyncio engine (closes its listener and remaining connections)
+        if self.engine:
+            stats = self.engine.stats()
+            if stats["per_connection_bytes"] is not None:
+                self.log(f"Engine stats: {stats['connections']} connections, "
+                         f"~{stats['per_connection_bytes'] / 1024:.1f} KB per connection")
+            self.engine.stop()
+            self.engine = None
+            
+        self.log_compression_report()
+        if self.queue.measure:
+            self.log_queue_wait_report()
                 
         self.start_button.config(text="Start Server")
         self.log("Server stopped")
@@ -352,7 +455,11 @@ class QuizServer:
             try:
                 if self.server_socket:
                     client_socket, address = self.server_socket.accept()
-                    self.log(f"New connection attempt from {address}")
+                    self.log("New connection attempt from %s", address, level=DEBUG)
+                    self.timeouts.configure_socket(client_socket)
+                    
+                    # Sends go through a bounded queue drained by the connection's writer thread
+                    client_socket = QueuedSocketConnection(client_socket, address, self.outbound_limits)
                     
                     # Handle client in a separate thread
                     # For EVERY client, we start a new dedicated thread.
@@ -367,289 +474,394 @@ class QuizServer:
                 # Server socket closed
                 break
             except Exception as e:
-                self.log(f"Error accepting connection: {e}")
+                self.log(f"Error accepting connection: {e}", level=ERROR)
                 
     def process_queue(self):
         """
         Process events from the queue on the MAIN THREAD.
         This is the bridge between background threads and the GUI/Game Logic.
+        Handles at most DISPATCH_BATCH_SIZE events per call so the GUI stays responsive.
         """
-        try:
-            while True:
-                # Process all available messages
-                try:
-                    event = self.queue.get_nowait()
-                except queue.Empty:
-                    break
-                    
-                event_type = event[0]
-                
-                if event_type == "connect":
-                    client_socket, address, client_name = event[1], event[2], event[3]
-                    self._handle_connect_event(client_socket, address, client_name)
-                    
-                elif event_type == "disconnect":
-                    client_socket = event[1]
-                    self._handle_disconnect_event(client_socket)
-                    
-                elif event_type == "message":
-                    client_socket, message = event[1], event[2]
-                    self._handle_message_event(client_socket, message)
-                    
-        except Exception as e:
-            self.log(f"Error processing queue: {e}")
-            traceback.print_exc()
+        processed = 0
+        while processed < DISPATCH_BATCH_SIZE:
+            # Process all available messages
+            try:
+                event = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            processed += 1
+            # One bad event must not hold up the rest: in wakeup mode nothing would
+            # call us again for the events still queued until the next put()
+            try:
+                self._dispatch_event(event)
+            except Exception as e:
+                self.log(f"Error processing {event[0]} event: {e}", level=ERROR)
+                traceback.print_exc()
             
         # Schedule next check
-        self.root.after(50, self.process_queue)
+        if processed >= DISPATCH_BATCH_SIZE:
+            self.root.after(0, self.process_queue)  # More events waiting: next batch after pending GUI work
+        elif not self.queue_wakeups:
+            self.root.after(50, self.process_queue)
+        
+    def _dispatch_event(self, event):
+        """Hands one queued event to its handler. Executed on the Main Thread."""
+        event_type = event[0]
+        self.metrics.events_dispatched.inc(labels=(event_type,))
+        
+        if event_type == "connect":
+            client_socket, address, client_name, room_id, handshake = event[1:6]
+            self._handle_connect_event(client_socket, address, client_name, room_id, handshake)
+            
+        elif event_type == "disconnect":
+            client_socket = event[1]
+            self._handle_disconnect_event(client_socket)
+            
+        elif event_type == "message":
+            client_socket, message, received_at = event[1:4]
+            self._handle_message_event(client_socket, message, received_at)
+            
+        elif event_type == "game_closed":
+            room, started = event[1:3]
+            room.reset_after_game(started)
+            self._discard_room_if_idle(room)
         
-    def _handle_connect_event(self, client_socket, address, client_name):
+    def _handle_connect_event(self, client_socket, address, client_name, room_id, handshake):
         """
         Handles a 'connect' event from the queue.
         Executed on the Main Thread.
-        Validates the username and adds the client to the active list.
+        Finds (or creates) the requested room and lets it validate and add the player
+        (or subscribe the spectator relay).
         """
-        # Check if name is taken
-        if client_name in self.client_names:
-            self.send_message(client_socket, {
-                "type": "connection_error",
-                "message": f"Name '{client_name}' is already in use."
-            })
-            client_socket.close()
-            return
+        room = self.rooms.get(room_id)
+        if room is None:
+            room = GameRoom(self, room_id)
+            self.rooms[room_id] = room
+            self.log(f"Room '{room_id}' created ({len(self.rooms)} rooms)")
             
-        # Accept connection
-        self.client_names.add(client_name)
-        self.clients[client_socket] = {
-            'name': client_name,
-            'address': address
-        }
-        self.scores[client_name] = 0
-        
-        self.send_message(client_socket, {
-            "type": "connection_accepted",
-            "message": f"Welcome {client_name}! Waiting for game to start."
-        })
-        
-        self.log(f"Client '{client_name}' connected from {address}")
-        self.update_clients_list()
-        
-        # Send current scoreboard
-        self.send_scoreboard()
-        
-        # Notify others
-        if len(self.clients) > 1:
-            self.broadcast_message({
-                "type": "player_connected",
-                "player_name": client_name,
-                "message": f"{client_name} has joined the game",
-                "total_players": len(self.clients)
-            }, exclude_socket=client_socket)
-            
-        self.update_start_game_button()
+        if handshake.get("role") == ROLE_RELAY:
+            room.add_relay(client_socket, address)
+            self.relay_rooms[client_socket] = room
+        elif room.add_player(client_socket, address, client_name, handshake):
+            self.client_rooms[client_socket] = room
+            self.update_clients_list()
+            self.update_start_game_button()
+        else:
+            self._discard_room_if_idle(room)
 
     def _handle_disconnect_event(self, client_socket):
         """
         Handles a 'disconnect' event from the queue.
         Executed on the Main Thread.
-        Removes the client from lists and notifies other players.
-        Note: Disconnected players' scores are kept in the scoreboard.
+        Removes the client from its room, which notifies the other players.
+        Connections that never completed their handshake (e.g. timed out) are only closed.
         """
-        if client_socket in self.clients:
-            client_name = self.clients[client_socket]['name']
-            address = self.clients[client_socket]['address']
-            
-            # Clean up
-            self.client_names.discard(client_name)
-            del self.clients[client_socket]
-            
-            # Disconnected players should remain on scoreboard
-            # if client_name in self.scores:
-            #     del self.scores[client_name]
-                
-            self.log(f"Client '{client_name}' disconnected (score kept on scoreboard)")
-            
-            self.update_clients_list()
-            self.update_start_game_button()
-            
-            # Notify others
-            self.broadcast_message({
-                "type": "player_disconnected",
-                "player_name": client_name,
-                "message": f"{client_name} has disconnected"
-            })
+        self._send_failed.discard(client_socket)
+        room = self.relay_rooms.pop(client_socket, None)
+        if room is not None:
+            room.remove_relay(client_socket)
+            self._discard_room_if_idle(room)
+            client_socket.close()
+            return
             
-            # Update scoreboard so all players see the current state (including disconnected players)
-            if self.is_game_active:
-                self.send_scoreboard()
-                
-                # Check if we're waiting for answers to current question
-                # If yes, check if all remaining players have answered
-                if self.is_waiting_for_answers():
-                    self.log(f"Waiting for answers to current question. Checking if all remaining players have answered...")
-                    # Check if all remaining connected players have answered
-                    if self.current_question_index in self.answers_received:
-                        connected_names = {info['name'] for info in self.clients.values()}
-                        answered_names = set(self.answers_received[self.current_question_index].keys())
-                        if connected_names.issubset(answered_names):
-                            self.log(f"All remaining players have answered. Processing answers...")
-                            self.process_question_answers()
-                        else:
-                            self.log(f"Still waiting for answers from: {connected_names - answered_names}")
-                # If not waiting for answers and less than 2 players, end game
-                elif len(self.clients) < 2:
-                    self.log("Less than 2 players remaining and no active question. Ending game...")
-                    self.end_game("Less than 2 players remaining")
+        room = self.client_rooms.pop(client_socket, None)
+        if room is None:
+            client_socket.close()  # Frees the fd (and the writer thread of the threaded engine)
+            return
             
-            try:
-                client_socket.close()
-            except:
-                pass
+        room.remove_player(client_socket)
+        self._discard_room_if_idle(room)
+        self.update_clients_list()
+        self.update_start_game_button()
+        
+        try:
+            client_socket.close()
+        except:
+            pass
+
+    def _discard_room_if_idle(self, room):
+        """Drops a room with no players and no game so rooms don't pile up."""
+        if room.is_idle() and self.rooms.get(room.room_id) is room:
+            del self.rooms[room.room_id]
+            self.log(f"Room '{room.room_id}' closed ({len(self.rooms)} rooms)")
                 
-    def _handle_message_event(self, client_socket, message):
+    def _handle_message_event(self, client_socket, message, received_at):
         """
         Handles a 'message' event from the queue.
         Executed on the Main Thread.
         """
-        self.handle_client_message(client_socket, message)
+        self.handle_client_message(client_socket, message, received_at)
+
+    def queue_handshake(self, client_socket, address, message, rest=(), decoder=None):
+        """
+        Validates the first (connect/join, or subscribe for a spectator relay) message of
+        a new connection and queues the 'connect' event for the Main Thread.
+        Shared by handle_client and the asyncio engine, so runs in a background context.
+        `rest` (messages decoded after this one) and `decoder` (bytes not decoded yet) are
+        only used when the room lives in another worker process and the connection is handed off.
+        Returns the negotiated handshake options (e.g. {'protocol': 1, 'scoreboard': 'delta'}),
+        or None if the connection was rejected or handed off (the socket is closed).
+        """
+        msg_type = message.get("type")
+        if msg_type not in ("connect", "join", "subscribe"):
+            client_socket.close()
+            return None
+            
+        client_name = "relay" if msg_type == "subscribe" else message.get("name", "").strip()
+        if not client_name:
+            client_socket.close()
+            return None
+            
+        protocol = negotiate_version(message)
+        handshake = {"protocol": protocol, "scoreboard": negotiate_scoreboard(message, protocol),
+                     "compression": negotiate_compression(message, protocol),
+                     "clock_sync": negotiate_clock_sync(message, protocol)}
+        if msg_type == "subscribe":
+            handshake["role"] = ROLE_RELAY  # Receives the room's broadcasts only (see GameRoom.add_relay)
+        session = message.get("session")
+        if isinstance(session, str) and session:
+            handshake["session"] = session  # Reconnecting player (see GameRoom.resume_player)
+            
+        room_id = str(message.get("room") or DEFAULT_ROOM_ID).strip() or DEFAULT_ROOM_ID
+        
+        # With several worker processes, every room lives in one of them
+        if self.router is not None and not self.router.owns(room_id):
+            pending = encode_message(message) + b"".join(encode_message(m) for m in rest)
+            if decoder is not None:
+                pending += bytes(decoder.buffer)
+            self.router.hand_off(client_socket, room_id, pending)
+            return None
+            
+        # We can't check duplicate names here safely, so the room does it on the main thread.
+        # Rejecting joins to a running game early is only an optimization (re-checked there).
+        room = self.rooms.get(room_id)
+        if (room is not None and room.is_game_active and handshake.get("session") not in room.sessions
+                and handshake.get("role") != ROLE_RELAY):
+            self.send_message(client_socket, {
+                "type": "connection_error",
+                "message": "Session expired." if "session" in handshake else "Game is already in progress."
+            })
+            client_socket.close()
+            return None
+
+        # Frames of this connection are compressed from now on (see send_frame)
+        client_socket.compression = handshake["compression"]
+        if handshake["clock_sync"]:
+            client_socket.clock = ClockEstimator()  # Filled in by its pongs (see receive_message)
+        
+        # Just put in queue
+        self.queue.put(("connect", client_socket, address, client_name, room_id, handshake))
+        return handshake
 
-    def handle_client(self, client_socket, address):
+    def handle_client(self, client_socket, address, pending=b""):
         """
         Thread that strictly listens and puts events in queue.
+        `pending` holds bytes already read from the connection (handed off by another worker).
         
         IMPORTANT: This run in a background thread.
         It does NOT update the GUI directly.
         It does NOT modify game state directly.
         It only puts messages into self.queue for the Main Thread to handle.
         """
+        # Reads are decoded incrementally: one recv() may carry part of a message or several
+        decoder = FrameDecoder(observer=self.metrics.frame_received)
+        handshake = None
+        # The whole handshake must arrive in time, however slowly its bytes trickle in
+        handshake_deadline = time.monotonic() + self.timeouts.handshake if self.timeouts.handshake else None
         try:
-            # First message is always the connect message
-            try:
-                data = client_socket.recv(1024).decode('utf-8')
-                if not data:
-                    client_socket.close()
-                    return
-                message = json.loads(data)
-            except:
-                client_socket.close()
-                return
-                
-            if message.get("type") == "connect":
-                client_name = message.get("name", "").strip()
-                if not client_name:
-                    client_socket.close()
-                    return
-                    
-                # We can't check game active or duplicate name here safely
-                # So we pass it to main thread
-                if self.is_game_active:
-                     self.send_message(client_socket, {
-                        "type": "connection_error",
-                        "message": "Game is already in progress."
-                    })
-                     client_socket.close()
-                     return
-
-                # Check duplicate name safely? No, do in main thread.
-                # Just put in queue
-                self.queue.put(("connect", client_socket, address, client_name))
-            else:
-                client_socket.close()
-                return
-
-            # Main listen loop
             while True:
                 try:
-                    data = client_socket.recv(1024).decode('utf-8')
+                    if handshake is None and handshake_deadline is not None and not pending:
+                        remaining = handshake_deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.log("Handshake timeout from %s", address, level=DEBUG)
+                            break
+                        client_socket.settimeout(remaining)
+                    data = pending or client_socket.recv(4096)
+                    pending = b""
                     if not data:
                         break
-                    
-                    message = json.loads(data)
-                    self.queue.put(("message", client_socket, message))
-                    
-                except json.JSONDecodeError:
-                    continue
-                except ConnectionResetError:
+                    received_at = client_socket.last_received = time.perf_counter()
+                    messages = decoder.feed(data)
+                except (ConnectionResetError, ProtocolError):
                     break
                     
+                for i, message in enumerate(messages):
+                    if handshake is None:
+                        # First message is always the connect message. From now on heartbeats and
+                        # keepalive detect dead peers (and a handed-off socket must be blocking again)
+                        client_socket.settimeout(None)
+                        handshake = self.queue_handshake(client_socket, address, message, messages[i + 1:], decoder)
+                        if handshake is None:
+                            return
+                        decoder.set_version(handshake["protocol"])
+                    else:
+                        self.receive_message(client_socket, message, received_at)
+                    
+        except socket.timeout:
+            self.log("Handshake timeout from %s", address, level=DEBUG)
         except Exception as e:
             pass # Just disconnect
         finally:
             self.queue.put(("disconnect", client_socket, None))
             
-
-
-                
-    def handle_client_message(self, client_socket, message):
+    def receive_message(self, client_socket, message, received_at):
+        """
+        Passes a message read from a client (after its handshake) to the Main Thread, with
+        the perf_counter() time it was read so answers are timed from the socket, not the queue.
+        Pongs are handled right here: queueing them would add the queue wait to the round trip.
+        Called by handle_client and the asyncio engine, so runs in a background context.
+        """
+        if message.get("type") == "pong":
+            clock = getattr(client_socket, 'clock', None)
+            sent_at = self.pinger.sent_at(message.get("id"))
+            if clock is not None and sent_at is not None:
+                self.metrics.client_rtt.observe(clock.on_pong(
+                    sent_at, received_at, message.get("time"), kernel_rtt(getattr(client_socket, 'sock', None))))
+            return
+        self.queue.put(("message", client_socket, message, received_at))
+            
+    def adopt_connection(self, sock, pending=b""):
+        """
+        Serves a connection accepted by another worker process (see supervisor.RoomRouter).
+        `pending` holds the bytes that worker already read from it. Thread-safe.
         """
-        Processes a specific message type (e.g., 'answer') from a client.
+        if not self.is_listening:
+            sock.close()
+            return
+        if self.engine:
+            self.engine.adopt(sock, pending)
+            return
+        try:
+            address = sock.getpeername()
+        except OSError:
+            sock.close()
+            return
+        self.timeouts.configure_socket(sock)
+        client_socket = QueuedSocketConnection(sock, address, self.outbound_limits)
+        threading.Thread(target=self.handle_client, args=(client_socket, address, pending), daemon=True).start()
+            
+    def handle_client_message(self, client_socket, message, received_at=None):
+        """
+        Routes a message (e.g., 'answer') from a client to the client's room.
         Executed on the Main Thread.
         """
-        msg_type = message.get("type")
-        client_name = self.clients.get(client_socket, {}).get('name', 'Unknown')
-        
-        if msg_type == "answer":
-            if not self.is_game_active:
-                return
-                
-            answer = message.get("answer", "").upper()
-            if answer not in ['A', 'B', 'C']:
-                return
-                
-            # Record answer logic - NO LOCK NEEDED as we are on MAIN THREAD
-            # Since process_queue calls this, we are strictly sequential here.
-            # No race conditions between clients answering at the same time.
-            if self.current_question_index not in self.answers_received:
-                self.answers_received[self.current_question_index] = {}
-                
-            if client_name not in self.answers_received[self.current_question_index]:
-                self.answers_received[self.current_question_index][client_name] = {
-                    'answer': answer,
-                    'timestamp': time.time()  # Use server time
-                }
-                self.log(f"Received answer '{answer}' from {client_name}")
-                
-                # Check if all connected players answered
-                # Only process if all currently connected players have answered
-                connected_names = {info['name'] for info in self.clients.values()}
-                answered_names = set(self.answers_received[self.current_question_index].keys())
-                if connected_names.issubset(answered_names) and len(connected_names) > 0:
-                    self.log(f"All connected players have answered. Processing answers...")
-                    self.process_question_answers()
+        room = self.client_rooms.get(client_socket)
+        if room is not None:
+            room.handle_client_message(client_socket, message, received_at)
 
     def update_clients_list(self):
         """Updates the listbox showing connected clients."""
         def _update():
             self.clients_listbox.delete(0, tk.END)
             # No lock needed - running on main thread
-            for client_info in self.clients.values():
-                self.clients_listbox.insert(tk.END, client_info['name'])
+            for room_id, room in sorted(self.rooms.items()):
+                for client_socket, client_info in list(room.clients.items()):
+                    entry = f"{client_info['name']} ({room_id})"
+                    queued = getattr(client_socket, 'queued_bytes', 0)
+                    if queued:
+                        entry += f" - {queued / 1024:.1f} KB queued"
+                    clock = getattr(client_socket, 'clock', None)
+                    if clock is not None and clock.rtt is not None:
+                        entry += f" - RTT {clock.rtt * 1000:.0f} ms"
+                    self.clients_listbox.insert(tk.END, entry)
         self.root.after(0, _update)
                 
+    def outbound_queue_depths(self):
+        """
+        Returns the outbound queue depth of every client: {room_id: {name: queued_bytes}}.
+        Also called from the metrics exporter's thread, so it only iterates copies.
+        """
+        depths = {}
+        for room_id, room in list(self.rooms.items()):
+            depths[room_id] = {
+                info['name']: getattr(client_socket, 'queued_bytes', 0)
+                for client_socket, info in list(room.clients.items())
+            }
+        return depths
+
+    def outbound_queue_series(self):
+        """outbound_queue_depths() as {(room, player): queued_bytes}, for the per-client queue gauge."""
+        return {(room_id, name): queued
+                for room_id, players in self.outbound_queue_depths().items() for name, queued in players.items()}
+                
+    def send_heartbeats(self):
+        """
+        Timer callback: pings every player and relay that negotiated clock sync, then re-arms.
+        One ping frame is shared by all of them; the pongs come back in receive_message.
+        Those connections answer every ping, so one that sent nothing for the idle timeout
+        is dead: it is evicted, and its reader reports the disconnect like any other.
+        """
+        self.ping_timer = None
+        if not self.is_listening:
+            return
+        now = time.perf_counter()
+        frame = self.pinger.next_ping(now)
+        for connections in (self.client_rooms, self.relay_rooms):
+            for client_socket, room in list(connections.items()):
+                if getattr(client_socket, 'clock', None) is None:
+                    continue  # Not heartbeating; TCP keepalive watches it
+                if self.timeouts.is_idle(client_socket, now):
+                    name = room.clients.get(client_socket, {}).get('name', 'relay')
+                    room.log(f"'{name}' sent nothing for {self.timeouts.idle:g}s; disconnecting")
+                    client_socket.evict(f"idle for more than {self.timeouts.idle:g}s")
+                else:
+                    self.send_frame(client_socket, frame, "ping")
+        self.ping_timer = self.timers.call_later(PING_INTERVAL_SECONDS, self.send_heartbeats)
+        
+    def client_rtts(self):
+        """
+        Returns the RTT estimate of every player with one:
+        {room_id: {name: {'rtt': s, 'min_rtt': s, 'trusted_rtt': s, 'jitter': s, 'offset': s, 'samples': n}}}.
+        Also called from the metrics exporter's thread, so it only iterates copies.
+        """
+        estimates = {}
+        for room_id, room in list(self.rooms.items()):
+            for client_socket, info in list(room.clients.items()):
+                clock = getattr(client_socket, 'clock', None)
+                if clock is not None and clock.rtt is not None:
+                    estimates.setdefault(room_id, {})[info['name']] = {
+                        'rtt': clock.rtt, 'min_rtt': clock.min_rtt, 'trusted_rtt': clock.trusted_rtt(),
+                        'jitter': clock.rtt_variance, 'offset': clock.offset, 'samples': clock.samples}
+        return estimates
+
+    def client_rtt_series(self):
+        """client_rtts() as {(room, player, estimate): seconds}, for the per-client RTT gauge."""
+        series = {}
+        for room_id, players in self.client_rtts().items():
+            for name, estimate in players.items():
+                for kind, key in (("smoothed", 'rtt'), ("min", 'min_rtt'), ("trusted", 'trusted_rtt'),
+                                  ("jitter", 'jitter')):
+                    series[(room_id, name, kind)] = estimate[key]
+        return series
+        
     def update_start_game_button(self):
         """Update the start game button state - must be called from GUI thread"""
         def update():
             num_questions = self.num_questions_var.get().strip()
             question_file = self.question_file_var.get().strip()
+            room = self.rooms.get(self.room_var.get().strip())
+            player_count = len(room.clients) if room else 0
             
-            # Check if question file exists and is valid
+            # Check if question file exists and is valid (cached, no file access)
             file_valid = False
             if question_file:
-                questions = self.load_questions_from_file(question_file)
-                file_valid = len(questions) > 0
+                bank = self.question_banks.peek(question_file)
+                file_valid = bank is not None and len(bank) > 0
             
             can_start = (
-                len(self.clients) >= 2 and
+                player_count >= 2 and
                 num_questions and
                 num_questions.isdigit() and
                 int(num_questions) > 0 and
                 file_valid and
-                not self.is_game_active and
+                not room.is_game_active and
                 self.is_listening
             )
             self.start_game_button.config(state=tk.NORMAL if can_start else tk.DISABLED)
             if can_start:
-                self.log(f"Start Game button enabled: {len(self.clients)} players, {num_questions} questions, file loaded")
+                self.log("Start Game button enabled: room '%s', %d players, %s questions, file loaded",
+                         room.room_id, player_count, num_questions, level=DEBUG)
         
         # Ensure we're on the GUI thread
         if threading.current_thread() == threading.main_thread():
@@ -657,400 +869,187 @@ class QuizServer:
         else:
             self.root.after(0, update)
         
-    def start_game(self):
+    def start_game(self, room_id=None):
         """
-        Starts the quiz game.
-        Loads questions, validates requirements (2+ players), and broadcasts the first question.
+        Starts the quiz game in the given room (default: the room selected in the GUI).
+        Loads questions, validates requirements (2+ players), and lets the room broadcast the first question.
         """
         try:
+            # Get the room to start
+            room_id = room_id or self.room_var.get().strip()
+            room = self.rooms.get(room_id)
+            if room is None:
+                self.show_error("Error", f"Room '{room_id}' has no connected players")
+                return
+            if room.is_game_active:
+                self.show_error("Error", f"A game is already running in room '{room_id}'")
+                return
+            
             # Get question file path
             question_file = self.question_file_var.get().strip()
             if not question_file:
-                messagebox.showerror("Error", "Please select a question file")
+                self.show_error("Error", "Please select a question file")
                 return
             
             # Check if file exists
             if not os.path.exists(question_file):
-                messagebox.showerror("Error", f"Question file not found: {question_file}")
+                self.show_error("Error", f"Question file not found: {question_file}")
                 self.log(f"Error: Question file not found: {question_file}")
                 return
             
-            # Load questions from file
-            self.questions = self.load_questions_from_file(question_file)
+            # Get the current version of the question bank (parsed once, cached)
+            bank = self.question_banks.get(question_file)
             
-            if not self.questions:
-                messagebox.showerror("Error", "No questions available in the file or file could not be read")
+            if not bank:
+                self.show_error("Error", "No questions available in the file or file could not be read")
                 self.log("Error: No questions loaded from file")
                 return
                     
-            self.log(f"Loaded {len(self.questions)} questions from file: {question_file}")
+            self.log(f"Using {len(bank)} questions (version {bank.version}) from file: {question_file}")
                 
             # Get number of questions
             try:
-                self.num_questions = int(self.num_questions_var.get())
-                if self.num_questions < 1:
-                    messagebox.showerror("Error", "Number of questions must be at least 1")
+                num_questions = int(self.num_questions_var.get())
+                if num_questions < 1:
+                    self.show_error("Error", "Number of questions must be at least 1")
                     return
             except ValueError:
-                messagebox.showerror("Error", "Invalid number of questions")
+                self.show_error("Error", "Invalid number of questions")
+                return
+                
+            # Get the answer deadline
+            try:
+                question_timeout = float(self.question_timeout_var.get() or 0)
+                if question_timeout < 0:
+                    raise ValueError
+            except ValueError:
+                self.show_error("Error", "Answer time must be 0 or more seconds")
                 return
+            question_timeout = int(question_timeout) if question_timeout.is_integer() else question_timeout
                 
             # Check client count
-            if len(self.clients) < 2:
-                messagebox.showerror("Error", "At least 2 players must be connected")
+            if len(room.clients) < 2:
+                self.show_error("Error", "At least 2 players must be connected")
                 return
                 
-            # Start game
-            self.is_game_active = True
-            self.current_question_index = 0
-            self.answers_received = {}
-            # Only reset scores for currently connected players
-            # Disconnected players' scores should remain on scoreboard
-            for client_socket, client_info in self.clients.items():
-                client_name = client_info['name']
-                self.scores[client_name] = 0
-            # Ensure all connected players have a score entry
-            for client_socket, client_info in self.clients.items():
-                client_name = client_info['name']
-                if client_name not in self.scores:
-                    self.scores[client_name] = 0
+            # Question messages are pre-encoded once per bank version and game length,
+            # so each round's broadcast is only the sends
+            question_frames = bank.question_frames(num_questions, question_timeout)
             
-            self.log(f"Game started with {len(self.clients)} players. {self.num_questions} questions will be asked.")
+            # Start game
+            room.start_game(bank.questions, num_questions, question_frames, question_timeout)
             self.update_start_game_button()
             
-            # Send initial scoreboard
-            self.send_scoreboard()
-            
-            # Start game monitoring loop
-            self.monitor_game_state()
-            
-            # Send first question
-            self.send_next_question()
-            
         except Exception as e:
-            self.log(f"Error starting game: {e}")
-            messagebox.showerror("Error", f"Failed to start game: {e}")
-            
-    def send_next_question(self):
-        """
-        Retrieves the next question and broadcasts it to all clients.
-        If no questions remain, ends the game.
-        """
-        # Check player count first
-        if len(self.clients) < 2:
-            self.end_game("Less than 2 players remaining")
-            return
-            
-        if self.current_question_index >= self.num_questions:
-            self.end_game("All questions answered")
-            return
-            
-        # Get question (reuse if needed)
-        # Verify index is within bounds to prevent crashes, using modulo for endless loops if intended
-        question = self.questions[self.current_question_index % len(self.questions)]
-        
-        self.log(f"Question {self.current_question_index + 1}/{self.num_questions}: {question['question']}")
-        
-        # Reset answers for this question
-        self.answers_received[self.current_question_index] = {}
-        
-        # Broadcast question to all connected clients
-        question_message = {
-            "type": "question",
-            "question_number": self.current_question_index + 1,
-            "total_questions": self.num_questions,
-            "question": question['question'],
-            "A": question['A'],
-            "B": question['B'],
-            "C": question['C']
-        }
-        self.log(f"Broadcasting question {self.current_question_index + 1} to {len(self.clients)} clients...")
-        self.log(f"Broadcasting question {self.current_question_index + 1} to {len(self.clients)} clients...")
-        client_count = len(self.clients)
-        self.broadcast_message(question_message)
-        self.log(f"Question broadcast completed to {client_count} clients")
-        
-    def process_question_answers(self):
-        """
-        Evaluates answers for the current question.
-        Calculates scores (including speed bonuses) and sends results to clients.
-        Triggers the next question after processing.
-        """
-        if self.current_question_index not in self.answers_received:
-            return
-        
-        # Check if we have enough players before processing
-        if len(self.clients) < 2:
-            self.end_game("Less than 2 players remaining")
-            return
+            self.log(f"Error starting game: {e}", level=ERROR)
+            self.show_error("Error", f"Failed to start game: {e}")
             
-        question = self.questions[self.current_question_index % len(self.questions)]
-        correct_answer = question['correct']
-        answers = self.answers_received[self.current_question_index]
-        
-        # Find first correct answer
-        first_correct = None
-        first_correct_time = float('inf')
-        
-        for client_name, answer_data in answers.items():
-            if answer_data['answer'] == correct_answer:
-                timestamp = answer_data.get('timestamp', 0)
-                if timestamp < first_correct_time:
-                    first_correct_time = timestamp
-                    first_correct = client_name
-                    
-        # Calculate scores
-        bonus_points = len(self.clients) - 1 if first_correct else 0
-        
-        # Update scores
-        for client_name, answer_data in answers.items():
-            answer = answer_data['answer']
-            if answer == correct_answer:
-                points = 1
-                if client_name == first_correct:
-                    points += bonus_points
-                    self.scores[client_name] += points
-                    self.log(f"{client_name} answered correctly FIRST and received {points} points (1 + {bonus_points} bonus)")
-                else:
-                    self.scores[client_name] += points
-                    self.log(f"{client_name} answered correctly and received {points} point")
-            else:
-                self.scores[client_name] += 0
-                self.log(f"{client_name} answered incorrectly ({answer}). Correct answer: {correct_answer}")
-                
-        # Send personalized results to each client
-        for client_name, answer_data in answers.items():
-            answer = answer_data['answer']
-            if answer == correct_answer:
-                if client_name == first_correct:
-                    message = f"Correct! You answered first and received {1 + bonus_points} points (1 + {bonus_points} bonus)!"
-                else:
-                    message = f"Correct! You received 1 point."
-            else:
-                message = f"Incorrect. Your answer was {answer}. The correct answer is {correct_answer}. You received 0 points."
-                
-            # Find client socket
-            client_socket = None
-            for sock, info in self.clients.items():
-                if info['name'] == client_name:
-                    client_socket = sock
-                    break
-                    
-            if client_socket:
-                self.send_message(client_socket, {
-                    "type": "answer_result",
-                    "message": message,
-                    "your_answer": answer,
-                    "correct_answer": correct_answer,
-                    "your_score": self.scores[client_name]
-                })
-                
-        # Send updated scoreboard to all
-        self.send_scoreboard()
-        
-        # Check player count before moving to next question
-        if len(self.clients) < 2:
-            self.end_game("Less than 2 players remaining")
-            return
+    def show_error(self, title, message):
+        """Reports an error to the operator (a dialog in the GUI)."""
+        messagebox.showerror(title, message)
         
-        # Move to next question
-        self.current_question_index += 1
-        
-        # Send next question
-        self.send_next_question()
+    def send_message(self, client_socket, message):
+        # Newline-terminated JSON frame (see protocol.py)
+        self.send_frame(client_socket, encode_message(message), message.get("type", "unknown"))
         
-    def send_scoreboard(self):
-        """Broadcasts the current scoreboard to all connected clients."""
-        scoreboard = []
-        for name, score in sorted(self.scores.items(), key=lambda x: (-x[1], x[0])):
-            scoreboard.append({"name": name, "score": score})
-            
-        self.broadcast_message({
-            "type": "scoreboard",
-            "scoreboard": scoreboard
-        })
-
-    def is_waiting_for_answers(self):
+    def send_frame(self, client_socket, frame, msg_type="unknown"):
         """
-        Checks if we're currently waiting for answers to the current question.
-        Returns True if a question is active and not all connected players have answered.
+        Sends an already encoded frame (bytes), e.g. one shared by a whole broadcast.
+        Large frames are compressed for clients that negotiated compression.
+        Returns False if the frame was not sent. Connections that are closed or evicted
+        are skipped silently: their reader reports the disconnect, which removes them.
         """
-        if not self.is_game_active:
+        if getattr(client_socket, 'closed', False):
             return False
-        
-        if self.current_question_index not in self.answers_received:
+        try:
+            if len(frame) >= COMPRESS_MIN_BYTES and getattr(client_socket, 'compression', None):
+                frame = self.compressed_frame(frame, msg_type)
+            client_socket.sendall(frame)
+            self.metrics.frame_sent(msg_type, len(frame))
+            return True
+        except Exception as e:
+            if client_socket not in self._send_failed:
+                self._send_failed.add(client_socket)
+                self.log(f"Error sending message: {e}", level=WARNING)
             return False
-        
-        # Get connected player names
-        connected_names = {info['name'] for info in self.clients.values()}
-        # Get answered player names for current question
-        answered_names = set(self.answers_received[self.current_question_index].keys())
-        
-        # If there are connected players who haven't answered, we're still waiting
-        return not connected_names.issubset(answered_names)
-    
-    def monitor_game_state(self):
-        """
-        Periodic task to check game health (e.g., minimum player count).
-        Runs every 1 second via root.after().
-        """
-        """Monitor game state every 1 second"""
-        if not self.is_game_active:
-            return
-
-        # Check for insufficient players
-        # Check for insufficient players
-        # No lock needed - running on main thread via queue or root.after
-        player_count = len(self.clients)
-        
-        # Only end game if we have less than 2 players AND we're not waiting for answers
-        # This allows remaining players to finish answering the current question
-        if player_count < 2 and not self.is_waiting_for_answers():
-            self.log("Monitor detected fewer than 2 players and no active question. Ending game...")
-            # Use root.after to ensure end_game runs on main thread (though end_game itself is thread-safe now)
-            # But technically monitor_game_state IS running on main thread via root.after below
-            self.end_game("Less than 2 players remaining")
-            return
-
-        # Schedule next check
-        self.root.after(1000, self.monitor_game_state)
-        
-    def end_game(self, reason):
-        # Set game as inactive FIRST so new connections can be accepted AND to prevent multiple threads
-        self.is_game_active = False
-        
-        # Start end_game in a separate thread to avoid freezing GUI with sleep
-        threading.Thread(target=self._end_game_worker, args=(reason,), daemon=True).start()
-
-    def _end_game_worker(self, reason):
+            
+    def compressed_frame(self, frame, msg_type):
         """
-        Background worker to handle game end logic (calculating final ranks).
-        Started in a thread to avoid blocking if we wanted to add delays/animations later.
+        Returns `frame` compressed (see protocol.compress_frame). The last result is kept,
+        so a broadcast handing the same frame to every client compresses it only once.
+        May be called from any thread.
         """
-        self.log(f"Game ended: {reason}")
-        self.log(f"is_game_active set to False - new connections can now be accepted")
-        
-        # Capture state safely (no lock needed, main thread)
-        scores_copy = self.scores.copy()
-        clients_snapshot = list(self.clients.items()) # List of (socket, info_dict)
-        
-        # Calculate rankings using local copy
-        sorted_scores = sorted(scores_copy.items(), key=lambda x: (-x[1], x[0]))
-        rankings = []
-        current_rank = 1
-        
-        for i, (name, score) in enumerate(sorted_scores):
-            if i > 0 and sorted_scores[i-1][1] != score:
-                current_rank = i + 1
-            rankings.append({"rank": current_rank, "name": name, "score": score})
-        
-        # Find winners
-        winners = [r for r in rankings if r['rank'] == 1]
-        winner_names = [w['name'] for w in winners]
-        
-        self.log(f"Final rankings:")
-        for ranking in rankings:
-            self.log(f"  {ranking['rank']}. {ranking['name']}: {ranking['score']} points")
-        
-        # Broadcast to remaining clients
-        remaining_names = [info['name'] for sock, info in clients_snapshot]
-        self.log(f"Sending game_end message to {len(clients_snapshot)} remaining clients: {remaining_names}")
-        
-        if len(clients_snapshot) == 0:
-            self.log("No clients remaining, skipping game_end message")
-        else:
-            message = {
-                "type": "game_end",
-                "reason": reason,
-                "final_scoreboard": rankings,
-                "winners": winner_names
-            }
-            
-            for client_socket, info in clients_snapshot:
-                try:
-                    self.send_message(client_socket, message)
-                    self.log(f"Sent game_end message to {info['name']}")
-                except Exception as e:
-                    self.log(f"Error sending game_end to {info['name']}: {e}")
-            
-            self.log(f"game_end message sent phase completed")
-            
-            # Wait a bit for messages to be sent before closing connections
-            time.sleep(1.0)
-        
-        # Close all client connections
-        for client_socket, _ in clients_snapshot:
-            try:
-                client_socket.close()
-            except:
-                pass
-                
-        # Clear client data
-        # Clear client data
-        self.clients.clear()
-        self.client_names.clear()
-        self.scores.clear()
-        
-        # Reset game state but keep server listening (if server is still listening)
-        # Reset game state
-        self.current_question_index = 0
-        self.answers_received = {}
-        # Keep scores empty as they were cleared above
-
-            
-        self.update_clients_list()
-        self.update_start_game_button()
-        
-        if self.is_listening:
-            self.log("Game ended. All connections closed. Server is still listening and ready for new connections.")
-        else:
-            self.log("Game ended. All connections closed.")
+        cached = self._last_compressed
+        if cached is not None and cached[0] is frame:
+            return cached[1]
+        started = time.thread_time()
+        compressed = compress_frame(frame)
+        if len(compressed) >= len(frame):
+            compressed = frame  # Not worth it; the client accepts either
+        self.metrics.frame_compressed(msg_type, len(frame), len(compressed), time.thread_time() - started)
+        self._last_compressed = (frame, compressed)
+        return compressed
+        
+    def log_compression_report(self):
+        """Logs how much compression saved and what it cost."""
+        size = self.metrics.compression_input_bytes.total()
+        if size:
+            compressed = self.metrics.compression_output_bytes.total()
+            self.log(f"Compression: {self.metrics.frames_compressed.total()} frames, {size / 1024:.0f} KB -> "
+                     f"{compressed / 1024:.0f} KB ({size / compressed:.1f}x), "
+                     f"{self.metrics.compression_cpu_seconds.total() * 1000:.1f} ms CPU")
+        
+    def log_queue_wait_report(self):
+        """Logs how long events waited in the queue before the Main Thread handled them."""
+        for event_type, summary in sorted(self.queue.wait_report().items()):
+            if summary:
+                self.log(f"Queue wait for '{event_type}' events ({summary['count']}): "
+                         f"p50={summary['p50']} ms, p99={summary['p99']} ms, max={summary['max']} ms")
         
-    def send_message(self, client_socket, message):
-        try:
-            data = json.dumps(message).encode('utf-8')
-            # Send message with newline separator
-            full_message = data + b'\n'
-            client_socket.sendall(full_message)
-        except Exception as e:
-            self.log(f"Error sending message: {e}")
-            
-    def broadcast_message(self, message, exclude_socket=None):
-        """Broadcast message to all clients, optionally excluding one"""
-
-        # No lock needed - running on main thread via queue
-        clients_to_remove = []
-        msg_type = message.get("type", "unknown")
-        for client_socket in self.clients.keys():
-            if client_socket == exclude_socket:
-                continue  # Skip excluded client
-            try:
-                client_name = self.clients[client_socket]['name']
-                self.send_message(client_socket, message)
-                if msg_type == "game_end":
-                    self.log(f"Sent game_end message to {client_name}")
-            except Exception as e:
-                self.log(f"Error sending {msg_type} to {self.clients.get(client_socket, {}).get('name', 'Unknown')}: {e}")
-                clients_to_remove.append(client_socket)
-                
-        for client_socket in clients_to_remove:
-            try:
-                client_socket.close()
-            except:
-                pass
-            
-            if client_socket in self.clients:
-                del self.clients[client_socket]
-            self.log(f"Removed unresponsive client during broadcast")
-                
     def on_closing(self):
         if self.is_listening:
             self.stop_server()
+        self.question_banks.stop()
+        self.timers.cancel_all()
+        if self.results:
+            self.results.close()
+        if self.journal:
+            self.journal.close()
+        if self.metrics_exporter:
+            self.metrics_exporter.stop()
+        self.logger.close()
         self.root.destroy()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quiz Server")
+    parser.add_argument("--measure-queue", action="store_true",
+                        help="Record how long each event waits in the queue; printed as JSON on exit")
+    parser.add_argument("--metrics-port", type=int,
+                        help="Serve Prometheus metrics at http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--metrics-host", default="127.0.0.1", help="Address for the metrics endpoint")
+    parser.add_argument("--log-level", type=parse_level, default=INFO,
+                        help="DEBUG, INFO, WARNING or ERROR (default INFO)")
+    parser.add_argument("--log-file", help="Also write the log as JSON lines to this file (rotated by size)")
+    parser.add_argument("--log-max-bytes", type=int, default=10 * 1024 * 1024, help="Rotate the log file at this size")
+    parser.add_argument("--log-backups", type=int, default=5, help="Rotated log files to keep")
+    parser.add_argument("--results-db", help="Record finished games in this SQLite database (see results_store.py)")
+    parser.add_argument("--journal-dir", help="Journal running games here and recover them after a crash (see journal.py)")
+    parser.add_argument("--handshake-timeout", type=float, default=HANDSHAKE_TIMEOUT_SECONDS,
+                        help="Seconds a new connection has to send its connect message (0 = no limit)")
+    parser.add_argument("--idle-timeout", type=float, default=IDLE_TIMEOUT_SECONDS,
+                        help="Disconnect heartbeating clients silent for this many seconds (0 = never)")
+    args = parser.parse_args()
+    
     root = tk.Tk()
-    server = QuizServer(root)
+    server = QuizServer(root, measure_queue=args.measure_queue,
+                        metrics_port=args.metrics_port, metrics_host=args.metrics_host,
+                        log_level=args.log_level, log_file=args.log_file,
+                        log_max_bytes=args.log_max_bytes, log_backups=args.log_backups,
+                        results_db=args.results_db, journal_dir=args.journal_dir,
+                        handshake_timeout=args.handshake_timeout, idle_timeout=args.idle_timeout)
     root.protocol("WM_DELETE_WINDOW", server.on_closing)
     root.mainloop()
+    
+    if args.measure_queue:
+        print(json.dumps({"queue_wait_ms": server.queue.wait_report()}, indent=2))
 
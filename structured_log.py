@@ -0,0 +1,231 @@
+"""
+Leveled, structured logging for the Quiz Server.
+
+A record is (sequence, time, level, message, args, fields). Records go into a
+bounded ring buffer that the GUI samples periodically, and optionally to a
+file sink that writes JSON lines in batches from a background thread and
+rotates the file by size.
+
+Formatting is deferred: `message % args` is only evaluated when a record is
+displayed or written, and a call below the current level returns after one
+comparison, so debug lines on hot paths cost close to nothing when disabled.
+"""
+import collections
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+
+def parse_level(name):
+    """Returns the level for a name such as 'debug' or 'INFO'. Raises ValueError otherwise."""
+    for level, level_name in LEVEL_NAMES.items():
+        if level_name == str(name).upper():
+            return level
+    raise ValueError(f"Unknown log level: {name}")
+
+
+def format_message(record):
+    """The record's message with its args applied."""
+    message, args = record[3], record[4]
+    if args:
+        try:
+            return message % args
+        except (TypeError, ValueError):
+            return f"{message} {args}"
+    return message
+
+
+def format_line(record):
+    """One human readable line, as shown in the GUI: [HH:MM:SS] [room] message"""
+    timestamp = datetime.fromtimestamp(record[1]).strftime("%H:%M:%S")
+    room = record[5].get("room")
+    prefix = f"[{timestamp}] [{room}] " if room is not None else f"[{timestamp}] "
+    if record[2] >= WARNING:
+        prefix += LEVEL_NAMES.get(record[2], "") + ": "
+    return prefix + format_message(record)
+
+
+class StructuredLogger:
+    """
+    Thread-safe logger writing records to a bounded ring buffer and to sinks.
+    Readers poll with records_since(sequence) instead of being called per record.
+    """
+    def __init__(self, level=INFO, capacity=5000):
+        self.level = level
+        self.records = collections.deque(maxlen=capacity)
+        self.sinks = []
+        self._sequence = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def is_enabled(self, level):
+        return level >= self.level
+
+    def log(self, level, message, *args, **fields):
+        if level < self.level:
+            return
+        with self._lock:
+            record = (next(self._sequence), time.time(), level, message, args, fields)
+            self.records.append(record)
+        for sink in self.sinks:
+            sink.emit(record)
+
+    def debug(self, message, *args, **fields):
+        if DEBUG >= self.level:
+            self.log(DEBUG, message, *args, **fields)
+
+    def info(self, message, *args, **fields):
+        self.log(INFO, message, *args, **fields)
+
+    def warning(self, message, *args, **fields):
+        self.log(WARNING, message, *args, **fields)
+
+    def error(self, message, *args, **fields):
+        self.log(ERROR, message, *args, **fields)
+
+    def records_since(self, sequence):
+        """Returns the buffered records newer than `sequence`, oldest first."""
+        with self._lock:
+            if not self.records or self.records[-1][0] <= sequence:
+                return []
+            newer = []
+            for record in reversed(self.records):
+                if record[0] <= sequence:
+                    break
+                newer.append(record)
+        newer.reverse()
+        return newer
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+        self.sinks = []
+
+
+class RotatingFileSink:
+    """
+    Writes records as JSON lines from a background thread.
+    Records queued while the thread was busy are written with one write() call.
+    When the file would grow beyond max_bytes it is rotated to
+    path.1 ... path.<backups> (the oldest is dropped).
+    At most max_queued records wait for a slow disk; further records are
+    dropped and counted, and the count is logged once writing catches up.
+    """
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backups=5, flush_interval=0.5, max_queued=100000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.dropped = 0  # Records dropped because the queue was full
+        self._dropped_reported = 0
+        self._queue = queue.Queue(max_queued)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._size = self._file.tell()
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+
+    def emit(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """Writes everything still queued and closes the file."""
+        try:
+            self._queue.put(None, timeout=5)
+        except queue.Full:
+            return  # Writer stuck on the disk; the daemon thread goes with the process
+        self._thread.join(timeout=5)
+
+    def _write_loop(self):
+        running = True
+        while running:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                running = False
+                batch = [record for record in batch if record is not None]
+            if batch:
+                self._write(batch)
+        self._file.close()
+
+    def _write(self, batch):
+        if self._file.closed and not self._reopen():
+            self.dropped += len(batch)  # Still no file (e.g. a failed rotation); reported once it is back
+            return
+        lines = []
+        dropped = self.dropped - self._dropped_reported
+        if dropped:
+            self._dropped_reported += dropped
+            lines.append(json.dumps({"time": round(time.time(), 6), "level": LEVEL_NAMES[WARNING],
+                                     "message": f"{dropped} log records dropped (queue full or file unavailable)"}))
+        for record in batch:
+            entry = {
+                "time": round(record[1], 6),
+                "level": LEVEL_NAMES.get(record[2], str(record[2])),
+                "message": format_message(record)
+            }
+            entry.update(record[5])
+            lines.append(json.dumps(entry, default=str))
+        try:
+            # One write per file: rotate between lines when the file would pass max_bytes
+            chunk = []
+            chunk_size = 0
+            for line in lines:
+                size = (len(line) if line.isascii() else len(line.encode('utf-8'))) + 1  # Bytes on disk
+                if self._size + chunk_size and self._size + chunk_size + size > self.max_bytes:
+                    self._file.write("".join(chunk))
+                    self._rotate()
+                    chunk = []
+                    chunk_size = 0
+                chunk.append(line + "\n")
+                chunk_size += size
+            self._file.write("".join(chunk))
+            self._file.flush()
+            self._size += chunk_size
+        except (OSError, ValueError):
+            pass  # Disk full, file gone or closed; dropping log lines must not stop the writer
+
+    def _rotate(self):
+        self._file.close()
+        try:
+            for i in range(self.backups - 1, 0, -1):
+                source = f"{self.path}.{i}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{i + 1}")
+            if self.backups > 0:
+                os.replace(self.path, f"{self.path}.1")
+        finally:
+            # Appends to the old file if it could not be moved away; retried by _write if this fails too
+            self._reopen()
+
+    def _reopen(self):
+        """Opens the log file for appending. Returns False (the file stays closed) if it cannot be opened."""
+        try:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        except OSError:
+            return False
+        self._size = self._file.tell()
+        return True
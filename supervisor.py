@@ -0,0 +1,258 @@
+"""
+Multi-process Quiz Server.
+
+One Python process runs the game logic on one core. The supervisor forks N
+headless worker processes that all listen on the same port (SO_REUSEPORT), so
+the kernel spreads new connections over them. Every room lives in exactly one
+worker (room_owner), so a worker that accepts a connection for a room it does
+not host hands the connection off: the socket's file descriptor is passed to
+the owning worker over a Unix socket (SCM_RIGHTS) together with the bytes read
+so far, and the owner serves it as if it had accepted it. Clients notice
+nothing; no redirect is needed.
+
+With a metrics port, the supervisor serves the workers' metrics summed into
+one set at /metrics. Workers that die are restarted. SIGTERM (or Ctrl+C) is
+passed on to the workers, which end their games and exit.
+
+Linux (or another system with SO_REUSEPORT) and Python 3.9+ only.
+
+Usage:
+    python headless_server.py --workers 8 --config server.ini
+"""
+import hashlib
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import urllib.request
+from datetime import datetime
+
+from headless_server import EventLoop, HeadlessQuizServer
+from metrics import MetricsExporter
+from structured_log import DEBUG, WARNING
+
+
+HANDOFF_MAX_BYTES = 65536  # Largest amount of already read data passed along with a connection
+HANDOFF_TIMEOUT_SECONDS = 2.0  # Give up handing off when the owning worker stops reading
+RESTART_DELAY_SECONDS = 1.0
+
+
+def room_owner(room_id, workers):
+    """Index of the worker process hosting room_id. Gives the same answer in every process."""
+    # A real hash: CRC32's low bits barely change between names like room1, room2...
+    digest = hashlib.blake2b(room_id.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % workers
+
+
+class RoomRouter:
+    """
+    Passes connections between worker processes.
+    `channels` holds one (receive_socket, send_socket) datagram socket pair per
+    worker; a worker reads its own receive socket and writes to the owner's send socket.
+    """
+    def __init__(self, server, index, channels):
+        self.server = server
+        self.index = index
+        self.channels = channels
+        self.workers = len(channels)
+        self._thread = None
+
+    def owns(self, room_id):
+        return room_owner(room_id, self.workers) == self.index
+
+    def hand_off(self, client_socket, room_id, pending):
+        """
+        Sends the connection (a QueuedSocketConnection or AsyncClientConnection
+        that has not been used to send anything) to the worker owning room_id.
+        """
+        owner = room_owner(room_id, self.workers)
+        fd = client_socket.detach()
+        try:
+            if len(pending) > HANDOFF_MAX_BYTES:
+                raise OSError(f"{len(pending)} bytes already received")
+            socket.send_fds(self.channels[owner][1], [pending], [fd])
+            self.server.metrics.connections_handed_off.inc()
+            self.server.log("Handed connection for room '%s' to worker %d", room_id, owner, level=DEBUG)
+        except OSError as e:
+            self.server.log(f"Could not hand connection for room '{room_id}' to worker {owner}: {e}", level=WARNING)
+        finally:
+            os.close(fd)  # The owner holds its own copy now (or the connection is dropped)
+
+    def start(self):
+        """Starts serving connections handed off by the other workers."""
+        self._thread = threading.Thread(target=self._receive_loop, daemon=True)
+        self._thread.start()
+
+    def _receive_loop(self):
+        receive_socket = self.channels[self.index][0]
+        while True:
+            try:
+                pending, fds, _, _ = socket.recv_fds(receive_socket, HANDOFF_MAX_BYTES, 1)
+            except OSError:
+                break
+            for fd in fds:
+                sock = socket.socket(fileno=fd)
+                sock.setblocking(True)  # The sending engine may have left it non-blocking
+                self.server.adopt_connection(sock, pending)
+
+
+class WorkerServer(HeadlessQuizServer):
+    """Headless server running as one of the supervisor's worker processes."""
+    shutdown_signals = (signal.SIGTERM,)  # Ctrl+C reaches the supervisor, which passes SIGTERM on
+
+    def __init__(self, loop, config, index, channels, console):
+        super().__init__(loop, config, console)
+        self.reuse_port = True
+        self.router = RoomRouter(self, index, channels)
+
+    def start_server(self):
+        super().start_server()
+        if self.is_listening and self.router._thread is None:
+            self.router.start()
+
+
+class PrefixedConsole:
+    """Writes every line to `stream` prefixed with the worker's name."""
+    def __init__(self, stream, prefix):
+        self.stream = stream
+        self.prefix = prefix
+
+    def write(self, text):
+        self.stream.write("".join(f"{self.prefix}{line}\n" for line in text.splitlines()))
+
+    def flush(self):
+        self.stream.flush()
+
+
+def run_worker(index, config, channels, reports):
+    """Worker process entry point."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    config = dict(config, metrics_port=0)  # Scraped by the supervisor on an ephemeral port
+    if config["log_file"]:
+        root, ext = os.path.splitext(config["log_file"])
+        config["log_file"] = f"{root}.w{index}{ext}"
+    if config["journal_dir"]:
+        config["journal_dir"] = os.path.join(config["journal_dir"], f"w{index}")  # A restarted worker recovers its rooms
+    server = WorkerServer(EventLoop(), config, index, channels, PrefixedConsole(sys.stdout, f"[w{index}] "))
+    if server.metrics_exporter:
+        reports.put((index, server.metrics_exporter.port))
+    sys.exit(server.run())
+
+
+class AggregatedMetrics:
+    """Renders the sum of every worker's metrics (duck-types MetricsRegistry for MetricsExporter)."""
+    def __init__(self, supervisor):
+        self.supervisor = supervisor
+
+    def render(self):
+        families = {}  # {family: [meta_lines, {series: value}]}, in first-seen order
+        for port in list(self.supervisor.metrics_ports.values()):
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=2) as response:
+                    text = response.read().decode('utf-8')
+            except OSError:
+                continue  # Worker restarting
+            family = None
+            for line in text.splitlines():
+                if line.startswith("# "):
+                    parts = line.split(" ", 3)
+                    family = families.setdefault(parts[2], [[], {}])
+                    if line not in family[0]:
+                        family[0].append(line)
+                elif line and family is not None:
+                    series, value = line.rsplit(" ", 1)
+                    family[1][series] = family[1].get(series, 0) + (float(value) if "." in value or "e" in value
+                                                                    else int(value))
+
+        alive = sum(1 for process in self.supervisor.processes if process is not None and process.is_alive())
+        lines = ["# HELP quiz_workers Worker processes running", "# TYPE quiz_workers gauge", f"quiz_workers {alive}"]
+        for meta, series in families.values():
+            lines.extend(meta)
+            lines.extend(f"{name} {value}" for name, value in series.items())
+        return "\n".join(lines) + "\n"
+
+
+class Supervisor:
+    """Starts, watches and stops the worker processes."""
+    def __init__(self, config, workers):
+        self.config = config
+        self.workers = workers
+        self.context = multiprocessing.get_context("fork")
+        self.processes = [None] * workers
+        self.metrics_ports = {}  # {worker index: metrics port}
+        self.channels = []
+        self.reports = None
+        self.stopping = False
+
+    def log(self, message):
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] [supervisor] {message}", flush=True)
+
+    def run(self):
+        """Runs until SIGTERM/SIGINT and every worker has exited. Returns the process exit code."""
+        if not hasattr(socket, "SO_REUSEPORT") or not hasattr(socket, "send_fds"):
+            self.log("Worker processes need SO_REUSEPORT and Python 3.9+ (Linux)")
+            return 2
+
+        self.channels = [socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM) for _ in range(self.workers)]
+        for _, send_socket in self.channels:
+            send_socket.settimeout(HANDOFF_TIMEOUT_SECONDS)
+        self.reports = self.context.Queue()
+        for index in range(self.workers):
+            self.start_worker(index)
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self._on_signal)
+
+        exporter = None
+        if self.config["metrics_port"] is not None:
+            exporter = MetricsExporter(AggregatedMetrics(self), port=self.config["metrics_port"])
+            try:
+                exporter.start()
+                self.log(f"Metrics of all workers at http://127.0.0.1:{exporter.port}/metrics")
+            except OSError as e:
+                self.log(f"Could not start metrics endpoint on port {self.config['metrics_port']}: {e}")
+                exporter = None
+
+        restart_at = {}  # {worker index: time to restart it}
+        while not self.stopping or any(process.is_alive() for process in self.processes):
+            while not self.reports.empty():
+                index, port = self.reports.get()
+                self.metrics_ports[index] = port
+            for index, process in enumerate(self.processes):
+                if self.stopping or process.is_alive():
+                    continue
+                if index not in restart_at:
+                    self.log(f"Worker {index} exited with code {process.exitcode}; restarting")
+                    self.metrics_ports.pop(index, None)
+                    restart_at[index] = time.monotonic() + RESTART_DELAY_SECONDS
+                elif time.monotonic() >= restart_at[index]:
+                    del restart_at[index]
+                    self.start_worker(index)
+            time.sleep(0.2)
+
+        if exporter:
+            exporter.stop()
+        self.log("All workers stopped")
+        return 0
+
+    def start_worker(self, index):
+        process = self.context.Process(target=run_worker, name=f"quiz-worker-{index}",
+                                       args=(index, self.config, self.channels, self.reports))
+        process.start()
+        self.processes[index] = process
+        self.log(f"Worker {index} started (pid {process.pid})")
+
+    def _on_signal(self, signum, frame):
+        if self.stopping:
+            # Second signal: stop without waiting for games to wind down
+            for process in self.processes:
+                if process.is_alive():
+                    process.kill()
+            return
+        self.stopping = True
+        self.log(f"Received {signal.Signals(signum).name}, stopping {self.workers} workers...")
+        for process in self.processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
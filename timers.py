@@ -0,0 +1,124 @@
+"""
+Deadline scheduling for the game logic.
+
+Every game timer (question deadlines, lobby and auto-start timeouts) goes into
+one TimerScheduler per server instead of a root.after() call each. The
+scheduler keeps the deadlines in a heap and holds a single root.after() for
+the earliest one, so thousands of timers across rooms cost O(log n) to add,
+O(1) to cancel and one Tk timer in total.
+
+Like the rest of the game logic, the scheduler is only used from the Main Thread.
+"""
+import heapq
+import itertools
+import time
+
+from structured_log import ERROR
+
+
+class Timer:
+    """Handle returned by TimerScheduler.call_later. cancel() is O(1) and may be called more than once."""
+    __slots__ = ("deadline", "callback", "args", "cancelled", "_scheduler")
+
+    def __init__(self, scheduler, deadline, callback, args):
+        self._scheduler = scheduler
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        if not self.cancelled:
+            self.cancelled = True
+            self._scheduler._on_cancel()
+
+    def remaining(self):
+        """Seconds left before the timer fires (0 once it is due)."""
+        return max(0.0, self.deadline - self._scheduler.clock())
+
+
+class TimerScheduler:
+    """
+    Heap of timers driven by one root.after() call armed for the earliest deadline.
+
+    Cancelled timers stay in the heap and are skipped when they reach the top;
+    the heap is rebuilt when more than half of it is cancelled, so cancelling
+    stays amortized O(1) and the heap never grows past twice the live timers.
+    """
+    COMPACT_MIN_SIZE = 64  # Below this, cancelled entries are simply popped when due
+
+    def __init__(self, root, clock=time.monotonic, log=None):
+        # log(message, level=...) reports exceptions raised by callbacks
+        self.root = root
+        self.clock = clock
+        self.log = log
+        self._heap = []  # [(deadline, sequence, Timer)]
+        self._sequence = itertools.count()  # Ties fire in scheduling order
+        self._cancelled = 0
+        self._armed_deadline = None  # Deadline the pending root.after() is for
+        self._after_id = None
+
+    def __len__(self):
+        """Number of pending (not cancelled) timers."""
+        return len(self._heap) - self._cancelled
+
+    def call_later(self, delay, callback, *args):
+        """Calls callback(*args) on the Main Thread after `delay` seconds. Returns a Timer."""
+        timer = Timer(self, self.clock() + max(0.0, delay), callback, args)
+        heapq.heappush(self._heap, (timer.deadline, next(self._sequence), timer))
+        if self._armed_deadline is None or timer.deadline < self._armed_deadline:
+            self._arm()
+        return timer
+
+    def cancel_all(self):
+        for _, _, timer in self._heap:
+            timer.cancelled = True
+        self._heap = []
+        self._cancelled = 0
+        self._disarm()
+
+    def _on_cancel(self):
+        self._cancelled += 1
+        if self._cancelled > len(self._heap) // 2 and len(self._heap) >= self.COMPACT_MIN_SIZE:
+            self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+        # The armed root.after() stays; if its timer was cancelled it finds nothing due and re-arms
+
+    def _arm(self):
+        self._disarm()
+        while self._heap and self._heap[0][2].cancelled:
+            heapq.heappop(self._heap)
+            self._cancelled -= 1
+        if not self._heap:
+            return
+        deadline = self._heap[0][0]
+        delay_ms = max(0, int((deadline - self.clock()) * 1000 + 0.999))  # Round up: never fire early
+        self._armed_deadline = deadline
+        self._after_id = self.root.after(delay_ms, self._run_due)
+
+    def _disarm(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+        self._after_id = None
+        self._armed_deadline = None
+
+    def _run_due(self):
+        """Fires every timer whose deadline has passed, then arms root.after() for the next one."""
+        self._after_id = None
+        self._armed_deadline = None
+        now = self.clock()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, timer = heapq.heappop(self._heap)
+            if timer.cancelled:
+                self._cancelled -= 1
+                continue
+            timer.cancelled = True  # Fired: a later cancel() is a no-op
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                if self.log:
+                    name = getattr(timer.callback, '__name__', timer.callback)
+                    self.log(f"Error in timer callback {name}: {e}", level=ERROR)
+        if self._after_id is None:
+            self._arm()